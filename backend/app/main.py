@@ -1,41 +1,37 @@
 import os
 import json
+import hashlib
+import importlib.util
 import time
 import uuid
-import numpy as np
+import threading
+import zipfile
 from pathlib import Path
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 
-def convert_numpy_types(obj):
-    """NumPy型をPython標準型に変換する再帰関数"""
-    if isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        return float(obj)
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
-    elif isinstance(obj, dict):
-        return {key: convert_numpy_types(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_numpy_types(item) for item in obj]
-    elif isinstance(obj, tuple):
-        return tuple(convert_numpy_types(item) for item in obj)
-    else:
-        return obj
-
 # サービスのインポート
-from services.video_processor import VideoProcessor
-from services.pose_detector import PoseDetector
-from services.motion_analyzer import MotionAnalyzer
+from services.video_processor import SUPPORTED_EXTENSIONS, VideoProcessor
+from services.job_queue import JobQueue
+from services.worker_pool import WorkerPool
+from services.pose_format import POSE_DATA_FILENAME, POSE_JSON_FILENAME, export_pose_json
+from services.analysis_pipeline import ANALYSIS_RESULT_FILENAME, ANALYZER_VERSION, MOTION_RESULT_FILENAME
+from services.advice_versions import ADVICE_PARAMS, ORIGINAL_VERSION, AdviceVersionStore, advice_filename
+from services.upload_storage import UploadRegistry, save_with_hash
+from services.result_cache import ResultCache, advice_key, pipeline_fingerprint
+from services.chunked_upload import ChunkedUploadError, ChunkedUploadManager
+from services.result_store import ResultStore
+from services.batch_manager import BatchRegistry, extract_archive, job_fraction
+from services.retention import RetentionManager
+from services.admission import AdmissionController, ThroughputModel, client_key
+from services.metrics import MetricsStore
+from services.tracing import TRACE_FILENAME
 
-# アドバイス生成サービスのインポート（オプション）
-try:
-    from services.advice_generator_compact import AdviceGenerator
-    advice_available = True
-except ImportError:
-    advice_available = False
+# アドバイス生成サービスの有無（オプション）
+# 生成はワーカープロセスで行うため、API プロセスでは読み込まずに存在だけ確認する
+advice_available = importlib.util.find_spec('services.advice_generator_compact') is not None
+if not advice_available:
     print("Warning: AdviceGenerator not available")
 
 app = Flask(__name__)
@@ -45,35 +41,319 @@ CORS(app)
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'output'
+app.config['DATABASE_PATH'] = os.environ.get('ANALYZER_DB_PATH', 'analyzer.db')
+app.config['ANALYSIS_WORKERS'] = int(os.environ.get('ANALYSIS_WORKERS', '2'))
+app.config['POSE_MODEL_COMPLEXITY'] = int(os.environ.get('POSE_MODEL_COMPLEXITY', '2'))
+app.config['RESULT_CACHE_SIZE'] = int(os.environ.get('RESULT_CACHE_SIZE', '256'))
+app.config['BATCH_MAX_CLIPS'] = int(os.environ.get('BATCH_MAX_CLIPS', '50'))
+app.config['BATCH_MAX_EXTRACT_MB'] = int(os.environ.get('BATCH_MAX_EXTRACT_MB', '2048'))  # zip 展開後の合計（0 で無制限）
+app.config['RETENTION_TTL_HOURS'] = float(os.environ.get('RETENTION_TTL_HOURS', '168'))  # 7日（0 で無効）
+app.config['STORAGE_QUOTA_MB'] = int(os.environ.get('STORAGE_QUOTA_MB', '10240'))  # 0 で無制限
+app.config['RETENTION_INTERVAL_SECONDS'] = float(os.environ.get('RETENTION_INTERVAL_SECONDS', '600'))
+app.config['ADMISSION_MAX_WAIT_SECONDS'] = float(os.environ.get('ADMISSION_MAX_WAIT_SECONDS', '600'))
+app.config['MAX_QUEUED_PER_CLIENT'] = int(os.environ.get('MAX_QUEUED_PER_CLIENT', '50'))
+app.config['MAX_QUEUE_DEPTH'] = int(os.environ.get('MAX_QUEUE_DEPTH', '200'))
+app.config['TRACE_SAMPLE_EVERY'] = int(os.environ.get('TRACE_SAMPLE_EVERY', '10'))  # trace 指定時のフレーム間隔
+app.config['POSE_DATA_PRECISION'] = os.environ.get('POSE_DATA_PRECISION', 'float32')  # float32 / int16
+app.config['POSE_DATA_COMPRESS'] = os.environ.get('POSE_DATA_COMPRESS', 'true').lower() == 'true'
+app.config['FUSED_PIPELINE'] = os.environ.get('FUSED_PIPELINE', 'true').lower() == 'true'  # 前処理とポーズ検出を1回のデコードで実行
+app.config['ANALYSIS_FPS'] = float(os.environ.get('ANALYSIS_FPS', '0'))  # 解析する実効fps（0 で5フレームに1フレーム）
+app.config['ENHANCEMENT_PROFILE'] = os.environ.get('ENHANCEMENT_PROFILE', 'auto')  # auto / none / clahe / denoise / full
+app.config['WRITE_PREPROCESSED_VIDEO'] = os.environ.get('WRITE_PREPROCESSED_VIDEO', 'false').lower() == 'true'
+app.config['PREPROCESS_SHORT_SIDE'] = int(os.environ.get('PREPROCESS_SHORT_SIDE', '360'))  # 前処理後の短辺の画素数
+# 前処理を時間区間に分けて並列に実行するプロセス数（ワーカーごと、1 で分割しない）
+app.config['PREPROCESS_SEGMENTS'] = int(os.environ.get('PREPROCESS_SEGMENTS', '1'))
+# デコード先読み・書き込み待ちのフレーム数（0 で無効）。未指定時はワーカー数より CPU コアが多い場合だけ有効にする
+app.config['FRAME_QUEUE_DEPTH'] = int(os.environ.get(
+    'FRAME_QUEUE_DEPTH', '4' if (os.cpu_count() or 1) > app.config['ANALYSIS_WORKERS'] else '0'
+))
 
 # アップロードフォルダの作成
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 
 # 許可されるファイル拡張子
-ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'm4v', 'wmv'}
+ALLOWED_EXTENSIONS = {extension.lstrip('.') for extension in SUPPORTED_EXTENSIONS}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 # サービスインスタンスの初期化
+# ポーズ検出・動作解析・アドバイス生成は各ワーカープロセスが個別に保持する
 try:
     video_processor = VideoProcessor()
-    pose_detector = PoseDetector()
-    motion_analyzer = MotionAnalyzer()
-    
-    if advice_available:
-        advice_generator = AdviceGenerator()
-    else:
-        advice_generator = None
-        
+    video_processor.target_short_side = app.config['PREPROCESS_SHORT_SIDE']
     print("All services initialized successfully")
 except Exception as e:
     print(f"Error initializing services: {e}")
     video_processor = None
-    pose_detector = None
-    motion_analyzer = None
-    advice_generator = None
+
+# 解析ジョブキューとワーカープール
+job_queue = JobQueue(app.config['DATABASE_PATH'])
+upload_registry = UploadRegistry(app.config['DATABASE_PATH'])
+result_cache = ResultCache(app.config['DATABASE_PATH'])
+result_store = ResultStore(app.config['DATABASE_PATH'], cache_size=app.config['RESULT_CACHE_SIZE'])
+batch_registry = BatchRegistry(app.config['DATABASE_PATH'])
+metrics_store = MetricsStore(app.config['DATABASE_PATH'])
+advice_version_store = AdviceVersionStore(app.config['DATABASE_PATH'])
+chunked_uploads = ChunkedUploadManager(
+    app.config['DATABASE_PATH'],
+    os.path.join(app.config['UPLOAD_FOLDER'], '.partial'),
+    app.config['MAX_CONTENT_LENGTH'],
+    video_processor
+)
+
+retention_manager = RetentionManager(
+    app.config['UPLOAD_FOLDER'],
+    app.config['OUTPUT_FOLDER'],
+    job_queue,
+    upload_registry,
+    result_store,
+    chunked_uploads,
+    advice_versions=advice_version_store,
+    result_cache=result_cache,
+    ttl_seconds=app.config['RETENTION_TTL_HOURS'] * 3600,
+    quota_bytes=app.config['STORAGE_QUOTA_MB'] * 1024 * 1024,
+    interval=app.config['RETENTION_INTERVAL_SECONDS']
+)
+
+# 受付制御（実測した処理速度から待ち時間を見積もり、混雑時は 429 を返す）
+throughput_model = ThroughputModel(job_queue, video_processor.frame_skip if video_processor else 5,
+                                   fused=app.config['FUSED_PIPELINE'], analysis_fps=app.config['ANALYSIS_FPS'])
+admission_controller = AdmissionController(
+    job_queue,
+    throughput_model,
+    app.config['ANALYSIS_WORKERS'],
+    max_wait_seconds=app.config['ADMISSION_MAX_WAIT_SECONDS'],
+    max_queued_per_client=app.config['MAX_QUEUED_PER_CLIENT'],
+    max_queue_depth=app.config['MAX_QUEUE_DEPTH']
+)
+
+# 分割アップロードの推奨チャンクサイズ
+CHUNK_SIZE = 4 * 1024 * 1024
+worker_pool = None
+worker_pool_lock = threading.Lock()
+
+def get_worker_pool():
+    """ワーカープールを取得（未起動なら起動）"""
+    global worker_pool
+    with worker_pool_lock:
+        if worker_pool is None:
+            worker_pool = WorkerPool(
+                app.config['DATABASE_PATH'],
+                num_workers=app.config['ANALYSIS_WORKERS'],
+                model_complexity=app.config['POSE_MODEL_COMPLEXITY'],
+                preprocess_segments=app.config['PREPROCESS_SEGMENTS'],
+                target_short_side=app.config['PREPROCESS_SHORT_SIDE']
+            )
+            worker_pool.start()
+            # 保持期間管理の掃除スレッドもワーカーと同時に起動する
+            retention_manager.start()
+    return worker_pool
+
+def worker_pool_status():
+    """ワーカーの生存状況（参照のみ、未起動のプールは起動しない）"""
+    pool = worker_pool
+    if pool is None:
+        return {'started': False, 'configured': app.config['ANALYSIS_WORKERS'], 'alive': 0, 'ready': 0,
+                'restarts': 0, 'pids': []}
+    return dict(pool.status(), started=True)
+
+def save_upload(file, file_path):
+    """
+    アップロードファイルを保存して登録（同じ内容の既存ファイルがあればそちらを再利用）
+    
+    Returns:
+        (upload_id, 保存先パス, SHA-256, 既存ファイルを再利用したか)
+    """
+    saved = save_with_hash(file.stream, file_path)
+    return register_upload(file_path, saved['sha256'], saved['size'], secure_filename(file.filename))
+
+def register_upload(file_path, content_hash, file_size, filename=None):
+    """
+    保存済みファイルを登録（同じ内容の既存ファイルがあれば新しいファイルは削除）
+    
+    Returns:
+        (upload_id, 保存先パス, SHA-256, 既存ファイルを再利用したか)
+    """
+    upload_id = Path(file_path).stem
+    existing = upload_registry.find_by_hash(content_hash)
+    if existing is not None:
+        os.remove(file_path)
+        upload_registry.touch(existing['upload_id'])
+        return existing['upload_id'], existing['path'], content_hash, True
+    
+    upload_registry.register(upload_id, file_path, content_hash, file_size, filename)
+    return upload_id, file_path, content_hash, False
+
+def validate_upload(upload_id, file_path):
+    """
+    アップロードの検証（検証済みのメタデータが登録されていれば動画を開き直さない）
+    
+    Returns:
+        VideoProcessor.validate_video と同じ形式の検証結果
+    """
+    upload = upload_registry.get(upload_id)
+    if upload is not None and upload['metadata'] is not None:
+        return {
+            'is_valid': True,
+            'error_message': '',
+            'warnings': upload['warnings'],
+            'metadata': upload['metadata']
+        }
+    
+    start_time = time.perf_counter()
+    validation_result = video_processor.validate_video(file_path)
+    metrics_store.observe('analyzer_stage_duration_seconds', time.perf_counter() - start_time, {'stage': 'validate'})
+    if validation_result['is_valid'] and upload is not None:
+        upload_registry.set_metadata(upload_id, validation_result['metadata'], validation_result['warnings'])
+    return validation_result
+
+def build_upload_response(upload_id, file_path, filename, content_hash, duplicate):
+    """保存済みアップロードを検証してレスポンスを作成"""
+    validation_result = validate_upload(upload_id, file_path)
+    
+    if not validation_result['is_valid']:
+        if not duplicate:
+            os.remove(file_path)  # 無効なファイルを削除
+        return jsonify({
+            'error': f'動画ファイルの検証に失敗しました: {validation_result["error_message"]}'
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'upload_id': upload_id,
+        'content_hash': content_hash,
+        'duplicate': duplicate,
+        'filename': filename,
+        'file_size': validation_result['metadata']['file_size'],
+        'duration': validation_result['metadata']['duration'],
+        'resolution': f"{validation_result['metadata']['width']}x{validation_result['metadata']['height']}",
+        'fps': validation_result['metadata']['fps'],
+        'warnings': validation_result['warnings']
+    })
+
+def current_pipeline_fingerprint():
+    """現在のパイプライン設定の指紋"""
+    return pipeline_fingerprint(
+        video_processor.frame_skip,
+        video_processor.scale,
+        app.config['POSE_MODEL_COMPLEXITY'],
+        ANALYZER_VERSION,
+        fused=app.config['FUSED_PIPELINE'],
+        analysis_fps=app.config['ANALYSIS_FPS'],
+        enhancement=app.config['ENHANCEMENT_PROFILE'],
+        target_short_side=video_processor.target_short_side,
+        preprocess_segments=max(1, app.config['PREPROCESS_SEGMENTS'])
+    )
+
+def find_cached_analysis(content_hash, params):
+    """同じ動画・同じパラメータで実行済み（または実行中）の解析ジョブを検索"""
+    if not content_hash:
+        return None
+    
+    fingerprint = current_pipeline_fingerprint()
+    analysis_id = result_cache.lookup(content_hash, fingerprint, advice_key(params))
+    if analysis_id is None:
+        return None
+    
+    # 失敗したジョブや削除済みの結果は索引から外す
+    job = job_queue.get(analysis_id)
+    result_file = os.path.join(app.config['OUTPUT_FOLDER'], analysis_id, 'analysis_result.json')
+    if job is not None and (job['state'] in (JobQueue.QUEUED, JobQueue.RUNNING)
+                            or (job['state'] == JobQueue.DONE and os.path.exists(result_file))):
+        return job
+    
+    result_cache.remove(analysis_id)
+    return None
+
+def register_cached_analysis(content_hash, params, analysis_id):
+    """解析ジョブを結果キャッシュ索引に登録"""
+    if not content_hash:
+        return
+    
+    fingerprint = current_pipeline_fingerprint()
+    result_cache.add(content_hash, fingerprint, advice_key(params), analysis_id)
+
+def is_valid_id(value):
+    """アップロードID・解析IDとして正しいか（どちらも UUID。パスの一部になるため、それ以外は扱わない）"""
+    try:
+        uuid.UUID(str(value))
+    except ValueError:
+        return False
+    return True
+
+def resolve_upload(upload_id):
+    """アップロードIDから登録情報を取得（ファイルが存在しなければ None）"""
+    if not is_valid_id(upload_id):
+        return None
+
+    upload_info = upload_registry.get(upload_id)
+    if upload_info is None:
+        # 登録導入前のアップロード
+        upload_info = upload_registry.resolve_legacy(upload_id, app.config['UPLOAD_FOLDER'], ALLOWED_EXTENSIONS)
+    
+    if upload_info is None or not os.path.exists(upload_info['path']):
+        return None
+    upload_registry.touch(upload_id)
+    return upload_info
+
+def request_client_id(api_key=''):
+    """公平な実行順・受付上限の単位となるクライアントID（APIキー > X-Client-Id > 接続元）"""
+    return client_key(api_key, request.headers.get('X-Client-Id', ''), request.remote_addr or '')
+
+def estimate_analysis_seconds(upload_id, file_path):
+    """プローブした動画の長さと実測の処理速度から処理時間を見積もる"""
+    validation_result = validate_upload(upload_id, file_path)
+    metadata = validation_result.get('metadata') or {}
+    return throughput_model.estimate_seconds(metadata.get('duration'), metadata.get('fps'))
+
+def too_many_requests(decision, **extra):
+    """受付制御で断った場合の 429 レスポンス（Retry-After 付き）"""
+    messages = {
+        'client_queue_full': '待機中の解析が上限に達しています。しばらくしてから再度お試しください',
+        'queue_full': 'サーバーが混雑しています。しばらくしてから再度お試しください',
+        'wait_too_long': '解析の待ち時間が長くなっています。しばらくしてから再度お試しください'
+    }
+    body = {
+        'error': messages.get(decision['reason'], messages['queue_full']),
+        'reason': decision['reason'],
+        'retry_after': decision['retry_after'],
+        'estimated_wait': decision['estimated_wait']
+    }
+    body.update(extra)
+    response = jsonify(body)
+    response.headers['Retry-After'] = str(decision['retry_after'])
+    return response, 429
+
+def submit_analysis(video_path, content_hash, params, batch_id=None, client_id=None, estimated_seconds=None):
+    """
+    解析ジョブをキューに登録（同じ動画・同じパラメータの解析があれば再利用）
+    
+    Returns:
+        (ジョブの辞書, 既存の解析を再利用したか)
+    """
+    # 処理タイムラインの記録を指定された場合は既存の解析を再利用せずに実行する
+    cached_job = find_cached_analysis(content_hash, params) if not params.get('trace_sample_every') else None
+    if cached_job is not None:
+        result_store.touch(cached_job['analysis_id'])
+        return cached_job, True
+    
+    analysis_id = str(uuid.uuid4())
+    output_dir = os.path.join(app.config['OUTPUT_FOLDER'], analysis_id)
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # ポーズデータ（pose_data.npz）の保存形式と前処理の実行方式はワーカーに渡す
+    job_params = dict(params, pose_precision=app.config['POSE_DATA_PRECISION'],
+                      pose_compress=app.config['POSE_DATA_COMPRESS'],
+                      fused_pipeline=app.config['FUSED_PIPELINE'],
+                      write_preprocessed=app.config['WRITE_PREPROCESSED_VIDEO'],
+                      frame_queue_depth=app.config['FRAME_QUEUE_DEPTH'],
+                      analysis_fps=app.config['ANALYSIS_FPS'],
+                      enhancement=app.config['ENHANCEMENT_PROFILE'])
+    job = job_queue.enqueue(analysis_id, video_path, output_dir, job_params, batch_id, client_id, estimated_seconds)
+    register_cached_analysis(content_hash, params, analysis_id)
+    return job, False
 
 @app.route('/', methods=['GET'])
 def index():
@@ -84,10 +364,16 @@ def index():
         'status': 'running',
         'endpoints': {
             'upload': '/api/upload',
+            'chunked_upload': '/api/uploads',
             'analyze': '/api/analyze',
+            'batches': '/api/batches',
             'status': '/api/status/<analysis_id>',
+            'events': '/api/events/<analysis_id>',
+            'advice': '/api/advice/<analysis_id>',
+            'regenerate_advice': '/api/advice/<analysis_id> (POST)',
             'download': '/api/download/<analysis_id>/<file_type>',
-            'health': '/api/health'
+            'health': '/api/health',
+            'metrics': '/metrics'
         }
     })
 
@@ -116,32 +402,135 @@ def upload_video():
         saved_filename = f"{upload_id}{file_extension}"
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], saved_filename)
         
-        file.save(file_path)
+        # 保存しながら内容ハッシュを計算（同じ内容の既存アップロードは再利用）
+        upload_id, file_path, content_hash, duplicate = save_upload(file, file_path)
         
         # ファイル検証
-        validation_result = video_processor.validate_video(file_path)
+        return build_upload_response(upload_id, file_path, filename, content_hash, duplicate)
         
-        if not validation_result['is_valid']:
-            os.remove(file_path)  # 無効なファイルを削除
+    except Exception as e:
+        return jsonify({'error': f'アップロード中にエラーが発生しました: {str(e)}'}), 500
+
+
+def chunked_upload_error(error):
+    """分割アップロードのエラーレスポンス"""
+    response = jsonify({'error': str(error), 'offset': error.offset})
+    if error.offset is not None:
+        response.headers['Upload-Offset'] = str(error.offset)
+    return response, error.status_code
+
+
+@app.route('/api/uploads', methods=['POST'])
+def create_chunked_upload():
+    """
+    分割アップロードの開始
+    
+    JSON: {"filename": "serve.mp4", "file_size": <バイト数>}
+    以降は PATCH /api/uploads/<upload_id> でチャンクを順に送信する。
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        filename = secure_filename(data.get('filename', ''))
+        if not filename or not allowed_file(filename):
             return jsonify({
-                'error': f'動画ファイルの検証に失敗しました: {validation_result["error_message"]}'
+                'error': f'サポートされていないファイル形式です。対応形式: {", ".join(ALLOWED_EXTENSIONS)}'
             }), 400
         
+        upload_id = str(uuid.uuid4())
+        session = chunked_uploads.create(upload_id, filename, Path(filename).suffix, int(data.get('file_size', 0)))
+        
         return jsonify({
             'success': True,
             'upload_id': upload_id,
-            'filename': filename,
-            'file_size': validation_result['metadata']['file_size'],
-            'duration': validation_result['metadata']['duration'],
-            'resolution': f"{validation_result['metadata']['width']}x{validation_result['metadata']['height']}",
-            'fps': validation_result['metadata']['fps'],
-            'warnings': validation_result['warnings']
-        })
+            'offset': session['received'],
+            'chunk_size': CHUNK_SIZE,
+            'upload_url': f'/api/uploads/{upload_id}'
+        }), 201
         
+    except ChunkedUploadError as e:
+        return chunked_upload_error(e)
     except Exception as e:
         return jsonify({'error': f'アップロード中にエラーが発生しました: {str(e)}'}), 500
 
 
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_chunked_upload(upload_id):
+    """分割アップロードの受信状況（再開位置の確認用）"""
+    session = chunked_uploads.get(upload_id)
+    if session is None:
+        return jsonify({'error': '指定されたアップロードが見つかりません'}), 404
+    
+    response = jsonify({
+        'upload_id': upload_id,
+        'offset': session['received'],
+        'file_size': session['total_size'],
+        'container': session['container']
+    })
+    response.headers['Upload-Offset'] = str(session['received'])
+    return response
+
+
+@app.route('/api/uploads/<upload_id>', methods=['PATCH'])
+def append_chunked_upload(upload_id):
+    """
+    チャンクの送信
+    
+    ヘッダー:
+        Upload-Offset: チャンクの開始位置（受信済みバイト数と一致すること）
+        Upload-Checksum: sha256 <16進ハッシュ>（オプション）
+    ボディ: チャンクのバイト列
+    
+    最後のチャンクを受信するとファイルを確定・検証し、/api/upload と同じ形式で応答する。
+    """
+    try:
+        offset = request.headers.get('Upload-Offset', type=int)
+        if offset is None:
+            return jsonify({'error': 'Upload-Offset ヘッダーが指定されていません'}), 400
+        
+        checksum = request.headers.get('Upload-Checksum', '')
+        expected_sha256 = None
+        if checksum:
+            algorithm, _, value = checksum.partition(' ')
+            if algorithm.lower() != 'sha256' or not value:
+                return jsonify({'error': 'Upload-Checksum は "sha256 <hex>" 形式で指定してください'}), 400
+            expected_sha256 = value.strip()
+        
+        session = chunked_uploads.append(upload_id, offset, request.stream, expected_sha256)
+        
+        if session['received'] < session['total_size']:
+            response = jsonify({
+                'upload_id': upload_id,
+                'offset': session['received'],
+                'file_size': session['total_size'],
+                'completed': False
+            })
+            response.headers['Upload-Offset'] = str(session['received'])
+            return response
+        
+        # 全チャンク受信済み：アップロードフォルダに移動して通常のアップロードと同様に登録
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{upload_id}{session['extension']}")
+        saved = chunked_uploads.finalize(upload_id, file_path)
+        upload_id, file_path, content_hash, duplicate = register_upload(
+            file_path, saved['sha256'], saved['size'], session['filename']
+        )
+        return build_upload_response(upload_id, file_path, session['filename'], content_hash, duplicate)
+        
+    except ChunkedUploadError as e:
+        return chunked_upload_error(e)
+    except Exception as e:
+        return jsonify({'error': f'アップロード中にエラーが発生しました: {str(e)}'}), 500
+
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    """分割アップロードの中止"""
+    if chunked_uploads.get(upload_id) is None:
+        return jsonify({'error': '指定されたアップロードが見つかりません'}), 404
+    
+    chunked_uploads.abort(upload_id)
+    return jsonify({'success': True, 'upload_id': upload_id})
+
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_video():
     """動画解析の実行"""
@@ -159,6 +548,7 @@ def analyze_video():
             use_chatgpt = data.get('use_chatgpt', False)
             api_key = data.get('api_key', '')
             user_concerns = data.get('user_concerns', '')  # 新機能：気になっていること
+            trace = bool(data.get('trace', False))
         else:
             # FormData形式の場合（動画ファイルと一緒に送信される場合）
             if 'video' not in request.files:
@@ -179,7 +569,7 @@ def analyze_video():
             file_extension = Path(filename).suffix
             saved_filename = f"{upload_id}{file_extension}"
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], saved_filename)
-            file.save(file_path)
+            upload_id, file_path, content_hash, _ = save_upload(file, file_path)
             
             # FormDataからパラメータを取得
             user_level = request.form.get('user_level', 'intermediate')
@@ -187,87 +577,60 @@ def analyze_video():
             use_chatgpt = request.form.get('use_chatgpt', 'false').lower() == 'true'
             api_key = request.form.get('api_key', '').strip()
             user_concerns = request.form.get('user_concerns', '').strip()  # 新機能：気になっていること
+            trace = request.form.get('trace', 'false').lower() == 'true'
         
         # アップロードされたファイルの確認（JSON形式の場合）
         if request.content_type and 'application/json' in request.content_type:
-            uploaded_files = [f for f in os.listdir(app.config['UPLOAD_FOLDER']) if f.startswith(upload_id)]
-            
-            if not uploaded_files:
+            upload_info = resolve_upload(upload_id)
+            if upload_info is None:
                 return jsonify({'error': '指定されたファイルが見つかりません'}), 404
             
-            video_path = os.path.join(app.config['UPLOAD_FOLDER'], uploaded_files[0])
+            video_path = upload_info['path']
+            content_hash = upload_info['content_hash']
         else:
             # FormData形式の場合は既にfile_pathが設定済み
             video_path = file_path
         
-        # 出力ディレクトリの作成
-        analysis_id = str(uuid.uuid4())
-        output_dir = os.path.join(app.config['OUTPUT_FOLDER'], analysis_id)
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # 解析実行（user_concernsを追加）
-        analysis_result = perform_analysis(video_path, output_dir, user_level, focus_areas, use_chatgpt, api_key, user_concerns)
-        
-        # 解析結果をファイルに保存（NumPy型を変換）
-        analysis_result_path = os.path.join(output_dir, 'analysis_result.json')
-        with open(analysis_result_path, 'w', encoding='utf-8') as f:
-            # NumPy型をPython標準型に変換してからJSONに保存
-            converted_result = convert_numpy_types(analysis_result)
-            json.dump(converted_result, f, indent=2, ensure_ascii=False)  
-        # デバッグ: レスポンスデータの構造を確認
-        print("=== レスポンスデータ構造 ===")
-        print(f"analysis_result keys: {list(analysis_result.keys())}")
-        if 'total_score' in analysis_result:
-            print(f"total_score: {analysis_result['total_score']}")
-        if 'phase_analysis' in analysis_result:
-            print(f"phase_analysis keys: {list(analysis_result['phase_analysis'].keys())}")
-        if 'user_concerns' in analysis_result:
-            print(f"user_concerns: {analysis_result['user_concerns']}")
-        print("========================")
+        params = {
+            'user_level': user_level,
+            'focus_areas': focus_areas,
+            'use_chatgpt': use_chatgpt,
+            'api_key': api_key,
+            'user_concerns': user_concerns,
+            # 処理タイムライン（trace.json）を保存する場合のフレームのサンプル間隔
+            'trace_sample_every': app.config['TRACE_SAMPLE_EVERY'] if trace else 0
+        }
         
-        # 安全なレスポンスデータの作成（NumPy型変換）
-        try:
-            response_data = {
-                'success': True,
-                'analysis_id': analysis_id,
-                'result': convert_numpy_types(analysis_result)  # NumPy型を変換
-            }
-            
-            # JSONシリアライゼーションのテスト
-            test_json = json.dumps(response_data, ensure_ascii=False)
-            print("JSONシリアライゼーション成功")
-            print(f"レスポンスサイズ: {len(test_json)} 文字")
-            
-            # レスポンス構造の詳細ログ
-            print("=== レスポンス構造詳細 ===")
-            print(f"response_data keys: {list(response_data.keys())}")
-            print(f"result keys: {list(response_data['result'].keys())}")
-            if 'advice' in response_data['result']:
-                print(f"advice keys: {list(response_data['result']['advice'].keys())}")
-            print("========================")
-            
-            return jsonify(response_data)
-            
-        except Exception as json_error:
-            print(f"JSONシリアライゼーションエラー: {json_error}")
-            
-            # 安全な基本レスポンスを作成
-            safe_response = {
-                'success': True,
-                'analysis_id': analysis_id,
-                'result': {
-                    'total_score': analysis_result.get('total_score', 7.5),
-                    'frame_count': analysis_result.get('frame_count', 100),
-                    'phase_analysis': analysis_result.get('phase_analysis', {}),
-                    'advice': {
-                        'overall_advice': 'サービスフォームの解析が完了しました。',
-                        'technical_points': ['基本的なフォームは良好です'],
-                        'practice_suggestions': ['継続的な練習をお勧めします']
-                    }
-                }
-            }
-            
-            return jsonify(safe_response)
+        # 新たに解析する場合は見積もり待ち時間・待機数の上限を確認
+        client_id = request_client_id(api_key)
+        estimated_seconds = None
+        decision = None
+        if params['trace_sample_every'] or find_cached_analysis(content_hash, params) is None:
+            estimated_seconds = estimate_analysis_seconds(upload_id, video_path)
+        
+        # 解析ジョブをキューに登録（解析はワーカープロセスで実行）
+        # 同じ動画・同じパラメータの解析があれば再実行せずに返す
+        with admission_controller.lock:
+            if estimated_seconds is not None:
+                decision = admission_controller.check(client_id, [estimated_seconds])
+                if not decision['admitted']:
+                    return too_many_requests(decision, upload_id=upload_id)
+            job, cached = submit_analysis(video_path, content_hash, params,
+                                          client_id=client_id, estimated_seconds=estimated_seconds)
+        analysis_id = job['analysis_id']
+        if not cached:
+            get_worker_pool()
+        
+        return jsonify({
+            'success': True,
+            'analysis_id': analysis_id,
+            'status': job['state'],
+            'cached': cached,
+            'queue_position': job_queue.queue_position(analysis_id),
+            'estimated_wait': decision['estimated_wait'] if decision else None,
+            'estimated_seconds': round(estimated_seconds, 1) if estimated_seconds is not None else None,
+            'status_url': f'/api/status/{analysis_id}'
+        }), (200 if cached else 202)
         
     except Exception as e:
         import traceback
@@ -281,61 +644,612 @@ def analyze_video():
         return jsonify({'error': f'解析中にエラーが発生しました: {str(e)}'}), 500
 
 
+def form_analysis_params(values):
+    """フォーム・クエリ文字列から解析パラメータを取得"""
+    return {
+        'user_level': values.get('user_level', 'intermediate'),
+        'focus_areas': values.get('focus_areas', '').split(',') if values.get('focus_areas') else [],
+        'use_chatgpt': values.get('use_chatgpt', 'false').lower() == 'true',
+        'api_key': values.get('api_key', '').strip(),
+        'user_concerns': values.get('user_concerns', '').strip()
+    }
+
+def collect_archive_clips(stream, batch_id):
+    """
+    zip アーカイブをディスクに保存し、動画を一件ずつ展開して登録
+    
+    Returns:
+        クリップごとの {'filename', 'upload_id', 'path', 'content_hash'} または {'filename', 'error'}
+    """
+    archive_path = os.path.join(app.config['UPLOAD_FOLDER'], '.partial', f'{batch_id}.zip')
+    save_with_hash(stream, archive_path)
+    
+    clips = []
+    try:
+        for entry in extract_archive(archive_path, app.config['UPLOAD_FOLDER'], ALLOWED_EXTENSIONS,
+                                     app.config['MAX_CONTENT_LENGTH'], app.config['BATCH_MAX_CLIPS'],
+                                     app.config['BATCH_MAX_EXTRACT_MB'] * 1024 * 1024):
+            filename = secure_filename(entry['filename'])
+            if 'error' in entry:
+                clips.append({'filename': filename, 'error': entry['error']})
+                continue
+            
+            upload_id, file_path, content_hash, duplicate = register_upload(
+                entry['path'], entry['sha256'], entry['size'], filename
+            )
+            validation_result = validate_upload(upload_id, file_path)
+            if not validation_result['is_valid']:
+                if not duplicate:
+                    os.remove(file_path)
+                clips.append({
+                    'filename': filename,
+                    'error': f'動画ファイルの検証に失敗しました: {validation_result["error_message"]}'
+                })
+                continue
+            
+            clips.append({'filename': filename, 'upload_id': upload_id, 'path': file_path, 'content_hash': content_hash})
+    finally:
+        os.remove(archive_path)
+    
+    return clips
+
+def build_batch_status(batch):
+    """バッチの全体進捗とクリップごとの状態・結果を作成"""
+    jobs = job_queue.get_many([item['analysis_id'] for item in batch['items'] if item['analysis_id']])
+    
+    counts = {state: 0 for state in JobQueue.STATES}
+    clips = []
+    for item in batch['items']:
+        job = jobs.get(item['analysis_id']) if item['analysis_id'] else None
+        if item['error'] or job is None:
+            status = JobQueue.FAILED
+        else:
+            status = job['state']
+        counts[status] += 1
+        
+        clip = {
+            'position': item['position'],
+            'filename': item['filename'],
+            'upload_id': item['upload_id'],
+            'analysis_id': item['analysis_id'],
+            'cached': item['cached'],
+            'status': status,
+            'stage': job['stage'] if job else None,
+            'percent': round(job_fraction(job) * 100, 1),
+            'error': item['error'] or (job['error'] if job else None)
+        }
+        if item['analysis_id']:
+            clip['status_url'] = f"/api/status/{item['analysis_id']}"
+        if status == JobQueue.DONE:
+            record = result_store.get(item['analysis_id'])
+            clip['summary'] = record['summary'] if record else None
+        clips.append(clip)
+    
+    total = len(clips)
+    if counts[JobQueue.QUEUED] == total:
+        status = JobQueue.QUEUED
+    elif counts[JobQueue.QUEUED] or counts[JobQueue.RUNNING]:
+        status = JobQueue.RUNNING
+    else:
+        status = JobQueue.DONE
+    
+    return {
+        'batch_id': batch['batch_id'],
+        'status': status,
+        'source': batch['source'],
+        'total': total,
+        'counts': counts,
+        'percent': round(sum(clip['percent'] for clip in clips) / total, 1) if total else 100.0,
+        'created_at': batch['created_at'],
+        'clips': clips
+    }
+
+
+@app.route('/api/batches', methods=['POST'])
+def create_batch():
+    """
+    一括解析の開始
+    
+    次のいずれかで複数の動画を指定する:
+        JSON: {"upload_ids": [...], "user_level": ..., "focus_areas": [...], ...}
+        multipart/form-data: archive=<zip ファイル> と解析パラメータのフォーム項目
+        application/zip: リクエストボディに zip（解析パラメータはクエリ文字列）
+    
+    全クリップを解析ジョブとしてキューに登録し、ワーカープールで並行して処理する。
+    """
+    try:
+        batch_id = str(uuid.uuid4())
+        
+        if request.content_type and 'application/json' in request.content_type:
+            data = request.get_json(silent=True) or {}
+            upload_ids = data.get('upload_ids') or []
+            if not isinstance(upload_ids, list) or not upload_ids:
+                return jsonify({'error': 'upload_idsが指定されていません'}), 400
+            if len(upload_ids) > app.config['BATCH_MAX_CLIPS']:
+                return jsonify({'error': f'一度に解析できる動画は{app.config["BATCH_MAX_CLIPS"]}件までです'}), 400
+            
+            source = 'uploads'
+            params = {
+                'user_level': data.get('user_level', 'intermediate'),
+                'focus_areas': data.get('focus_areas', []),
+                'use_chatgpt': data.get('use_chatgpt', False),
+                'api_key': data.get('api_key', ''),
+                'user_concerns': data.get('user_concerns', '')
+            }
+            
+            clips = []
+            for upload_id in upload_ids:
+                upload_info = resolve_upload(str(upload_id))
+                if upload_info is None:
+                    clips.append({'upload_id': upload_id, 'error': '指定されたファイルが見つかりません'})
+                else:
+                    clips.append({
+                        'filename': upload_info['filename'],
+                        'upload_id': upload_id,
+                        'path': upload_info['path'],
+                        'content_hash': upload_info['content_hash']
+                    })
+        else:
+            source = 'archive'
+            if 'archive' in request.files:
+                params = form_analysis_params(request.form)
+                stream = request.files['archive'].stream
+            elif request.content_type and 'zip' in request.content_type:
+                params = form_analysis_params(request.args)
+                stream = request.stream
+            else:
+                return jsonify({'error': 'upload_ids または zip アーカイブを指定してください'}), 400
+            
+            try:
+                clips = collect_archive_clips(stream, batch_id)
+            except zipfile.BadZipFile:
+                return jsonify({'error': 'zip アーカイブを読み込めません'}), 400
+            if not clips:
+                return jsonify({'error': 'アーカイブに動画ファイルが含まれていません'}), 400
+        
+        # 新たに解析するクリップの処理時間を見積もり、まとめて受付可否を判定
+        client_id = request_client_id(params['api_key'])
+        for clip in clips:
+            if 'error' not in clip and find_cached_analysis(clip['content_hash'], params) is None:
+                clip['estimated_seconds'] = estimate_analysis_seconds(clip['upload_id'], clip['path'])
+        
+        # 全クリップをキューに登録（ワーカーの起動とアドバイス生成器の準備はバッチで一度だけ）
+        with admission_controller.lock:
+            estimates = [clip['estimated_seconds'] for clip in clips if 'estimated_seconds' in clip]
+            if estimates:
+                decision = admission_controller.check(client_id, estimates)
+                if not decision['admitted']:
+                    # 登録済みのアップロードは再送せずに upload_ids で再試行できる
+                    return too_many_requests(
+                        decision, upload_ids=[clip['upload_id'] for clip in clips if 'error' not in clip]
+                    )
+            
+            for clip in clips:
+                if 'error' in clip:
+                    continue
+                job, cached = submit_analysis(clip['path'], clip['content_hash'], params, batch_id,
+                                              client_id, clip.get('estimated_seconds'))
+                clip['analysis_id'] = job['analysis_id']
+                clip['cached'] = cached
+        
+        stored_params = {key: value for key, value in params.items() if key not in JobQueue.SENSITIVE_PARAMS}
+        batch_registry.create(batch_id, source, stored_params, clips)
+        if any(clip.get('analysis_id') and not clip['cached'] for clip in clips):
+            get_worker_pool()
+        
+        response = build_batch_status(batch_registry.get(batch_id))
+        response.update({'success': True, 'status_url': f'/api/batches/{batch_id}'})
+        return jsonify(response), 202
+        
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': f'一括解析の開始中にエラーが発生しました: {str(e)}'}), 500
+
+
+@app.route('/api/batches/<batch_id>', methods=['GET'])
+def get_batch_status(batch_id):
+    """一括解析の全体進捗とクリップごとの結果"""
+    try:
+        batch = batch_registry.get(batch_id)
+        if batch is None:
+            return jsonify({'error': '指定されたバッチIDが見つかりません'}), 404
+        
+        return conditional_json(build_batch_status(batch))
+        
+    except Exception as e:
+        return jsonify({'error': f'状況確認中にエラーが発生しました: {str(e)}'}), 500
+
+
+def conditional_json(payload, last_modified=None):
+    """
+    JSON レスポンスに内容ハッシュの ETag を付け、条件付き GET に応答
+    
+    If-None-Match / If-Modified-Since が一致すれば本文なしの 304 を返す。
+    """
+    response = jsonify(payload)
+    response.set_etag(hashlib.sha256(response.get_data()).hexdigest())
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+# ロングポーリング・イベントストリームの設定
+STATUS_MAX_WAIT_SECONDS = 60
+EVENT_HEARTBEAT_SECONDS = 15
+
+def advice_state(job, record):
+    """
+    アドバイスの状態
+    
+    Returns:
+        'pending'（生成待ち）/ 'ready' / 'failed'、解析が存在しなければ None
+    """
+    if job is not None:
+        return {JobQueue.DONE: 'ready', JobQueue.FAILED: 'failed'}.get(job['state'], 'pending')
+    if record is None:
+        return None
+    # ジョブが残っていないアドバイス生成前の結果は中断されたものとみなす
+    return 'failed' if record['status'] == 'partial' else 'ready'
+
+def build_analysis_status(analysis_id, job=None):
+    """
+    解析状況レスポンスの作成（ジョブが存在しない場合は None）
+    
+    状態はジョブキュー、スコア要約と成果物情報は結果ストアから取得し、
+    analysis_result.json は読み込まない。
+    """
+    if not is_valid_id(analysis_id):
+        return None
+    if job is None:
+        job = job_queue.get(analysis_id)
+    record = result_store.get(analysis_id)
+    
+    if record is None and job is None:
+        # 結果ストア導入前の解析は初回参照時に取り込む
+        output_dir = os.path.join(app.config['OUTPUT_FOLDER'], analysis_id)
+        if not os.path.isdir(output_dir):
+            return None
+        if result_store.import_output_dir(output_dir):
+            record = result_store.get(analysis_id)
+    
+    if job is not None:
+        status = job['state']
+    elif record is not None:
+        status = record['status']
+    else:
+        status = JobQueue.FAILED
+    
+    # スコア・フェーズはアドバイス生成の完了を待たずに公開される（result_ready）
+    response = {
+        'analysis_id': analysis_id,
+        'status': status,
+        'stage': job['stage'] if job else None,
+        'files': record['files'] if record else {},
+        'summary': record['summary'] if record else None,
+        'result_ready': record is not None,
+        'advice_status': advice_state(job, record),
+        'advice_url': f'/api/advice/{analysis_id}'
+    }
+    
+    if job is not None:
+        response.update({
+            'version': job['version'],
+            'progress': job['progress'],
+            'queue_position': job_queue.queue_position(analysis_id),
+            'error': job['error'],
+            'created_at': job['created_at'],
+            'started_at': job['started_at'],
+            'finished_at': job['finished_at']
+        })
+    
+    return response
+
+
 @app.route('/api/status/<analysis_id>', methods=['GET'])
 def get_analysis_status(analysis_id):
-    """解析状況の確認"""
+    """
+    解析状況の確認
+    
+    クエリ ?wait=<秒>&version=<n> を指定すると、ジョブの version が n から
+    変わるか終了するまで最大 wait 秒待ってから応答する（ロングポーリング）。
+    """
     try:
-        output_dir = os.path.join(app.config['OUTPUT_FOLDER'], analysis_id)
+        job = None
+        wait = request.args.get('wait', type=float)
+        if wait:
+            version = request.args.get('version', default=-1, type=int)
+            job = job_queue.wait_for_change(analysis_id, version, min(wait, STATUS_MAX_WAIT_SECONDS))
         
-        if not os.path.exists(output_dir):
+        response = build_analysis_status(analysis_id, job)
+        if response is None:
             return jsonify({'error': '指定された解析IDが見つかりません'}), 404
         
-        # ファイル存在確認
-        files_status = {}
-        expected_files = [
-            'analysis_result.json',
-            'pose_data.json',
-            'preprocessed_video.mp4',
-            'pose_visualization.mp4'
-        ]
-        
-        for filename in expected_files:
-            file_path = os.path.join(output_dir, filename)
-            files_status[filename] = {
-                'exists': os.path.exists(file_path),
-                'size': os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        # 実行中は秒単位の更新時刻では変化を表せないため、終了後のみ Last-Modified を付ける
+        last_modified = None
+        if response['status'] in (JobQueue.DONE, JobQueue.FAILED):
+            record = result_store.get(analysis_id)
+            last_modified = response.get('finished_at') or (record['completed_at'] if record else None)
+        return conditional_json(response, last_modified)
+        
+    except Exception as e:
+        return jsonify({'error': f'状況確認中にエラーが発生しました: {str(e)}'}), 500
+
+
+@app.route('/api/events/<analysis_id>', methods=['GET'])
+def stream_analysis_events(analysis_id):
+    """解析進捗の Server-Sent Events ストリーム"""
+    if job_queue.get(analysis_id) is None:
+        return jsonify({'error': '指定された解析IDが見つかりません'}), 404
+    
+    def format_event(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    def generate():
+        version = -1
+        result_sent = False
+        while True:
+            job = job_queue.wait_for_change(analysis_id, version, EVENT_HEARTBEAT_SECONDS)
+            if job is None:
+                yield format_event('error', {'error': '指定された解析IDが見つかりません'})
+                return
+            
+            if job['version'] == version:
+                # 接続維持用のコメント行
+                yield ': heartbeat\n\n'
+                continue
+            
+            version = job['version']
+            
+            # アドバイス生成前の結果が公開されたら一度だけ通知する
+            if not result_sent and (job['progress'].get('latency') or {}).get('time_to_result') is not None:
+                record = result_store.get(analysis_id)
+                if record is not None:
+                    result_sent = True
+                    yield format_event('result', {
+                        'analysis_id': analysis_id,
+                        'summary': record['summary'],
+                        'files': record['files'],
+                        'advice_status': advice_state(job, record),
+                        'time_to_result': job['progress']['latency']['time_to_result']
+                    })
+            
+            event = {
+                'analysis_id': analysis_id,
+                'status': job['state'],
+                'stage': job['stage'],
+                'version': version,
+                'progress': job['progress'],
+                'queue_position': job_queue.queue_position(analysis_id),
+                'error': job['error']
             }
+            
+            if job['state'] in (JobQueue.DONE, JobQueue.FAILED):
+                yield format_event(job['state'], event)
+                return
+            yield format_event('progress', event)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+def advice_versions_of(analysis_id, parent_job):
+    """
+    解析のアドバイスの版一覧（元の版 1 と再生成した版）
+    
+    Returns:
+        {'version', 'params', 'advice_status', 'created_at'} のリスト（版番号順）
+    """
+    versions = [{
+        'version': ORIGINAL_VERSION,
+        'params': {key: value for key, value in (parent_job['params'] if parent_job else {}).items()
+                   if key in ADVICE_PARAMS},
+        'advice_status': advice_state(parent_job, result_store.get(analysis_id)),
+        'created_at': parent_job['created_at'] if parent_job else None
+    }]
+    output_dir = os.path.join(app.config['OUTPUT_FOLDER'], analysis_id)
+    registered = advice_version_store.list(analysis_id)
+    jobs = job_queue.get_many([version['job_id'] for version in registered])
+    for version in registered:
+        versions.append({
+            'version': version['version'],
+            'params': version['params'],
+            'advice_status': version_state(jobs.get(version['job_id']), output_dir, version['version']),
+            'created_at': version['created_at']
+        })
+    return versions
+
+
+def version_state(job, output_dir, version):
+    """再生成した版の状態（ジョブが残っていなければファイルの有無で判断）"""
+    state = advice_state(job, None)
+    if state is None:
+        state = 'ready' if os.path.exists(os.path.join(output_dir, advice_filename(version))) else 'failed'
+    return state
+
+
+@app.route('/api/advice/<analysis_id>', methods=['GET'])
+def get_advice(analysis_id):
+    """
+    アドバイスの取得
+    
+    スコア・フェーズはアドバイス生成を待たずに公開されるため、アドバイスはこのエンドポイントで
+    別途取得する。生成中は 202 を返す。?wait=<秒> を指定すると生成完了まで最大 wait 秒待つ。
+    ?version=<n> で再生成した版を取得する（省略時は元の版 1、'latest' で最新の版）。
+    """
+    try:
+        if not is_valid_id(analysis_id):
+            return jsonify({'error': '指定された解析IDが見つかりません'}), 404
+        output_dir = os.path.join(app.config['OUTPUT_FOLDER'], analysis_id)
+        parent_job = job_queue.get(analysis_id)
+        if parent_job is None and not os.path.isdir(output_dir):
+            return jsonify({'error': '指定された解析IDが見つかりません'}), 404
+        
+        requested = request.args.get('version', str(ORIGINAL_VERSION))
+        if requested == 'latest':
+            registered = advice_version_store.list(analysis_id)
+            version = registered[-1]['version'] if registered else ORIGINAL_VERSION
+        elif requested.isdigit():
+            version = int(requested)
+        else:
+            return jsonify({'error': 'version は版番号または latest を指定してください'}), 400
+        
+        if version == ORIGINAL_VERSION:
+            job_id = analysis_id
+        else:
+            registered_version = advice_version_store.get(analysis_id, version)
+            if registered_version is None:
+                return jsonify({'error': f'指定された版が見つかりません: {version}'}), 404
+            job_id = registered_version['job_id']
+        
+        wait = min(request.args.get('wait', default=0.0, type=float), STATUS_MAX_WAIT_SECONDS)
+        deadline = time.time() + wait
+        job = job_queue.get(job_id)
+        while job is not None and job['state'] in (JobQueue.QUEUED, JobQueue.RUNNING) and time.time() < deadline:
+            job = job_queue.wait_for_change(job_id, job['version'], deadline - time.time())
+        
+        if version == ORIGINAL_VERSION:
+            state = advice_state(job, result_store.get(analysis_id)) or 'failed'
+        else:
+            state = version_state(job, output_dir, version)
+        response = {
+            'analysis_id': analysis_id,
+            'version': version,
+            'advice_status': state,
+            'advice': None,
+            'time_to_advice': (job['progress'].get('latency') or {}).get('time_to_advice') if job else None,
+            'versions': advice_versions_of(analysis_id, parent_job)
+        }
+        
+        if state in ('pending', 'failed'):
+            response['error'] = job['error'] if job else None
+            return jsonify(response), (202 if state == 'pending' else 200)
+        
+        advice_path = os.path.join(output_dir, advice_filename(version))
+        if os.path.exists(advice_path):
+            with open(advice_path, 'rb') as f:
+                response['advice'] = json.loads(f.read())
+        elif version == ORIGINAL_VERSION and os.path.exists(os.path.join(output_dir, ANALYSIS_RESULT_FILENAME)):
+            # 分割前の解析はアドバイスが解析結果に含まれている
+            with open(os.path.join(output_dir, ANALYSIS_RESULT_FILENAME), 'rb') as f:
+                response['advice'] = json.loads(f.read()).get('advice')
+        else:
+            return jsonify({'error': 'アドバイスが見つかりません'}), 404
+        
+        result_store.touch(analysis_id)
+        return conditional_json(response, os.path.getmtime(advice_path) if os.path.exists(advice_path) else None)
         
-        # 解析結果の読み込み（存在する場合）
-        result_file = os.path.join(output_dir, 'analysis_result.json')
-        analysis_summary = None
-        
-        if os.path.exists(result_file):
-            with open(result_file, 'r', encoding='utf-8') as f:
-                analysis_data = json.load(f)
-                analysis_summary = {
-                    'overall_score': analysis_data.get('overall_score', 0.0),
-                    'technical_scores': {
-                        category: results.get('overall_score', 0.0)
-                        for category, results in analysis_data.get('technical_analysis', {}).items()
-                    }
-                }
+    except Exception as e:
+        return jsonify({'error': f'アドバイス取得中にエラーが発生しました: {str(e)}'}), 500
+
+
+@app.route('/api/advice/<analysis_id>', methods=['POST'])
+def regenerate_advice(analysis_id):
+    """
+    保存済みの動作解析結果からアドバイスだけを再生成
+    
+    前処理・ポーズ検出・動作解析は再実行しない。結果は元の版と並べて新しい版として保存し、
+    同じパラメータの版（元の版を含む）があればそれを返す。
+    JSON: {"user_level", "focus_areas", "use_chatgpt", "api_key", "user_concerns"}
+    """
+    try:
+        if not is_valid_id(analysis_id):
+            return jsonify({'error': '指定された解析IDが見つかりません'}), 404
+        data = request.get_json(silent=True) or {}
+        params = {
+            'user_level': data.get('user_level', 'intermediate'),
+            'focus_areas': data.get('focus_areas', []),
+            'use_chatgpt': data.get('use_chatgpt', False),
+            'api_key': data.get('api_key', ''),
+            'user_concerns': data.get('user_concerns', '')
+        }
+        
+        output_dir = os.path.join(app.config['OUTPUT_FOLDER'], analysis_id)
+        parent_job = job_queue.get(analysis_id)
+        if parent_job is not None and parent_job.get('kind') == JobQueue.KIND_ADVICE:
+            return jsonify({'error': '元の解析IDを指定してください'}), 400
+        if parent_job is None and not os.path.isdir(output_dir):
+            return jsonify({'error': '指定された解析IDが見つかりません'}), 404
+        if not any(os.path.exists(os.path.join(output_dir, filename))
+                   for filename in (MOTION_RESULT_FILENAME, ANALYSIS_RESULT_FILENAME)):
+            return jsonify({'error': '動作解析がまだ完了していません'}), 409
+        
+        key = advice_key(params)
+        existing_version = None
+        if parent_job is not None and parent_job['state'] != JobQueue.FAILED and advice_key(parent_job['params']) == key:
+            existing_version = ORIGINAL_VERSION
+        else:
+            matches = advice_version_store.find(analysis_id, key)
+            jobs = job_queue.get_many([version['job_id'] for version in matches])
+            for version in matches:
+                job = jobs.get(version['job_id'])
+                if job is not None and job['state'] != JobQueue.FAILED:
+                    existing_version = version['version']
+                    break
+        
+        if existing_version is not None:
+            result_store.touch(analysis_id)
+            return jsonify({
+                'success': True,
+                'analysis_id': analysis_id,
+                'version': existing_version,
+                'cached': True,
+                'advice_url': f'/api/advice/{analysis_id}?version={existing_version}'
+            }), 200
+        
+        client_id = request_client_id(params['api_key'])
+        estimated_seconds = throughput_model.rates()['tail_seconds']
+        job_id = str(uuid.uuid4())
+        with admission_controller.lock:
+            decision = admission_controller.check(client_id, [estimated_seconds])
+            if not decision['admitted']:
+                return too_many_requests(decision, analysis_id=analysis_id)
+            # 版の登録を先に行い、ワーカーが版番号を受け取れるようにする
+            version = advice_version_store.create(
+                analysis_id, job_id, key,
+                {name: value for name, value in params.items() if name not in JobQueue.SENSITIVE_PARAMS}
+            )['version']
+            job_queue.enqueue(
+                job_id,
+                parent_job['video_path'] if parent_job else output_dir,
+                output_dir,
+                dict(params, advice_version=version),
+                client_id=client_id,
+                estimated_seconds=estimated_seconds,
+                kind=JobQueue.KIND_ADVICE,
+                parent_id=analysis_id
+            )
+        get_worker_pool()
+        result_store.touch(analysis_id)
         
         return jsonify({
+            'success': True,
             'analysis_id': analysis_id,
-            'status': 'completed' if files_status['analysis_result.json']['exists'] else 'processing',
-            'files': files_status,
-            'summary': analysis_summary
-        })
+            'version': version,
+            'cached': False,
+            'estimated_wait': decision['estimated_wait'],
+            'advice_url': f'/api/advice/{analysis_id}?version={version}'
+        }), 202
         
     except Exception as e:
-        return jsonify({'error': f'状況確認中にエラーが発生しました: {str(e)}'}), 500
+        return jsonify({'error': f'アドバイス再生成中にエラーが発生しました: {str(e)}'}), 500
 
 
 @app.route('/api/download/<analysis_id>/<file_type>', methods=['GET'])
 def download_file(analysis_id, file_type):
-    """ファイルダウンロード"""
+    """
+    ファイルダウンロード
+    
+    Range リクエスト（206）と、内容の SHA-256 による強い ETag・更新時刻を使った
+    条件付き GET（If-None-Match / If-Modified-Since / If-Range）に対応する。
+    ?inline=1 を指定すると添付ファイルではなくインライン表示用に返す（動画のシーク再生用）。
+    """
     try:
+        if not is_valid_id(analysis_id):
+            return jsonify({'error': '指定された解析IDが見つかりません'}), 404
         output_dir = os.path.join(app.config['OUTPUT_FOLDER'], analysis_id)
         
         if not os.path.exists(output_dir):
@@ -345,9 +1259,11 @@ def download_file(analysis_id, file_type):
         file_mapping = {
             'analysis': 'analysis_result.json',
             'advice': 'advice_result.json',
-            'pose_data': 'pose_data.json',
+            'pose_data': POSE_JSON_FILENAME,
+            'pose_data_binary': POSE_DATA_FILENAME,
             'preprocessed_video': 'preprocessed_video.mp4',
-            'pose_visualization': 'pose_visualization.mp4'
+            'pose_visualization': 'pose_visualization.mp4',
+            'trace': TRACE_FILENAME
         }
         
         if file_type not in file_mapping:
@@ -355,11 +1271,26 @@ def download_file(analysis_id, file_type):
         
         filename = file_mapping[file_type]
         file_path = os.path.join(output_dir, filename)
+        if file_type == 'pose_data':
+            # 従来の JSON 形式は要求されたときにバイナリ形式から作成する
+            file_path = export_pose_json(output_dir) or file_path
         
         if not os.path.exists(file_path):
             return jsonify({'error': f'ファイルが見つかりません: {filename}'}), 404
         
-        return send_file(file_path, as_attachment=True, download_name=filename)
+        if result_store.get(analysis_id) is None:
+            # 結果ストア導入前の解析は初回参照時に取り込む（ハッシュを次回以降再利用する）
+            result_store.import_output_dir(output_dir)
+        etag = result_store.artifact_hash(analysis_id, output_dir, filename)
+        result_store.touch(analysis_id)
+        
+        return send_file(
+            file_path,
+            as_attachment=request.args.get('inline') != '1',
+            download_name=filename,
+            conditional=True,
+            etag=etag
+        )
         
     except Exception as e:
         return jsonify({'error': f'ダウンロード中にエラーが発生しました: {str(e)}'}), 500
@@ -367,189 +1298,108 @@ def download_file(analysis_id, file_type):
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """ヘルスチェック"""
-    return jsonify({
-        'status': 'healthy',
+    """
+    ヘルスチェック（レディネスプローブ）
+
+    ウォームアップを終えたワーカーが1つ以上あり、ジョブDBに接続でき、待機中ジョブが上限未満なら 200、
+    そうでなければ 503 を返す。起動直後でワーカーが準備中の場合は 'starting'、
+    一部のワーカーが停止・準備中の場合は 'degraded'。
+    ワーカープールが未起動（最初の解析依頼で起動する）の場合は 'not_started' で 200 を返す。
+    ヘルスチェック・メトリクスの取得ではワーカープールを起動しない。
+    """
+    workers = worker_pool_status()
+
+    try:
+        jobs = job_queue.counts()
+        database_ok = True
+    except Exception as e:
+        print(f"ヘルスチェック: ジョブDBエラー: {e}")
+        jobs = None
+        database_ok = False
+
+    checks = {
+        'video_processor': video_processor is not None,
+        # 未起動のプールは最初の解析依頼で起動するので受付可能とみなす
+        'workers': workers['ready'] > 0 or not workers['started'],
+        'database': database_ok,
+        'queue': jobs is not None and jobs['queued'] < app.config['MAX_QUEUE_DEPTH']
+    }
+    ready = all(checks.values())
+    if not ready:
+        status = 'starting' if workers['alive'] > 0 and workers['ready'] == 0 and database_ok else 'unavailable'
+    elif not workers['started']:
+        status = 'not_started'
+    elif workers['ready'] < workers['configured']:
+        status = 'degraded'
+    else:
+        status = 'healthy'
+
+    # ポーズ検出と動作解析はワーカープロセス内で動作する
+    payload = {
+        'status': status,
+        'ready': ready,
         'timestamp': time.time(),
+        'checks': checks,
         'services': {
-            'video_processor': True,
-            'pose_detector': True,
-            'motion_analyzer': True,
+            'video_processor': checks['video_processor'],
+            'pose_detector': checks['workers'],
+            'motion_analyzer': checks['workers'],
             'advice_generator': advice_available
-        }
-    })
+        },
+        'workers': workers,
+        'jobs': jobs,
+        'throughput': throughput_model.rates() if database_ok else None,
+        'storage': retention_manager.status()
+    }
+    return jsonify(payload), 200 if ready else 503
 
 
-def perform_analysis(video_path: str, output_dir: str, user_level: str, focus_areas: list, use_chatgpt: bool = False, api_key: str = '', user_concerns: str = '') -> dict:
-    """動画解析の実行（user_concerns対応）"""
-    
-    try:
-        print("=== perform_analysis 開始 ===")
-        print(f"video_path: {video_path}")
-        print(f"output_dir: {output_dir}")
-        print(f"user_level: {user_level}")
-        print(f"focus_areas: {focus_areas}")
-        print(f"use_chatgpt: {use_chatgpt}")
-        print(f"user_concerns: {user_concerns}")
-        print("==============================")
-        
-        # サービスインスタンスの確認
-        if video_processor is None:
-            raise Exception("VideoProcessor not initialized")
-        if pose_detector is None:
-            raise Exception("PoseDetector not initialized")
-        if motion_analyzer is None:
-            raise Exception("MotionAnalyzer not initialized")
-        
-        print("Step 1: 動画前処理を開始")
-        
-        # Step 1: 動画前処理
-        preprocessed_path = os.path.join(output_dir, 'preprocessed_video.mp4')
-        preprocessing_result = video_processor.preprocess_video(video_path, preprocessed_path)
-        
-        print(f"前処理結果: {preprocessing_result}")
-        print(f"前処理結果の型: {type(preprocessing_result)}")
-        
-        # preprocessing_resultが文字列（ファイルパス）の場合は成功とみなす
-        if isinstance(preprocessing_result, str):
-            # ファイルパスが返された場合は成功
-            if os.path.exists(preprocessing_result):
-                preprocessing_success = True
-                preprocessing_dict = {
-                    'success': True,
-                    'output_path': preprocessing_result,
-                    'duration': 0,
-                    'fps': 30
-                }
-            else:
-                raise Exception(f"前処理済みファイルが見つかりません: {preprocessing_result}")
-        elif isinstance(preprocessing_result, dict):
-            # 辞書が返された場合
-            preprocessing_success = preprocessing_result.get('success', False)
-            preprocessing_dict = preprocessing_result
-        else:
-            raise Exception(f"予期しない前処理結果の型: {type(preprocessing_result)}")
-        
-        if not preprocessing_success:
-            raise Exception(f"動画前処理に失敗しました: {preprocessing_dict.get('error', '不明なエラー')}")
-        
-        print("Step 2: ポーズ検出を開始")
-        
-        # Step 2: ポーズ検出
-        pose_data_path = os.path.join(output_dir, 'pose_data.json')
-        pose_visualization_path = os.path.join(output_dir, 'pose_visualization.mp4')
-        
-        # PoseDetectorの正しいメソッド名はprocess_video
-        pose_results = pose_detector.process_video(preprocessed_path, pose_visualization_path)
-        
-        print(f"ポーズ検出結果: {len(pose_results)} フレーム処理")
-        
-        # ポーズデータをJSONファイルに保存
-        pose_detector.save_pose_data(pose_results, pose_data_path)
-        
-        # 成功結果を作成
-        pose_result = {
-            'success': True,
-            'frame_count': len(pose_results),
-            'detected_frames': sum(1 for result in pose_results if result.get('has_pose', False)),
-            'confidence_avg': sum(result.get('confidence', 0.0) for result in pose_results) / len(pose_results) if pose_results else 0.0
-        }
-        
-        print(f"ポーズ検出結果: {pose_result}")
-        
-        print("Step 3: 動作解析を開始")
-        
-        # Step 3: 動作解析
-        print(f"ポーズデータ読み込み完了: {len(pose_results)} フレーム")
-        print(f"ポーズデータサンプル: {pose_results[0] if pose_results else 'データなし'}")
-        
-        motion_result = motion_analyzer.analyze_serve_motion(pose_results)
-        
-        print(f"動作解析結果: {type(motion_result)}")
-        print(f"motion_result keys: {list(motion_result.keys()) if isinstance(motion_result, dict) else 'not dict'}")
-        
-        print("Step 4: アドバイス生成を開始")
-        
-        # Step 4: アドバイス生成（user_concerns対応）
-        advice_result = None
-        if advice_generator is not None:
-            try:
-                print("ChatGPTアドバイス生成を試行")
-                advice_result = advice_generator.generate_advice(
-                    motion_result, 
-                    user_level=user_level, 
-                    focus_areas=focus_areas,
-                    use_chatgpt=use_chatgpt,
-                    api_key=api_key,
-                    user_concerns=user_concerns  # 新機能：気になっていることを追加
-                )
-                print(f"アドバイス生成結果: {type(advice_result)}")
-                print("ChatGPTアドバイス生成完了")
-            except Exception as advice_error:
-                import traceback
-                print(f"アドバイス生成エラー: {advice_error}")
-                print("=== アドバイス生成エラー詳細 ===")
-                traceback.print_exc()
-                print("===============================")
-                advice_result = {
-                    'overall_advice': 'アドバイス生成中にエラーが発生しました。',
-                    'technical_points': [],
-                    'practice_suggestions': [],
-                    'error': str(advice_error)
-                }
-        else:
-            advice_result = {
-                'overall_advice': 'アドバイス生成サービスが利用できません。',
-                'technical_points': [],
-                'practice_suggestions': []
-            }
-        
-        print("Step 5: 結果の統合を開始")
-        
-        # 結果の統合
-        final_result = {
-            'total_score': motion_result.get('overall_score', 7.5),
-            'frame_count': pose_result.get('frame_count', 0),
-            'phase_analysis': {
-                '準備フェーズ': {'score': 7.0},
-                'トスフェーズ': {'score': 6.5},
-                'バックスイングフェーズ': {'score': 7.5},
-                'インパクトフェーズ': {'score': 8.0},
-                'フォロースルーフェーズ': {'score': 7.2}
-            },
-            'advice': advice_result,
-            'user_concerns': user_concerns,  # 新機能：気になっていることを結果に含める
-            'preprocessing': {
-                'success': preprocessing_dict['success'],
-                'duration': preprocessing_dict.get('duration', 0),
-                'fps': preprocessing_dict.get('fps', 30)
-            },
-            'pose_detection': {
-                'success': pose_result['success'],
-                'detected_frames': pose_result.get('detected_frames', 0),
-                'confidence_avg': pose_result.get('confidence_avg', 0.0)
-            },
-            'technical_analysis': motion_result.get('technical_analysis', {}),
-            'serve_phases': motion_result.get('serve_phases', {})
-        }
-        
-        print(f"最終結果作成完了: {type(final_result)}")
-        print(f"final_result keys: {list(final_result.keys())}")
-        print("解析完了")
-        return final_result
-        
-    except Exception as e:
-        import traceback
-        print(f"perform_analysis エラー: {e}")
-        print("=== perform_analysis エラー詳細 ===")
-        print(f"エラータイプ: {type(e).__name__}")
-        print(f"エラーメッセージ: {str(e)}")
-        traceback.print_exc()
-        print("==================================")
-        raise e
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 形式のメトリクス"""
+    workers = worker_pool_status()
+    jobs = job_queue.counts()
+    storage = retention_manager.status()
+
+    gauges = [
+        ('analyzer_queue_jobs', '状態ごとの解析ジョブ数', {'state': state}, count)
+        for state, count in jobs.items()
+    ]
+    gauges += [
+        ('analyzer_workers_started', 'ワーカープールが起動済みか', {}, int(workers['started'])),
+        ('analyzer_workers_configured', '設定された解析ワーカー数', {}, workers['configured']),
+        ('analyzer_workers_alive', '生存中の解析ワーカー数', {}, workers['alive']),
+        ('analyzer_workers_ready', 'ウォームアップを終えた解析ワーカー数', {}, workers['ready']),
+        ('analyzer_workers_busy', 'ジョブを処理中の解析ワーカー数', {}, jobs['running']),
+        ('analyzer_worker_utilization', '生存中のワーカーのうちジョブを処理中の割合', {},
+         min(1.0, jobs['running'] / workers['alive']) if workers['alive'] else 0.0)
+    ]
+
+    frames = metrics_store.counter_value('analyzer_pose_frames_total')
+    detected = metrics_store.counter_value('analyzer_pose_detected_frames_total')
+    gauges.append(('analyzer_pose_detection_rate', 'ポーズを検出できたフレームの割合（累計）', {},
+                   detected / frames if frames else 0.0))
+
+    if storage['usage_bytes'] is not None:
+        gauges.append(('analyzer_storage_usage_bytes', 'uploads/ と output/ の使用量（前回の掃除時点）', {},
+                       storage['usage_bytes']))
+    gauges += [
+        ('analyzer_storage_reclaimed_bytes', '保持期間管理で回収した累計バイト数', {'reason': reason}, freed)
+        for reason, freed in storage['reclaimed_bytes_by_reason'].items()
+    ]
+
+    rates = throughput_model.rates()
+    gauges += [
+        ('analyzer_throughput_rate', '最近の完了ジョブから求めた処理速度', {'rate': key}, rates[key])
+        for key in ('preprocess_fps', 'pose_fps', 'tail_seconds')
+    ]
 
+    return Response(metrics_store.render(gauges), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     print("Starting Tennis Serve Analyzer API v1.1.0...")
+    # リローダーの監視プロセスではワーカーを起動しない
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        get_worker_pool()
     app.run(host='0.0.0.0', port=5000, debug=True)
 
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+テニスサービス動作解析 - 解析結果の一括取り込み
+既存の output/<analysis_id>/ ディレクトリを結果ストアに登録する
+"""
+
+import argparse
+import os
+import time
+
+from services.result_store import ResultStore
+
+
+def main():
+    """一括取り込みのメイン関数"""
+    parser = argparse.ArgumentParser(description='既存の解析結果を結果ストアに取り込みます')
+    parser.add_argument('--output-folder', default='output', help='解析出力フォルダ（既定: output）')
+    parser.add_argument('--db', default=os.environ.get('ANALYZER_DB_PATH', 'analyzer.db'),
+                        help='SQLite データベースファイル（既定: analyzer.db）')
+    parser.add_argument('--force', action='store_true', help='登録済みの解析も読み込み直す')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.output_folder):
+        print(f"❌ 出力フォルダが見つかりません: {args.output_folder}")
+        return
+
+    start_time = time.time()
+    store = ResultStore(args.db, cache_size=0)
+    stats = store.import_all(args.output_folder, skip_existing=not args.force)
+
+    print("✅ 取り込み完了")
+    print(f"📊 取り込み: {stats['imported']}件, スキップ: {stats['skipped']}件, 失敗: {stats['failed']}件")
+    print(f"⏱️ 所要時間: {time.time() - start_time:.2f}秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+テニスサービス動作解析 - 受付制御
+実測したステージごとの処理速度から待ち時間を見積もり、混雑時は新しい解析を断る
+"""
+
+import hashlib
+import heapq
+import math
+import statistics
+import threading
+import time
+from typing import Dict, List, Optional
+
+from services.job_queue import JobQueue, fair_order
+
+# 前処理・ポーズ検出以降の固定的なステージ
+TAIL_STAGES = ['motion', 'advice', 'save']
+
+
+def client_key(api_key: str = '', client_id: str = '', remote_addr: str = '') -> str:
+    """
+    公平な実行順の単位となるクライアントIDを作成
+
+    APIキーがあればそのハッシュ、なければ X-Client-Id、どちらもなければ接続元アドレスを使う。
+    APIキーそのものは保存しない。
+    """
+    if api_key:
+        return 'key:' + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+    if client_id:
+        return 'client:' + client_id[:64]
+    return 'addr:' + (remote_addr or 'unknown')
+
+
+class ThroughputModel:
+    """最近完了したジョブの実測値によるステージごとの処理速度モデル"""
+
+    # 実測値がない場合の既定値
+    DEFAULT_RATES = {
+        'preprocess_fps': 60.0,  # 前処理で読み込む元動画のフレーム数/秒
+        'pose_fps': 8.0,         # ポーズ検出する前処理済みフレーム数/秒
+        'tail_seconds': 3.0      # 動作解析・アドバイス生成・保存の合計秒数
+    }
+
+    def __init__(self, job_queue: JobQueue, frame_skip: int, sample_size: int = 50,
+                 refresh_interval: float = 30.0, fused: bool = False, analysis_fps: float = 0.0):
+        """
+        処理速度モデルの初期化
+
+        Args:
+            job_queue: JobQueue
+            frame_skip: 前処理のフレーム間引き（ポーズ検出するフレーム数の算出に使う）
+            sample_size: 実測に使う最近の完了ジョブ数
+            refresh_interval: 実測値を再集計する間隔（秒）
+            fused: 前処理をポーズ検出と同じステージで実行するか（pose_fps に前処理の時間が含まれる）
+            analysis_fps: 前処理で残す実効フレームレート（0 なら frame_skip で間引く）
+        """
+        self.job_queue = job_queue
+        self.frame_skip = max(1, frame_skip)
+        self.sample_size = sample_size
+        self.refresh_interval = refresh_interval
+        self.fused = fused
+        self.analysis_fps = analysis_fps
+
+        self._lock = threading.Lock()
+        self._rates: Optional[Dict] = None
+        self._refreshed_at = 0.0
+
+    def rates(self) -> Dict:
+        """
+        ステージごとの処理速度（最近の完了ジョブの中央値）
+
+        Returns:
+            {'preprocess_fps', 'pose_fps', 'tail_seconds', 'samples'}
+        """
+        with self._lock:
+            if self._rates is not None and time.time() - self._refreshed_at < self.refresh_interval:
+                return self._rates
+
+        samples = {'preprocess_fps': [], 'pose_fps': [], 'tail_seconds': []}
+        jobs = self.job_queue.recent_done(self.sample_size)
+        for job in jobs:
+            progress = job['progress']
+            for stage in ('preprocess', 'pose'):
+                stage_progress = progress.get(stage) or {}
+                if stage_progress.get('frames') and stage_progress.get('elapsed'):
+                    samples[f'{stage}_fps'].append(stage_progress['frames'] / stage_progress['elapsed'])
+            if all((progress.get(stage) or {}).get('elapsed') is not None for stage in TAIL_STAGES):
+                samples['tail_seconds'].append(sum(progress[stage]['elapsed'] for stage in TAIL_STAGES))
+
+        rates = {
+            key: statistics.median(values) if values else self.DEFAULT_RATES[key]
+            for key, values in samples.items()
+        }
+        rates['samples'] = len(jobs)
+
+        with self._lock:
+            self._rates = rates
+            self._refreshed_at = time.time()
+        return rates
+
+    def estimate_seconds(self, duration: Optional[float], fps: Optional[float]) -> float:
+        """
+        動画1本の処理時間を見積もる
+
+        Args:
+            duration: 動画の長さ（秒、プローブ結果）
+            fps: 動画のフレームレート
+
+        Returns:
+            見積もり処理時間（秒）
+        """
+        rates = self.rates()
+        fps = fps or 30.0
+        frames = (duration or 0.0) * fps
+        if self.analysis_fps > 0:
+            pose_frames = frames / max(1.0, fps / self.analysis_fps)
+        else:
+            pose_frames = frames / self.frame_skip
+        preprocess_seconds = 0.0 if self.fused else frames / rates['preprocess_fps']
+        return (preprocess_seconds
+                + pose_frames / rates['pose_fps']
+                + rates['tail_seconds'])
+
+
+class AdmissionController:
+    """解析ジョブの受付制御クラス"""
+
+    def __init__(self, job_queue: JobQueue, throughput: ThroughputModel, num_workers: int,
+                 max_wait_seconds: float = 600.0, max_queued_per_client: int = 50,
+                 max_queue_depth: int = 200):
+        """
+        受付制御の初期化
+
+        Args:
+            job_queue: JobQueue
+            throughput: ThroughputModel
+            num_workers: 解析ワーカー数
+            max_wait_seconds: 受け付ける見積もり待ち時間（開始までの秒数）の上限
+            max_queued_per_client: 1クライアントあたりの待機中ジョブ数の上限
+            max_queue_depth: 全体の待機中ジョブ数の上限
+        """
+        self.job_queue = job_queue
+        self.throughput = throughput
+        self.num_workers = max(1, num_workers)
+        self.max_wait_seconds = max_wait_seconds
+        self.max_queued_per_client = max_queued_per_client
+        self.max_queue_depth = max_queue_depth
+
+        # 判定から登録までを直列化する（同時リクエストで上限を超えないように）
+        self.lock = threading.Lock()
+
+    def check(self, client_id: str, estimates: List[float]) -> Dict:
+        """
+        新しいジョブを受け付けられるか判定
+
+        実行中ジョブの残り時間と待機中ジョブの見積もりをワーカーに割り当てて
+        各ジョブの開始時刻を予測し、新しいジョブの開始までの待ち時間を求める。
+        呼び出し側は self.lock を保持したまま判定とジョブ登録を行うこと。
+
+        Args:
+            client_id: クライアントID
+            estimates: 新しく登録するジョブごとの見積もり処理時間（秒）
+
+        Returns:
+            {'admitted', 'reason', 'estimated_wait', 'estimated_seconds', 'retry_after'}
+        """
+        now = time.time()
+        active = self.job_queue.active_jobs()
+        default_estimate = self.throughput.estimate_seconds(None, None)
+
+        running_remaining = []
+        running_counts: Dict[Optional[str], int] = {}
+        queued = []
+        for job in active:
+            estimate = job.get('estimated_seconds') or default_estimate
+            if job['state'] == JobQueue.RUNNING:
+                running_remaining.append(max(0.0, estimate - (now - (job['started_at'] or now))))
+                running_counts[job.get('client_id')] = running_counts.get(job.get('client_id'), 0) + 1
+            else:
+                queued.append({'client_id': job.get('client_id'), 'created_at': job['created_at'],
+                               'estimated_seconds': estimate, 'new': False})
+
+        client_queued = [job for job in queued if job['client_id'] == client_id]
+        new_jobs = [{'client_id': client_id, 'created_at': now + index * 1e-6,
+                     'estimated_seconds': estimate, 'new': True}
+                    for index, estimate in enumerate(estimates)]
+
+        ordered = fair_order(queued + new_jobs, running_counts)
+        starts = self._projected_starts(running_remaining, [job['estimated_seconds'] for job in ordered])
+        new_starts = [start for job, start in zip(ordered, starts) if job['new']]
+        estimated_wait = min(new_starts) if new_starts else 0.0
+
+        # 既存ジョブのみの開始予測（キュー枠が空くまでの時間の算出用）
+        existing_order = fair_order(queued, running_counts)
+        existing_starts = self._projected_starts(
+            running_remaining, [job['estimated_seconds'] for job in existing_order]
+        )
+
+        decision = {
+            'admitted': True,
+            'reason': None,
+            'estimated_wait': round(estimated_wait, 1),
+            'estimated_seconds': round(sum(estimates), 1),
+            'retry_after': None
+        }
+
+        if len(client_queued) + len(estimates) > self.max_queued_per_client:
+            # このクライアントの待機中ジョブが開始して枠が空くまで
+            excess = len(client_queued) + len(estimates) - self.max_queued_per_client
+            client_starts = sorted(start for job, start in zip(existing_order, existing_starts)
+                                   if job['client_id'] == client_id)
+            wait = client_starts[min(excess, len(client_starts)) - 1] if client_starts else estimated_wait
+            decision.update({'admitted': False, 'reason': 'client_queue_full', 'retry_after': wait})
+        elif len(queued) + len(estimates) > self.max_queue_depth:
+            excess = len(queued) + len(estimates) - self.max_queue_depth
+            wait = existing_starts[min(excess, len(existing_starts)) - 1] if existing_starts else estimated_wait
+            decision.update({'admitted': False, 'reason': 'queue_full', 'retry_after': wait})
+        elif estimated_wait > self.max_wait_seconds:
+            # 他のジョブが進んで待ち時間が上限内に収まるまで
+            decision.update({'admitted': False, 'reason': 'wait_too_long',
+                             'retry_after': estimated_wait - self.max_wait_seconds})
+
+        if decision['retry_after'] is not None:
+            decision['retry_after'] = max(1, int(math.ceil(decision['retry_after'])))
+        return decision
+
+    def _projected_starts(self, running_remaining: List[float], estimates: List[float]) -> List[float]:
+        """実行順のジョブを空いたワーカーに順に割り当てた場合の開始時刻（現在からの秒数）"""
+        free_at = sorted(running_remaining)[:self.num_workers]
+        free_at += [0.0] * (self.num_workers - len(free_at))
+        heapq.heapify(free_at)
+
+        starts = []
+        for estimate in estimates:
+            start = heapq.heappop(free_at)
+            starts.append(start)
+            heapq.heappush(free_at, start + estimate)
+        return starts
@@ -0,0 +1,120 @@
+"""
+テニスサービス動作解析 - アドバイスの版管理
+保存済みの動作解析結果からアドバイスだけを再生成した版の管理
+"""
+
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+
+from services.database import connect
+
+# 解析ジョブで生成した元のアドバイスの版番号
+ORIGINAL_VERSION = 1
+
+# アドバイス生成に影響する解析パラメータ（result_cache.advice_key の対象）
+ADVICE_PARAMS = ['user_level', 'focus_areas', 'use_chatgpt', 'user_concerns']
+
+
+def advice_filename(version: int) -> str:
+    """
+    版番号に対応するアドバイスのファイル名（解析出力ディレクトリ内）
+
+    元の版は従来どおり advice_result.json、再生成した版は advice_v<版>.json。
+    """
+    return 'advice_result.json' if version == ORIGINAL_VERSION else f'advice_v{version}.json'
+
+
+class AdviceVersionStore:
+    """アドバイスの版管理クラス"""
+
+    def __init__(self, db_path: str):
+        """
+        版管理の初期化
+
+        Args:
+            db_path: SQLite データベースファイルパス
+        """
+        self._lock = threading.Lock()
+        self._conn = connect(db_path)
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS advice_versions (
+                    analysis_id TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    job_id TEXT NOT NULL,
+                    advice_key TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (analysis_id, version)
+                );
+                CREATE INDEX IF NOT EXISTS idx_advice_versions_key ON advice_versions (analysis_id, advice_key);
+            """)
+
+    def create(self, analysis_id: str, job_id: str, advice_key: str, params: Dict) -> Dict:
+        """
+        新しい版を登録（版番号は解析ごとに 2 から連番）
+
+        Args:
+            analysis_id: 元の解析ID
+            job_id: アドバイスを生成するジョブのID
+            advice_key: アドバイス生成パラメータの指紋
+            params: アドバイス生成パラメータ（APIキーは含めない）
+
+        Returns:
+            登録した版の辞書
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    "SELECT MAX(version) AS version FROM advice_versions WHERE analysis_id = ?", (analysis_id,)
+                ).fetchone()
+                version = max(row['version'] or ORIGINAL_VERSION, ORIGINAL_VERSION) + 1
+                self._conn.execute(
+                    "INSERT INTO advice_versions (analysis_id, version, job_id, advice_key, params, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (analysis_id, version, job_id, advice_key, json.dumps(params, ensure_ascii=False), time.time())
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return self.get(analysis_id, version)
+
+    def get(self, analysis_id: str, version: int) -> Optional[Dict]:
+        """版の取得（未登録なら None）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM advice_versions WHERE analysis_id = ? AND version = ?", (analysis_id, version)
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def find(self, analysis_id: str, advice_key: str) -> List[Dict]:
+        """同じパラメータの版を新しい順に取得"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM advice_versions WHERE analysis_id = ? AND advice_key = ? ORDER BY version DESC",
+                (analysis_id, advice_key)
+            ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def list(self, analysis_id: str) -> List[Dict]:
+        """解析の全版（元の版を除く）を版番号順に取得"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM advice_versions WHERE analysis_id = ? ORDER BY version", (analysis_id,)
+            ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def remove(self, analysis_id: str):
+        """解析の全版の登録を削除"""
+        with self._lock:
+            self._conn.execute("DELETE FROM advice_versions WHERE analysis_id = ?", (analysis_id,))
+
+    @staticmethod
+    def _row_to_dict(row) -> Dict:
+        version = dict(row)
+        version['params'] = json.loads(version['params'])
+        return version
@@ -0,0 +1,192 @@
+"""
+テニスサービス動作解析 - 一括解析
+複数動画（アップロードID・zip アーカイブ）をまとめて解析するバッチの管理
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+import zipfile
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from services.database import connect
+from services.upload_storage import save_with_hash
+
+# ステージごとの進捗の重み（ステージ開始時点の累積割合, ステージの割合）
+STAGE_WEIGHTS = {
+    'preprocess': (0.0, 0.4),
+    'pose': (0.4, 0.5),
+    'motion': (0.9, 0.04),
+    'advice': (0.94, 0.05),
+    'save': (0.99, 0.01)
+}
+
+
+def job_fraction(job: Optional[Dict]) -> float:
+    """
+    ジョブの進捗を 0.0〜1.0 で見積もる
+
+    前処理とポーズ検出はフレーム進捗、それ以降はステージ単位で進める。
+
+    Args:
+        job: JobQueue.get の結果（None はジョブなし）
+
+    Returns:
+        進捗の割合（終了済みは 1.0）
+    """
+    if job is None or job['state'] in ('done', 'failed'):
+        return 1.0
+    if job['state'] == 'queued' or job['stage'] not in STAGE_WEIGHTS:
+        return 0.0
+
+    start, weight = STAGE_WEIGHTS[job['stage']]
+    percent = (job['progress'].get(job['stage']) or {}).get('percent')
+    return start + weight * (percent or 0.0) / 100
+
+
+def extract_archive(archive_path: str, destination_folder: str, extensions: Iterable[str],
+                    max_member_size: int, max_members: int, max_total_size: int = 0) -> Iterator[Dict]:
+    """
+    zip アーカイブ内の動画を一件ずつ展開
+
+    メンバーはイテレーションの進行に合わせて展開し（全体を先に展開しない）、
+    保存と同時に SHA-256 を計算する。展開後の合計サイズは実際に書き込んだバイト数で数え、
+    上限に達したメンバー以降は展開しない（アーカイブの宣言サイズだけを信用しない）。
+
+    Args:
+        archive_path: zip ファイルパス
+        destination_folder: 展開先フォルダ
+        extensions: 許可される拡張子（'.' なし、小文字）
+        max_member_size: 1ファイルあたりの最大サイズ（バイト）
+        max_members: 展開する動画の最大数
+        max_total_size: 展開する動画の合計の最大サイズ（バイト、0 で無制限）
+
+    Yields:
+        {'filename', 'path', 'sha256', 'size'} または {'filename', 'error'}
+    """
+    extensions = {extension.lower() for extension in extensions}
+    total_error = f'展開後の合計サイズが上限を超えています（最大: {max_total_size // (1024*1024)}MB）'
+    with zipfile.ZipFile(archive_path) as archive:
+        count = 0
+        extracted = 0
+        total_exceeded = False
+        for info in archive.infolist():
+            filename = os.path.basename(info.filename)
+            if info.is_dir() or not filename or filename.startswith('.') or '__MACOSX' in info.filename:
+                continue
+
+            extension = os.path.splitext(filename)[1].lower().lstrip('.')
+            if extension not in extensions:
+                yield {'filename': filename, 'error': 'サポートされていないファイル形式です'}
+                continue
+            if info.file_size > max_member_size:
+                yield {'filename': filename, 'error': f'ファイルサイズが大きすぎます（最大: {max_member_size // (1024*1024)}MB）'}
+                continue
+            if count >= max_members:
+                yield {'filename': filename, 'error': f'一度に解析できる動画は{max_members}件までです'}
+                continue
+            if total_exceeded or (max_total_size and extracted + info.file_size > max_total_size):
+                total_exceeded = True
+                yield {'filename': filename, 'error': total_error}
+                continue
+
+            count += 1
+            file_path = os.path.join(destination_folder, f'{uuid.uuid4()}.{extension}')
+            limit = min(max_member_size, max_total_size - extracted) if max_total_size else max_member_size
+            try:
+                with archive.open(info) as member:
+                    saved = save_with_hash(member, file_path, max_size=limit)
+            except ValueError:
+                # 宣言より大きく展開されたメンバー（書きかけのファイルは削除済み）
+                total_exceeded = bool(max_total_size)
+                yield {'filename': filename, 'error': total_error if total_exceeded else
+                       f'ファイルサイズが大きすぎます（最大: {max_member_size // (1024*1024)}MB）'}
+                continue
+            extracted += saved['size']
+            yield {'filename': filename, 'path': file_path, 'sha256': saved['sha256'], 'size': saved['size']}
+
+
+class BatchRegistry:
+    """一括解析バッチ管理クラス"""
+
+    def __init__(self, db_path: str):
+        """
+        バッチ管理の初期化
+
+        Args:
+            db_path: SQLite データベースファイルパス
+        """
+        self._lock = threading.Lock()
+        self._conn = connect(db_path)
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS batches (
+                    batch_id TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS batch_items (
+                    batch_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    filename TEXT,
+                    upload_id TEXT,
+                    analysis_id TEXT,
+                    cached INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    PRIMARY KEY (batch_id, position)
+                );
+            """)
+
+    def create(self, batch_id: str, source: str, params: Dict, items: List[Dict]):
+        """
+        バッチを登録
+
+        Args:
+            batch_id: バッチID
+            source: 'uploads' または 'archive'
+            params: 全クリップ共通の解析パラメータ（APIキーは保存しない）
+            items: クリップごとの {'filename', 'upload_id', 'analysis_id', 'cached', 'error'}
+        """
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.execute(
+                    "INSERT INTO batches (batch_id, source, params, created_at) VALUES (?, ?, ?, ?)",
+                    (batch_id, source, json.dumps(params, ensure_ascii=False), time.time())
+                )
+                self._conn.executemany(
+                    "INSERT INTO batch_items (batch_id, position, filename, upload_id, analysis_id, cached, error) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(batch_id, position, item.get('filename'), item.get('upload_id'), item.get('analysis_id'),
+                      int(bool(item.get('cached'))), item.get('error'))
+                     for position, item in enumerate(items)]
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def get(self, batch_id: str) -> Optional[Dict]:
+        """
+        バッチ情報とクリップ一覧の取得
+
+        Returns:
+            {'batch_id', 'source', 'params', 'created_at', 'items': [...]}、未登録なら None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM batches WHERE batch_id = ?", (batch_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            item_rows = self._conn.execute(
+                "SELECT * FROM batch_items WHERE batch_id = ? ORDER BY position", (batch_id,)
+            ).fetchall()
+
+        batch = dict(row)
+        batch['params'] = json.loads(batch['params'])
+        batch['items'] = [dict(item, cached=bool(item['cached'])) for item in item_rows]
+        return batch
@@ -0,0 +1,250 @@
+"""
+テニスサービス動作解析 - 分割アップロード
+オフセット指定・チャンク単位チェックサム付きの再開可能なアップロード管理
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import BinaryIO, Dict, Optional
+
+from services.database import connect
+
+# リクエストボディの読み込み単位（バイト）
+READ_BLOCK_SIZE = 256 * 1024
+
+
+class ChunkedUploadError(Exception):
+    """分割アップロードのエラー（HTTP ステータスコード付き）"""
+
+    def __init__(self, message: str, status_code: int = 400, offset: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+class ChunkedUploadManager:
+    """分割アップロードセッション管理クラス"""
+
+    def __init__(self, db_path: str, partial_dir: str, max_file_size: int, video_processor):
+        """
+        分割アップロード管理の初期化
+
+        Args:
+            db_path: SQLite データベースファイルパス
+            partial_dir: 受信途中のファイルを置くディレクトリ
+            max_file_size: 最大ファイルサイズ（バイト）
+            video_processor: ヘッダー判定に使う VideoProcessor
+        """
+        self.partial_dir = partial_dir
+        self.max_file_size = max_file_size
+        self.video_processor = video_processor
+        os.makedirs(partial_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = connect(db_path)
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS upload_sessions (
+                    upload_id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    extension TEXT NOT NULL,
+                    total_size INTEGER NOT NULL,
+                    received INTEGER NOT NULL DEFAULT 0,
+                    part_path TEXT NOT NULL,
+                    container TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+            """)
+
+        # 同一プロセス内で続きのチャンクを受けた場合はハッシュ計算を引き継ぐ
+        self._hashers: Dict[str, tuple] = {}
+
+    def create(self, upload_id: str, filename: str, extension: str, total_size: int) -> Dict:
+        """
+        アップロードセッションの作成
+
+        Args:
+            upload_id: アップロードID
+            filename: 元のファイル名（secure_filename 済み）
+            extension: 拡張子（'.mp4' など）
+            total_size: ファイル全体のサイズ（バイト）
+
+        Returns:
+            セッション情報
+        """
+        if total_size <= 0:
+            raise ChunkedUploadError('ファイルサイズが指定されていません')
+        if total_size > self.max_file_size:
+            raise ChunkedUploadError(
+                f'ファイルサイズが大きすぎます（最大: {self.max_file_size // (1024*1024)}MB）', 413
+            )
+
+        part_path = os.path.join(self.partial_dir, f'{upload_id}{extension}.part')
+        open(part_path, 'wb').close()
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO upload_sessions "
+                "(upload_id, filename, extension, total_size, part_path, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (upload_id, filename, extension, total_size, part_path, now, now)
+            )
+        return self.get(upload_id)
+
+    def get(self, upload_id: str) -> Optional[Dict]:
+        """セッション情報の取得"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM upload_sessions WHERE upload_id = ?", (upload_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def append(self, upload_id: str, offset: int, stream: BinaryIO,
+               expected_sha256: Optional[str] = None) -> Dict:
+        """
+        チャンクを追記
+
+        ボディはブロック単位でディスクに書き込み、メモリには保持しない。
+        チェックサムが一致しない場合はチャンク受信前の長さに切り詰める。
+
+        Args:
+            upload_id: アップロードID
+            offset: チャンクの開始位置（現在の受信済みバイト数と一致する必要がある）
+            stream: リクエストボディのストリーム
+            expected_sha256: チャンクの SHA-256（16進、オプション）
+
+        Returns:
+            更新後のセッション情報
+        """
+        session = self.get(upload_id)
+        if session is None:
+            raise ChunkedUploadError('指定されたアップロードが見つかりません', 404)
+        if offset != session['received']:
+            raise ChunkedUploadError('オフセットが一致しません', 409, session['received'])
+
+        chunk_digest = hashlib.sha256()
+        file_digest = self._hasher_at(upload_id, session['part_path'], session['received'])
+        received = session['received']
+        with open(session['part_path'], 'r+b') as f:
+            f.seek(received)
+            while True:
+                block = stream.read(READ_BLOCK_SIZE)
+                if not block:
+                    break
+                if received + len(block) > session['total_size']:
+                    f.truncate(session['received'])
+                    raise ChunkedUploadError('宣言されたファイルサイズを超えています', 413, session['received'])
+                chunk_digest.update(block)
+                file_digest.update(block)
+                f.write(block)
+                received += len(block)
+
+            if expected_sha256 and chunk_digest.hexdigest() != expected_sha256.lower():
+                f.truncate(session['received'])
+                raise ChunkedUploadError('チャンクのチェックサムが一致しません', 422, session['received'])
+
+        # 先頭バイトが揃った時点でコンテナ形式を判定し、不正なファイルは受信を打ち切る
+        container = session['container']
+        probe_bytes = min(self.video_processor.HEADER_PROBE_BYTES, session['total_size'])
+        if container is None and received >= probe_bytes:
+            with open(session['part_path'], 'rb') as f:
+                header = f.read(probe_bytes)
+            probe_result = self.video_processor.probe_container_header(header, session['extension'])
+            if not probe_result['is_valid']:
+                self.abort(upload_id)
+                raise ChunkedUploadError(f'動画ファイルの検証に失敗しました: {probe_result["error_message"]}', 415)
+            container = probe_result['container']
+
+        with self._lock:
+            self._conn.execute(
+                "UPDATE upload_sessions SET received = ?, container = ?, updated_at = ? WHERE upload_id = ?",
+                (received, container, time.time(), upload_id)
+            )
+            self._hashers[upload_id] = (received, file_digest)
+        return self.get(upload_id)
+
+    def finalize(self, upload_id: str, destination: str) -> Dict:
+        """
+        全チャンク受信済みのファイルを確定して移動
+
+        Args:
+            upload_id: アップロードID
+            destination: 移動先ファイルパス
+
+        Returns:
+            {'sha256': ファイル全体のハッシュ, 'size': バイト数}
+        """
+        session = self.get(upload_id)
+        if session is None:
+            raise ChunkedUploadError('指定されたアップロードが見つかりません', 404)
+        if session['received'] != session['total_size']:
+            raise ChunkedUploadError('アップロードが完了していません', 409, session['received'])
+
+        hasher = self._hasher_at(upload_id, session['part_path'], session['received'])
+        os.replace(session['part_path'], destination)
+        self._delete_session(upload_id)
+        return {'sha256': hasher.hexdigest(), 'size': session['received']}
+
+    def abort(self, upload_id: str):
+        """セッションと受信途中のファイルを削除"""
+        session = self.get(upload_id)
+        if session is None:
+            return
+        if os.path.exists(session['part_path']):
+            os.remove(session['part_path'])
+        self._delete_session(upload_id)
+
+    def expire(self, before: float) -> int:
+        """
+        最終更新が before より古い（放棄された）セッションを削除
+
+        Args:
+            before: 基準時刻（UNIX 時刻）
+
+        Returns:
+            削除した受信途中ファイルの合計バイト数
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT upload_id, part_path FROM upload_sessions WHERE updated_at < ?", (before,)
+            ).fetchall()
+
+        reclaimed = 0
+        for row in rows:
+            if os.path.exists(row['part_path']):
+                reclaimed += os.path.getsize(row['part_path'])
+            self.abort(row['upload_id'])
+        return reclaimed
+
+    def _delete_session(self, upload_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM upload_sessions WHERE upload_id = ?", (upload_id,))
+            self._hashers.pop(upload_id, None)
+
+    def _hasher_at(self, upload_id: str, part_path: str, offset: int):
+        """offset バイト目までを読み込んだハッシュ計算オブジェクト"""
+        with self._lock:
+            cached = self._hashers.get(upload_id)
+        if cached is not None and cached[0] == offset:
+            return cached[1].copy()
+
+        # 別プロセスで受信した・サーバー再起動後などはファイルから計算し直す
+        hasher = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            _update_from_file(hasher, f, offset)
+        return hasher
+
+
+def _update_from_file(hasher, f: BinaryIO, length: int):
+    """ファイルの現在位置から length バイトをハッシュに加える"""
+    remaining = length
+    while remaining > 0:
+        block = f.read(min(READ_BLOCK_SIZE, remaining))
+        if not block:
+            break
+        hasher.update(block)
+        remaining -= len(block)
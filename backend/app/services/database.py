@@ -0,0 +1,47 @@
+"""
+テニスサービス動作解析 - 組み込みデータベース
+ジョブキュー・各種インデックスで共有する SQLite 接続ヘルパー
+"""
+
+import os
+import sqlite3
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """
+    SQLite データベースへの接続を作成
+
+    複数のプロセス（Flask と解析ワーカー）から同時に開かれるため、
+    WAL モードとビジータイムアウトを設定する。トランザクションは
+    呼び出し側で明示的に BEGIN する（autocommit モード）。
+
+    Args:
+        db_path: データベースファイルパス
+
+    Returns:
+        sqlite3.Connection
+    """
+    directory = os.path.dirname(os.path.abspath(db_path))
+    os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(db_path, timeout=30.0, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=30000')
+    return conn
+
+
+def ensure_columns(conn: sqlite3.Connection, table: str, columns: dict):
+    """
+    既存テーブルに不足している列を追加（簡易マイグレーション）
+
+    Args:
+        conn: SQLite 接続
+        table: テーブル名
+        columns: 列名 -> 列定義（例: 'INTEGER NOT NULL DEFAULT 0'）
+    """
+    existing = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+    for name, definition in columns.items():
+        if name not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
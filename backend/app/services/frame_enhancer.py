@@ -0,0 +1,129 @@
+"""
+テニスサービス動作解析 - フレーム補正
+前処理で使う補正のプロファイル（なし・輝度の CLAHE・軽いノイズ除去・従来の全補正）と、
+動画ごとの明るさ・コントラスト・ノイズからのプロファイルの自動選択
+"""
+
+import math
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+# 補正のプロファイル（'full' は従来の bilateralFilter(d=9) + LAB の CLAHE と同じ結果）
+ENHANCEMENT_PROFILES = ('none', 'clahe', 'denoise', 'full')
+
+# 動画ごとに統計値からプロファイルを選ぶ指定
+AUTO_PROFILE = 'auto'
+
+# 自動選択の閾値（前処理後の解像度の輝度 0-255 で判定）
+DARK_BRIGHTNESS = 60.0      # 平均輝度がこれ未満なら暗い
+BRIGHT_BRIGHTNESS = 200.0   # 平均輝度がこれを超えれば明るすぎる
+LOW_CONTRAST = 35.0         # 輝度の標準偏差がこれ未満ならコントラストが低い
+NOISY_SIGMA = 4.0           # 推定ノイズの標準偏差がこれを超えればノイズが多い
+
+# ノイズ推定のカーネル（Immerkær, 1996。画像の構造を打ち消してノイズ成分だけを残す）
+_NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+
+
+def measure_frames(frames: List[np.ndarray]) -> Dict[str, float]:
+    """
+    フレームの明るさ・コントラスト・ノイズを測定
+
+    Args:
+        frames: BGR フレームのリスト（動画から間隔をあけて取り出したもの）
+
+    Returns:
+        {'brightness': 平均輝度, 'contrast': 輝度の標準偏差, 'noise': 推定ノイズの標準偏差}（フレームの中央値）
+    """
+    brightness, contrast, noise = [], [], []
+    for frame in frames:
+        luma = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        mean, std = cv2.meanStdDev(luma)
+        brightness.append(float(mean[0, 0]))
+        contrast.append(float(std[0, 0]))
+
+        height, width = luma.shape
+        if height < 3 or width < 3:
+            noise.append(0.0)
+            continue
+        response = cv2.filter2D(luma.astype(np.float32), -1, _NOISE_KERNEL)[1:-1, 1:-1]
+        noise.append(float(np.abs(response).sum()) * math.sqrt(math.pi / 2) / (6 * (width - 2) * (height - 2)))
+
+    if not frames:
+        return {'brightness': 0.0, 'contrast': 0.0, 'noise': 0.0}
+    return {
+        'brightness': float(np.median(brightness)),
+        'contrast': float(np.median(contrast)),
+        'noise': float(np.median(noise))
+    }
+
+
+def choose_profile(stats: Dict[str, float]) -> str:
+    """
+    統計値から補正のプロファイルを選ぶ
+
+    暗い・明るすぎる・コントラストが低い場合は輝度の CLAHE、ノイズが多い場合はノイズ除去、
+    両方なら全補正、どちらでもなければ補正しない。
+
+    Args:
+        stats: measure_frames の戻り値
+
+    Returns:
+        ENHANCEMENT_PROFILES のいずれか
+    """
+    needs_contrast = (stats['brightness'] < DARK_BRIGHTNESS or stats['brightness'] > BRIGHT_BRIGHTNESS
+                      or stats['contrast'] < LOW_CONTRAST)
+    needs_denoise = stats['noise'] > NOISY_SIGMA
+    if needs_contrast and needs_denoise:
+        return 'full'
+    if needs_contrast:
+        return 'clahe'
+    if needs_denoise:
+        return 'denoise'
+    return 'none'
+
+
+class FrameEnhancer:
+    """
+    フレーム補正クラス
+
+    CLAHE のインスタンスは作成時に一度だけ作り、全フレームで使い回す。
+    """
+
+    def __init__(self, clip_limit: float = 2.0, tile_grid_size: tuple = (8, 8)):
+        """
+        フレーム補正の初期化
+
+        Args:
+            clip_limit: CLAHE のコントラスト制限
+            tile_grid_size: CLAHE のタイル分割数
+        """
+        self._clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+
+    def enhance(self, frame: np.ndarray, profile: str = 'full') -> np.ndarray:
+        """
+        プロファイルに応じてフレームを補正
+
+        Args:
+            frame: BGR フレーム
+            profile: ENHANCEMENT_PROFILES のいずれか
+
+        Returns:
+            補正したフレーム（'none' なら入力をそのまま返す）
+        """
+        if profile == 'none':
+            return frame
+        if profile == 'clahe':
+            # LAB より変換の軽い YCrCb の輝度だけに CLAHE をかける
+            ycrcb = cv2.cvtColor(frame, cv2.COLOR_BGR2YCrCb)
+            ycrcb[:, :, 0] = self._clahe.apply(ycrcb[:, :, 0])
+            return cv2.cvtColor(ycrcb, cv2.COLOR_YCrCb2BGR)
+        if profile == 'denoise':
+            return cv2.bilateralFilter(frame, 5, 50, 50)
+        if profile == 'full':
+            denoised = cv2.bilateralFilter(frame, 9, 75, 75)
+            lab = cv2.cvtColor(denoised, cv2.COLOR_BGR2LAB)
+            lab[:, :, 0] = self._clahe.apply(lab[:, :, 0])
+            return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+        raise ValueError(f"サポートされていない補正プロファイルです: {profile}")
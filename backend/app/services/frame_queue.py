@@ -0,0 +1,168 @@
+"""
+テニスサービス動作解析 - フレームキュー
+デコードを別スレッドで先行させ、動画の書き込みを別スレッドで後追いさせる上限付きキュー
+"""
+
+import queue
+import threading
+from typing import Iterable, Iterator, TypeVar
+
+from services.tracing import NULL_TRACER
+
+T = TypeVar('T')
+
+# キューの終端
+_END = object()
+
+# 停止要求を確認する間隔（秒）
+_POLL_SECONDS = 0.1
+
+
+class _Failure:
+    """別スレッドで発生した例外（受け取った側で送出し直す）"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _put(items: queue.Queue, item, stop: threading.Event) -> bool:
+    """キューが空くまで待って追加（停止要求があれば追加せずに False）"""
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def prefetch(iterable: Iterable[T], depth: int, name: str = 'decode') -> Iterator[T]:
+    """
+    iterable を別スレッドで先読みして順に返す
+
+    OpenCV のデコードは GIL を解放するため、呼び出し側がフレームを処理している間に
+    次のフレームをデコードできる。先読みするのは最大 depth 件で、メモリ使用量は
+    「フレームサイズ × depth」で頭打ちになる。途中で読むのをやめた場合（close・例外）は
+    読み込みスレッドを止めてから戻る。
+
+    Args:
+        iterable: 先読みする列（フレームを返すジェネレーターなど）
+        depth: 先読みする最大件数（0 以下ならスレッドを使わずにそのまま返す）
+        name: 読み込みスレッド名（処理タイムラインのトラック名になる）
+
+    Returns:
+        iterable と同じ順序の列
+    """
+    if depth <= 0:
+        yield from iterable
+        return
+
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not _put(items, item, stop):
+                    return
+            _put(items, _END, stop)
+        except BaseException as e:
+            _put(items, _Failure(e), stop)
+        finally:
+            # 読み込み側のジェネレーターの後始末（VideoCapture の解放など）はこのスレッドで行う
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _END:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+class FrameWriter:
+    """
+    動画の書き込みを別スレッドで行うラッパー
+
+    write() はキューに積むだけで戻り、エンコードは書き込みスレッドが順に行う。
+    キューが depth 件で埋まっている間は write() が待つ。書き込みスレッドで発生した
+    例外は次の write() か release() で送出する。
+    """
+
+    def __init__(self, writer, depth: int, name: str = 'encode', tracer=None, category: str = 'pose'):
+        """
+        書き込みラッパーの初期化
+
+        Args:
+            writer: cv2.VideoWriter など write(frame) / release() を持つ書き込み先
+            depth: 書き込み待ちの最大フレーム数（0 以下ならスレッドを使わずに呼び出し元で書き込む）
+            name: 書き込みスレッド名（処理タイムラインのトラック名になる）
+            tracer: 処理タイムラインの記録先（'write' スパンは実際に書き込んだスレッドで記録する）
+            category: 'write' スパンの分類
+        """
+        self.writer = writer
+        self.tracer = tracer or NULL_TRACER
+        self.category = category
+        self._items = None
+        self._thread = None
+        self._failure = None
+        if depth > 0:
+            self._items = queue.Queue(maxsize=depth)
+            self._thread = threading.Thread(target=self._consume, name=name, daemon=True)
+            self._thread.start()
+
+    def write(self, frame, frame_number: int = 0):
+        """
+        フレームを書き込む（スレッド使用時は書き込み待ちのキューに積む）
+
+        Args:
+            frame: BGR フレーム（書き込みが終わるまで変更しないこと）
+            frame_number: 処理タイムラインに記録するフレーム番号
+        """
+        if self._items is None:
+            self._write(frame, frame_number)
+            return
+        self._raise_failure()
+        self._items.put((frame, frame_number))
+
+    def release(self):
+        """書き込み待ちのフレームをすべて書き込んでから閉じる"""
+        try:
+            if self._thread is not None:
+                self._items.put(_END)
+                self._thread.join()
+                self._thread = None
+            self._raise_failure()
+        finally:
+            self.writer.release()
+
+    def _write(self, frame, frame_number: int):
+        with self.tracer.frame(frame_number).span('write', self.category, frame=frame_number):
+            self.writer.write(frame)
+
+    def _consume(self):
+        while True:
+            item = self._items.get()
+            if item is _END:
+                return
+            if self._failure is not None:
+                continue  # 失敗後は読み捨てて write() 側を待たせない
+            try:
+                self._write(*item)
+            except BaseException as e:
+                self._failure = e
+
+    def _raise_failure(self):
+        if self._failure is not None:
+            failure, self._failure = self._failure, None
+            raise failure
@@ -0,0 +1,408 @@
+"""
+テニスサービス動作解析 - ジョブキュー
+SQLite に永続化されるローカル解析ジョブキュー
+"""
+
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+
+from services.database import connect, ensure_columns
+
+
+def fair_order(queued: List[Dict], running_counts: Dict[Optional[str], int]) -> List[Dict]:
+    """
+    待機中ジョブをクライアント間のラウンドロビン順に並べる
+
+    各ジョブの順番は「同じクライアントの先行ジョブ数 + そのクライアントの実行中ジョブ数」で決まり、
+    同じ順番のジョブは登録の古い順。1人が大量に登録しても他のクライアントのジョブは待たされない。
+
+    Args:
+        queued: 待機中ジョブ（'client_id', 'created_at' を含む）
+        running_counts: クライアントID -> 実行中ジョブ数
+
+    Returns:
+        実行順に並べたジョブのリスト
+    """
+    rounds = {}
+    keyed = []
+    for job in sorted(queued, key=lambda j: j['created_at']):
+        client_id = job.get('client_id')
+        round_number = rounds.get(client_id, running_counts.get(client_id, 0))
+        rounds[client_id] = round_number + 1
+        keyed.append((round_number, job['created_at'], job))
+    keyed.sort(key=lambda item: (item[0], item[1]))
+    return [job for _, _, job in keyed]
+
+
+class JobQueue:
+    """永続化解析ジョブキュークラス"""
+
+    # ジョブ状態
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATES = [QUEUED, RUNNING, DONE, FAILED]
+
+    # ジョブの種類（'advice' は保存済みの動作解析結果からアドバイスだけを再生成する）
+    KIND_ANALYSIS = 'analysis'
+    KIND_ADVICE = 'advice'
+
+    # 完了後にパラメータから削除するキー（APIキーをディスクに残さない）
+    SENSITIVE_PARAMS = ['api_key']
+
+    # ワーカーの異常終了で中断されたジョブを実行する最大回数（同じ動画で毎回落ちるジョブは失敗にする）
+    MAX_ATTEMPTS = 2
+
+    def __init__(self, db_path: str):
+        """
+        ジョブキューの初期化
+
+        Args:
+            db_path: SQLite データベースファイルパス
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = connect(db_path)
+        self._create_tables()
+
+    def _create_tables(self):
+        """テーブルとインデックスの作成"""
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    analysis_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    stage TEXT,
+                    video_path TEXT NOT NULL,
+                    output_dir TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    error TEXT,
+                    worker_id INTEGER,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_state_created ON jobs (state, created_at);
+            """)
+            # 進捗列（version は状態が変わるたびに増加し、ロングポーリングの比較に使う）
+            ensure_columns(self._conn, 'jobs', {
+                'progress': 'TEXT',
+                'version': 'INTEGER NOT NULL DEFAULT 0',
+                'updated_at': 'REAL',
+                'batch_id': 'TEXT',
+                'client_id': 'TEXT',
+                'estimated_seconds': 'REAL',
+                'kind': f"TEXT NOT NULL DEFAULT '{self.KIND_ANALYSIS}'",
+                'parent_id': 'TEXT',
+                'worker_pid': 'INTEGER',
+                'attempts': 'INTEGER NOT NULL DEFAULT 0'
+            })
+
+    def close(self):
+        """接続を閉じる"""
+        with self._lock:
+            self._conn.close()
+
+    def enqueue(self, analysis_id: str, video_path: str, output_dir: str, params: Dict,
+                batch_id: Optional[str] = None, client_id: Optional[str] = None,
+                estimated_seconds: Optional[float] = None, kind: str = KIND_ANALYSIS,
+                parent_id: Optional[str] = None) -> Dict:
+        """
+        解析ジョブをキューに追加
+
+        Args:
+            analysis_id: 解析ID
+            video_path: 入力動画ファイルパス
+            output_dir: 出力ディレクトリ
+            params: AnalysisPipeline.run に渡すパラメータ
+            batch_id: 一括解析のバッチID（オプション）
+            client_id: 公平な実行順の単位となるクライアントID（オプション）
+            estimated_seconds: 見積もり処理時間（秒、オプション）
+            kind: ジョブの種類（KIND_ANALYSIS / KIND_ADVICE）
+            parent_id: アドバイス再生成ジョブの元の解析ID
+
+        Returns:
+            登録されたジョブの辞書
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (analysis_id, state, video_path, output_dir, params, batch_id, client_id, "
+                "estimated_seconds, kind, parent_id, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (analysis_id, self.QUEUED, video_path, output_dir,
+                 json.dumps(params, ensure_ascii=False), batch_id, client_id, estimated_seconds,
+                 kind, parent_id, time.time())
+            )
+        return self.get(analysis_id)
+
+    def claim(self, worker_id: int, worker_pid: Optional[int] = None) -> Optional[Dict]:
+        """
+        次に実行する待機中ジョブを取得して実行中にする（プロセス間でアトミック）
+
+        クライアント間のラウンドロビン順（fair_order）で先頭のジョブを選ぶ。
+
+        Args:
+            worker_id: ワーカー番号
+            worker_pid: ワーカーのプロセスID（異常終了したワーカーのジョブを特定するために記録）
+
+        Returns:
+            取得したジョブの辞書、待機中ジョブがなければ None
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                ordered = self._fair_queue()
+                if not ordered:
+                    self._conn.execute('COMMIT')
+                    return None
+                row = ordered[0]
+
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, worker_id = ?, worker_pid = ?, started_at = ?, updated_at = ?, "
+                    "attempts = attempts + 1, version = version + 1 WHERE analysis_id = ?",
+                    (self.RUNNING, worker_id, worker_pid, time.time(), time.time(), row['analysis_id'])
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+        return self.get(row['analysis_id'])
+
+    def set_stage(self, analysis_id: str, stage: str):
+        """実行中ジョブの現在ステージを更新"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET stage = ?, updated_at = ?, version = version + 1 WHERE analysis_id = ?",
+                (stage, time.time(), analysis_id)
+            )
+
+    def set_progress(self, analysis_id: str, progress: Dict):
+        """
+        実行中ジョブの進捗を更新
+
+        Args:
+            analysis_id: 解析ID
+            progress: ステージ名 -> 進捗情報（frames, total_frames, percent, fps, elapsed）
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET progress = ?, updated_at = ?, version = version + 1 WHERE analysis_id = ?",
+                (json.dumps(progress), time.time(), analysis_id)
+            )
+
+    def complete(self, analysis_id: str):
+        """ジョブを完了状態にする"""
+        self._finish(analysis_id, self.DONE, None)
+
+    def fail(self, analysis_id: str, error: str):
+        """ジョブを失敗状態にする"""
+        self._finish(analysis_id, self.FAILED, error)
+
+    def _finish(self, analysis_id: str, state: str, error: Optional[str]):
+        """ジョブを終了状態にし、機密パラメータを削除"""
+        job = self.get(analysis_id)
+        if job is None:
+            return
+
+        params = {key: value for key, value in job['params'].items()
+                  if key not in self.SENSITIVE_PARAMS}
+
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, params = ?, finished_at = ?, updated_at = ?, "
+                "version = version + 1 WHERE analysis_id = ?",
+                (state, error, json.dumps(params, ensure_ascii=False), time.time(), time.time(), analysis_id)
+            )
+
+    def remove(self, analysis_id: str) -> int:
+        """
+        終了した解析ジョブと、その解析に対するアドバイス再生成ジョブを削除（出力を削除した解析用）
+
+        Args:
+            analysis_id: 解析ID
+
+        Returns:
+            削除したジョブ数（待機中・実行中のジョブは削除しない）
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE (analysis_id = ? OR parent_id = ?) AND state NOT IN (?, ?)",
+                (analysis_id, analysis_id, self.QUEUED, self.RUNNING)
+            )
+        return cursor.rowcount
+
+    def get(self, analysis_id: str) -> Optional[Dict]:
+        """
+        ジョブ情報の取得
+
+        Args:
+            analysis_id: 解析ID
+
+        Returns:
+            ジョブの辞書、存在しなければ None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE analysis_id = ?", (analysis_id,)
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def get_many(self, analysis_ids: List[str]) -> Dict[str, Dict]:
+        """
+        複数ジョブの一括取得
+
+        Args:
+            analysis_ids: 解析IDのリスト
+
+        Returns:
+            解析ID -> ジョブの辞書（存在しないものは含まない）
+        """
+        if not analysis_ids:
+            return {}
+
+        placeholders = ','.join('?' * len(analysis_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE analysis_id IN ({placeholders})", list(analysis_ids)
+            ).fetchall()
+        return {row['analysis_id']: self._row_to_dict(row) for row in rows}
+
+    def wait_for_change(self, analysis_id: str, version: int, timeout: float,
+                        poll_interval: float = 0.25) -> Optional[Dict]:
+        """
+        ジョブの version が変わるか終了状態になるまで待機（ロングポーリング用）
+
+        Args:
+            analysis_id: 解析ID
+            version: クライアントが最後に受け取った version
+            timeout: 最大待機時間（秒）
+            poll_interval: データベース確認間隔（秒）
+
+        Returns:
+            最新のジョブ辞書、存在しなければ None
+        """
+        deadline = time.time() + timeout
+        job = self.get(analysis_id)
+        while (job is not None and job['version'] == version
+               and job['state'] in (self.QUEUED, self.RUNNING)
+               and time.time() < deadline):
+            time.sleep(poll_interval)
+            job = self.get(analysis_id)
+        return job
+
+    def queue_position(self, analysis_id: str) -> Optional[int]:
+        """待機中ジョブのキュー内順位（0始まり、実行順）を取得"""
+        with self._lock:
+            ordered = self._fair_queue()
+        for position, row in enumerate(ordered):
+            if row['analysis_id'] == analysis_id:
+                return position
+        return None
+
+    def _fair_queue(self) -> List[Dict]:
+        """待機中ジョブを実行順に取得（呼び出し側で self._lock を保持すること）"""
+        queued = self._conn.execute(
+            "SELECT analysis_id, client_id, created_at, estimated_seconds FROM jobs WHERE state = ?",
+            (self.QUEUED,)
+        ).fetchall()
+        running = self._conn.execute(
+            "SELECT client_id, COUNT(*) AS count FROM jobs WHERE state = ? GROUP BY client_id",
+            (self.RUNNING,)
+        ).fetchall()
+        return fair_order([dict(row) for row in queued], {row['client_id']: row['count'] for row in running})
+
+    def recent_done(self, limit: int = 50) -> List[Dict]:
+        """最近完了した解析ジョブ（処理速度の実測に使う）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE state = ? AND kind = ? ORDER BY finished_at DESC LIMIT ?",
+                (self.DONE, self.KIND_ANALYSIS, limit)
+            ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def active_jobs(self) -> List[Dict]:
+        """待機中・実行中のジョブ一覧（入力動画・出力先の削除を避けるため）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE state IN (?, ?)", (self.QUEUED, self.RUNNING)
+            ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """状態ごとのジョブ数を取得"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) AS count FROM jobs GROUP BY state"
+            ).fetchall()
+
+        counts = {state: 0 for state in self.STATES}
+        for row in rows:
+            counts[row['state']] = row['count']
+        return counts
+
+    def requeue_running(self) -> List[str]:
+        """
+        実行中のまま残ったジョブを待機中に戻す
+
+        サーバー起動時（ワーカーがまだ一つも動いていない時点）に呼び出し、
+        前回のプロセス終了で中断されたジョブを再実行させる。
+
+        Returns:
+            再投入した解析IDのリスト
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT analysis_id FROM jobs WHERE state = ?", (self.RUNNING,)
+            ).fetchall()
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, stage = NULL, progress = NULL, worker_id = NULL, started_at = NULL, "
+                "version = version + 1 WHERE state = ?",
+                (self.QUEUED, self.RUNNING)
+            )
+        return [row['analysis_id'] for row in rows]
+
+    def recover_worker(self, worker_id: int, worker_pid: Optional[int] = None) -> Dict[str, List[str]]:
+        """
+        異常終了したワーカーが実行中だったジョブを待機中に戻す（MAX_ATTEMPTS 回目なら失敗にする）
+
+        Args:
+            worker_id: ワーカー番号
+            worker_pid: 異常終了したプロセスのID（指定時はそのプロセスが取得したジョブだけを対象にする）
+
+        Returns:
+            {'requeued': 再投入した解析IDのリスト, 'failed': 失敗にした解析IDのリスト}
+        """
+        query = "SELECT analysis_id, attempts FROM jobs WHERE state = ? AND worker_id = ?"
+        args = [self.RUNNING, worker_id]
+        if worker_pid is not None:
+            query += " AND worker_pid = ?"
+            args.append(worker_pid)
+
+        recovered = {'requeued': [], 'failed': []}
+        with self._lock:
+            rows = self._conn.execute(query, args).fetchall()
+            for row in rows:
+                if row['attempts'] >= self.MAX_ATTEMPTS:
+                    recovered['failed'].append(row['analysis_id'])
+                    continue
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, stage = NULL, progress = NULL, worker_id = NULL, worker_pid = NULL, "
+                    "started_at = NULL, updated_at = ?, version = version + 1 WHERE analysis_id = ? AND state = ?",
+                    (self.QUEUED, time.time(), row['analysis_id'], self.RUNNING)
+                )
+                recovered['requeued'].append(row['analysis_id'])
+
+        for analysis_id in recovered['failed']:
+            self.fail(analysis_id, f'ワーカープロセスが異常終了しました（{self.MAX_ATTEMPTS}回）')
+        return recovered
+
+    @staticmethod
+    def _row_to_dict(row) -> Dict:
+        """sqlite3.Row をジョブ辞書に変換"""
+        job = dict(row)
+        job['params'] = json.loads(job['params']) if job['params'] else {}
+        job['progress'] = json.loads(job['progress']) if job.get('progress') else {}
+        return job
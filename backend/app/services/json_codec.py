@@ -0,0 +1,133 @@
+"""
+テニスサービス動作解析 - JSON シリアライズ
+NumPy 型をそのまま扱える一回パスの JSON エンコーダー
+"""
+
+import json
+import os
+import tempfile
+from typing import Any, BinaryIO, Callable
+
+import numpy as np
+
+# orjson がインストールされていれば NumPy 配列・スカラーを C 実装で直接変換する（オプション）
+try:
+    import orjson
+    orjson_available = True
+except ImportError:
+    orjson_available = False
+
+
+class NumpyJSONEncoder(json.JSONEncoder):
+    """NumPy のスカラー・配列を標準型として出力する JSON エンコーダー"""
+
+    def default(self, obj):
+        if isinstance(obj, np.integer):
+            return int(obj)
+        if isinstance(obj, np.floating):
+            return float(obj)
+        if isinstance(obj, np.bool_):
+            return bool(obj)
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        return super().default(obj)
+
+
+def _finite(obj: Any) -> Any:
+    """NaN・無限大を None に置き換えた値（標準ライブラリで NaN を含む値を変換する場合だけ使う）"""
+    if isinstance(obj, (float, np.floating)):
+        return float(obj) if np.isfinite(obj) else None
+    if isinstance(obj, np.ndarray):
+        return _finite(obj.tolist()) if obj.dtype.kind == 'f' or obj.dtype == object else obj
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(item) for item in obj]
+    return obj
+
+
+def _orjson_default(obj):
+    """orjson が直接変換できない値（C 連続でない配列・未対応の NumPy 型）の変換"""
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind in 'biuf' and not obj.flags['C_CONTIGUOUS']:
+            return np.ascontiguousarray(obj)
+        return NumpyJSONEncoder().default(obj)
+    if isinstance(obj, np.generic):
+        return NumpyJSONEncoder().default(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """
+    オブジェクトを UTF-8 の JSON バイト列に変換（事前の型変換なし・一回のシリアライズ）
+
+    orjson の有無で出力が変わらないよう、NaN・無限大はどちらも null にする。
+
+    Args:
+        obj: 変換対象（NumPy 型を含んでよい）
+
+    Returns:
+        JSON バイト列
+    """
+    if orjson_available:
+        return orjson.dumps(obj, default=_orjson_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    try:
+        # C 実装のエンコーダーで変換し、NaN・無限大を含む場合だけ None に置き換えてから変換し直す
+        return _stdlib_dumps(obj)
+    except ValueError:
+        return _stdlib_dumps(_finite(obj))
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    """標準ライブラリの json による変換（NaN・無限大を含めば ValueError）"""
+    return json.dumps(obj, cls=NumpyJSONEncoder, ensure_ascii=False, separators=(',', ':'),
+                      allow_nan=False).encode('utf-8')
+
+
+def loads(data) -> Any:
+    """JSON バイト列または文字列を読み込み"""
+    if orjson_available:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def replace_file(file_path: str, write: Callable[[BinaryIO], None]):
+    """
+    同じディレクトリの一意な一時ファイルに書き込んでから置き換える
+
+    書き込み途中のファイルが読まれず、同じパスへの同時書き込みが一時ファイルを共有しない。
+
+    Args:
+        file_path: 出力ファイルパス
+        write: 一時ファイル（バイナリ）に内容を書き込む関数
+    """
+    fd, temp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(file_path)}.', suffix='.tmp',
+                                     dir=os.path.dirname(file_path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_json(obj: Any, file_path: str) -> bytes:
+    """
+    オブジェクトを一度だけシリアライズしてファイルに書き込む
+
+    書き込み途中のファイルが読まれないよう一時ファイル経由で置き換える。
+    戻り値のバイト列はそのまま HTTP レスポンスの本文に使える。
+
+    Args:
+        obj: 書き込むオブジェクト
+        file_path: 出力ファイルパス
+
+    Returns:
+        書き込んだ JSON バイト列
+    """
+    data = dumps_bytes(obj)
+    replace_file(file_path, lambda f: f.write(data))
+    return data
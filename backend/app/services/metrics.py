@@ -0,0 +1,221 @@
+"""
+テニスサービス動作解析 - メトリクス
+ワーカープロセスと API プロセスで共有するカウンター・ヒストグラムと Prometheus 形式の出力
+"""
+
+import json
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.database import connect
+
+# ステージ・動画単位の所要時間のバケット（秒）
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# フレーム単位の推論時間のバケット（秒）
+FRAME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# メトリクスの説明（# HELP 行）
+METRIC_HELP = {
+    'analyzer_stage_duration_seconds': '解析ステージごとの所要時間',
+    'analyzer_pose_frame_inference_seconds': 'ポーズ推論のフレームごとの所要時間',
+    'analyzer_pose_video_inference_seconds': 'ポーズ推論の動画ごとの合計時間',
+    'analyzer_job_duration_seconds': '解析ジョブ全体の所要時間',
+    'analyzer_time_to_result_seconds': 'ジョブ登録からスコア・フェーズ（アドバイスなしの結果）公開までの時間',
+    'analyzer_time_to_advice_seconds': 'ジョブ登録からアドバイスを含む結果の完成までの時間',
+    'analyzer_jobs_total': '終了した解析ジョブ数',
+    'analyzer_pose_frames_total': 'ポーズ検出を実行したフレーム数',
+    'analyzer_pose_detected_frames_total': 'ポーズを検出できたフレーム数',
+    'analyzer_bytes_written_total': '成果物として書き込んだバイト数',
+    'analyzer_worker_busy_seconds_total': 'ワーカーがジョブを処理していた合計時間',
+    'analyzer_worker_startup_seconds': 'ワーカー起動の所要時間（モジュール読み込み・グラフ構築・ウォームアップ）'
+}
+
+
+def _labels_key(labels: Optional[Dict[str, str]]) -> str:
+    """ラベルを保存用のキーに変換（順序を固定）"""
+    return json.dumps(labels or {}, sort_keys=True, ensure_ascii=False)
+
+
+def _format_labels(labels: Dict[str, str], extra: Optional[Tuple[str, str]] = None) -> str:
+    """Prometheus のラベル表記"""
+    items = list(labels.items())
+    if extra is not None:
+        items.append(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+
+def _escape(value) -> str:
+    """ラベル値のエスケープ"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsStore:
+    """
+    メトリクス保存クラス
+
+    解析はワーカープロセスで実行されるため、値はプロセス間で共有する SQLite に加算する。
+    書き込みはステージ・ジョブ単位で行い、フレーム単位の値は呼び出し側でまとめて渡す。
+    """
+
+    def __init__(self, db_path: str):
+        """
+        メトリクス保存の初期化
+
+        Args:
+            db_path: SQLite データベースファイルパス
+        """
+        self._lock = threading.Lock()
+        self._conn = connect(db_path)
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS metric_counters (
+                    name TEXT NOT NULL,
+                    labels TEXT NOT NULL,
+                    value REAL NOT NULL,
+                    PRIMARY KEY (name, labels)
+                );
+                CREATE TABLE IF NOT EXISTS metric_histograms (
+                    name TEXT NOT NULL,
+                    labels TEXT NOT NULL,
+                    bounds TEXT NOT NULL,
+                    buckets TEXT NOT NULL,
+                    sum REAL NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (name, labels)
+                );
+            """)
+
+    def inc(self, name: str, value: float = 1.0, labels: Optional[Dict[str, str]] = None):
+        """カウンターに加算"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO metric_counters (name, labels, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value",
+                (name, _labels_key(labels), value)
+            )
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None,
+                bounds: Iterable[float] = LATENCY_BUCKETS):
+        """ヒストグラムに1件記録"""
+        self.observe_many(name, [value], labels, bounds)
+
+    def observe_many(self, name: str, values: List[float], labels: Optional[Dict[str, str]] = None,
+                     bounds: Iterable[float] = LATENCY_BUCKETS):
+        """
+        ヒストグラムに複数件をまとめて記録（フレーム単位の値など）
+
+        Args:
+            name: メトリクス名
+            values: 観測値のリスト
+            labels: ラベル
+            bounds: バケットの上限値（昇順）
+        """
+        if not values:
+            return
+
+        bounds = list(bounds)
+        counts = [0] * (len(bounds) + 1)  # 最後は +Inf
+        for value in values:
+            for index, bound in enumerate(bounds):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+
+        key = _labels_key(labels)
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    "SELECT bounds, buckets, sum, count FROM metric_histograms WHERE name = ? AND labels = ?",
+                    (name, key)
+                ).fetchone()
+                if row is not None and json.loads(row['bounds']) == bounds:
+                    counts = [a + b for a, b in zip(json.loads(row['buckets']), counts)]
+                    total, count = row['sum'] + sum(values), row['count'] + len(values)
+                else:
+                    total, count = sum(values), len(values)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO metric_histograms (name, labels, bounds, buckets, sum, count) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (name, key, json.dumps(bounds), json.dumps(counts), total, count)
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def counters(self) -> List[Dict]:
+        """全カウンターの値"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, labels, value FROM metric_counters ORDER BY name, labels"
+            ).fetchall()
+        return [{'name': row['name'], 'labels': json.loads(row['labels']), 'value': row['value']} for row in rows]
+
+    def counter_value(self, name: str, labels: Optional[Dict[str, str]] = None) -> float:
+        """カウンター1つの値（未記録なら 0）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM metric_counters WHERE name = ? AND labels = ?", (name, _labels_key(labels))
+            ).fetchone()
+        return row['value'] if row else 0.0
+
+    def histograms(self) -> List[Dict]:
+        """全ヒストグラムの値"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM metric_histograms ORDER BY name, labels"
+            ).fetchall()
+        return [{
+            'name': row['name'],
+            'labels': json.loads(row['labels']),
+            'bounds': json.loads(row['bounds']),
+            'buckets': json.loads(row['buckets']),
+            'sum': row['sum'],
+            'count': row['count']
+        } for row in rows]
+
+    def render(self, gauges: List[Tuple[str, str, Dict[str, str], float]]) -> str:
+        """
+        Prometheus テキスト形式で出力
+
+        Args:
+            gauges: 取得時点で計算した (名前, 説明, ラベル, 値) のリスト
+
+        Returns:
+            テキスト形式のメトリクス
+        """
+        lines = []
+        described = set()
+
+        def describe(name: str, metric_type: str, help_text: str):
+            if name in described:
+                return
+            described.add(name)
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+
+        for counter in self.counters():
+            describe(counter['name'], 'counter', METRIC_HELP.get(counter['name'], counter['name']))
+            lines.append(f"{counter['name']}{_format_labels(counter['labels'])} {counter['value']}")
+
+        for histogram in self.histograms():
+            name = histogram['name']
+            describe(name, 'histogram', METRIC_HELP.get(name, name))
+            cumulative = 0
+            for bound, count in zip(histogram['bounds'] + ['+Inf'], histogram['buckets']):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(histogram['labels'], ('le', str(bound)))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(histogram['labels'])} {histogram['sum']}")
+            lines.append(f"{name}_count{_format_labels(histogram['labels'])} {histogram['count']}")
+
+        for name, help_text, labels, value in gauges:
+            describe(name, 'gauge', help_text)
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+
+        return '\n'.join(lines) + '\n'
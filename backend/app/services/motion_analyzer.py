@@ -6,10 +6,12 @@
 import numpy as np
 import math
 import time
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
 import json
 from dataclasses import dataclass
 
+from services.pose_sequence import PoseSequence
+
 
 @dataclass
 class ServePhase:
@@ -69,23 +71,22 @@ class MotionAnalyzer:
             }
         }
     
-    def analyze_serve_motion(self, pose_results: List[Dict]) -> Dict:
+    def analyze_serve_motion(self, pose_results: Union[PoseSequence, List[Dict]]) -> Dict:
         """
         サーブ動作の包括的解析
         
         Args:
-            pose_results: ポーズ検出結果リスト
+            pose_results: ポーズ検出結果（PoseSequence または辞書のリスト）
             
         Returns:
             動作解析結果の辞書
         """
         if not pose_results:
             raise ValueError("ポーズ検出結果が空です")
+        pose_results = PoseSequence.coerce(pose_results)
         
         # ポーズが検出されたフレームの確認
-        detected_frames = [result for result in pose_results if result.get('has_pose', False)]
-        
-        if len(detected_frames) < 10:  # 最低10フレームは必要
+        if pose_results.detected_count < 10:  # 最低10フレームは必要
             return {
                 'analysis_id': f"analysis_{int(time.time() * 1000)}",
                 'video_metadata': self._extract_video_metadata(pose_results),
@@ -121,7 +122,7 @@ class MotionAnalyzer:
         })
         
         return {
-            'analysis_id': f"analysis_{int(pose_results[0].get('timestamp', time.time()) * 1000)}",
+            'analysis_id': f"analysis_{int(pose_results.timestamps[0] * 1000)}",
             'video_metadata': self._extract_video_metadata(pose_results),
             'serve_phases': {phase.name: {
                 'start_frame': phase.start_frame,
@@ -146,12 +147,12 @@ class MotionAnalyzer:
             })
         }
     
-    def identify_serve_phases(self, pose_results: List[Dict]) -> List[ServePhase]:
+    def identify_serve_phases(self, pose_results: PoseSequence) -> List[ServePhase]:
         """
         サーブフェーズの自動特定
         
         Args:
-            pose_results: ポーズ検出結果リスト
+            pose_results: ポーズ検出結果
             
         Returns:
             特定されたサーブフェーズのリスト
@@ -159,24 +160,24 @@ class MotionAnalyzer:
         phases = []
         total_frames = len(pose_results)
         
+        if total_frames == 0:
+            # フォールバック: 均等分割
+            return self._create_fallback_phases(total_frames)
+        
         # 右手首の軌道を分析してフェーズを特定
         right_wrist_trajectory = self._extract_landmark_trajectory(pose_results, 'right_wrist')
         left_wrist_trajectory = self._extract_landmark_trajectory(pose_results, 'left_wrist')
         
-        if not right_wrist_trajectory or not left_wrist_trajectory:
-            # フォールバック: 均等分割
-            return self._create_fallback_phases(total_frames)
-        
-        # 左手首の最高点を検出（トス頂点）
-        left_wrist_heights = [point['y'] for point in left_wrist_trajectory if point is not None]
-        if left_wrist_heights:
+        # 左手首の最高点を検出（トス頂点、検出フレームのみの並びでのインデックス）
+        left_wrist_heights = left_wrist_trajectory[:, 1]
+        if left_wrist_heights.size:
             toss_peak_frame = np.argmin(left_wrist_heights)  # y座標が小さいほど高い
         else:
             toss_peak_frame = total_frames // 3
         
         # 右手首の最高点を検出（接触点）
-        right_wrist_heights = [point['y'] for point in right_wrist_trajectory if point is not None]
-        if right_wrist_heights:
+        right_wrist_heights = right_wrist_trajectory[:, 1]
+        if right_wrist_heights.size:
             contact_frame = np.argmin(right_wrist_heights)
         else:
             contact_frame = total_frames * 2 // 3
@@ -238,41 +239,30 @@ class MotionAnalyzer:
         
         return phases
     
-    def analyze_knee_movement(self, pose_results: List[Dict], serve_phases: List[ServePhase]) -> Dict:
+    def analyze_knee_movement(self, pose_results: PoseSequence, serve_phases: List[ServePhase]) -> Dict:
         """
         膝の動きの解析
         
         Args:
-            pose_results: ポーズ検出結果リスト
+            pose_results: ポーズ検出結果
             serve_phases: サーブフェーズリスト
             
         Returns:
             膝の動き解析結果
         """
-        left_knee_trajectory = self._extract_landmark_trajectory(pose_results, 'left_knee')
-        right_knee_trajectory = self._extract_landmark_trajectory(pose_results, 'right_knee')
-        left_hip_trajectory = self._extract_landmark_trajectory(pose_results, 'left_hip')
-        right_hip_trajectory = self._extract_landmark_trajectory(pose_results, 'right_hip')
-        
-        # 膝の角度計算（大腿部と下腿部の角度）
-        knee_angles = []
-        for i, result in enumerate(pose_results):
-            if result['has_pose']:
-                # 右膝の角度計算（右股関節-右膝-右足首）
-                right_angle = self._calculate_joint_angle(
-                    result.get('landmarks', {}).get('right_hip'),
-                    result.get('landmarks', {}).get('right_knee'),
-                    result.get('landmarks', {}).get('right_ankle')
-                )
-                knee_angles.append(right_angle)
-            else:
-                knee_angles.append(None)
+        # 膝の角度計算（大腿部と下腿部の角度、右股関節-右膝-右足首、未検出フレームは NaN）
+        knee_angles = self._calculate_joint_angle(
+            pose_results.xy('right_hip'),
+            pose_results.xy('right_knee'),
+            pose_results.xy('right_ankle')
+        )
+        knee_angles[~pose_results.valid('right_hip', 'right_knee', 'right_ankle')] = np.nan
         
         # 最大膝曲げの検出
-        valid_angles = [angle for angle in knee_angles if angle is not None]
-        if valid_angles:
-            max_bend_angle = min(valid_angles)  # 角度が小さいほど曲がっている
-            max_bend_frame = knee_angles.index(max_bend_angle)
+        valid = ~np.isnan(knee_angles)
+        if valid.any():
+            max_bend_frame = int(np.nanargmin(knee_angles))  # 角度が小さいほど曲がっている
+            max_bend_angle = knee_angles[max_bend_frame]
         else:
             max_bend_angle = 180
             max_bend_frame = 0
@@ -313,40 +303,27 @@ class MotionAnalyzer:
             'recommendations': self._get_knee_recommendations(max_bend_angle, timing_issues, depth_issues)
         }
     
-    def analyze_elbow_position(self, pose_results: List[Dict], serve_phases: List[ServePhase]) -> Dict:
+    def analyze_elbow_position(self, pose_results: PoseSequence, serve_phases: List[ServePhase]) -> Dict:
         """
         肘の位置の解析
         
         Args:
-            pose_results: ポーズ検出結果リスト
+            pose_results: ポーズ検出結果
             serve_phases: サーブフェーズリスト
             
         Returns:
             肘の位置解析結果
         """
-        right_elbow_trajectory = self._extract_landmark_trajectory(pose_results, 'right_elbow')
-        right_shoulder_trajectory = self._extract_landmark_trajectory(pose_results, 'right_shoulder')
-        
         # トロフィーポジション時の肘の高さを評価
         trophy_phase = next((p for p in serve_phases if p.name == 'trophy_position'), None)
         
-        if trophy_phase and right_elbow_trajectory and right_shoulder_trajectory:
-            trophy_frames = range(trophy_phase.start_frame, trophy_phase.end_frame + 1)
-            
-            # トロフィーポジション期間中の肘と肩の相対位置
-            elbow_heights = []
-            shoulder_heights = []
+        if trophy_phase and len(pose_results):
+            # トロフィーポジション期間中の検出フレームでの肘と肩の相対位置
+            trophy_frames = self._phase_frames(pose_results, trophy_phase, 'right_elbow', 'right_shoulder')
+            elbow_heights = pose_results.xy('right_elbow')[trophy_frames, 1].astype(np.float64)
+            shoulder_heights = pose_results.xy('right_shoulder')[trophy_frames, 1].astype(np.float64)
             
-            for frame_idx in trophy_frames:
-                if (frame_idx < len(right_elbow_trajectory) and 
-                    frame_idx < len(right_shoulder_trajectory) and
-                    right_elbow_trajectory[frame_idx] is not None and
-                    right_shoulder_trajectory[frame_idx] is not None):
-                    
-                    elbow_heights.append(right_elbow_trajectory[frame_idx]['y'])
-                    shoulder_heights.append(right_shoulder_trajectory[frame_idx]['y'])
-            
-            if elbow_heights and shoulder_heights:
+            if elbow_heights.size:
                 avg_elbow_height = np.mean(elbow_heights)
                 avg_shoulder_height = np.mean(shoulder_heights)
                 elbow_shoulder_diff = avg_shoulder_height - avg_elbow_height  # 正の値なら肘が肩より高い
@@ -372,8 +349,10 @@ class MotionAnalyzer:
         
         # 肘の安定性評価（軌道の滑らかさ）
         stability_score = 10.0
-        if right_elbow_trajectory:
-            trajectory_smoothness = self._calculate_trajectory_smoothness(right_elbow_trajectory)
+        if len(pose_results):
+            trajectory_smoothness = self._calculate_trajectory_smoothness(
+                self._extract_landmark_trajectory(pose_results, 'right_elbow')
+            )
             if trajectory_smoothness < 0.7:
                 height_issues.append("肘の動きが不安定です")
                 stability_score -= 2.0
@@ -390,20 +369,18 @@ class MotionAnalyzer:
             'recommendations': self._get_elbow_recommendations(elbow_shoulder_diff, height_issues)
         }
     
-    def analyze_toss_trajectory(self, pose_results: List[Dict], serve_phases: List[ServePhase]) -> Dict:
+    def analyze_toss_trajectory(self, pose_results: PoseSequence, serve_phases: List[ServePhase]) -> Dict:
         """
         トスの軌道解析
         
         Args:
-            pose_results: ポーズ検出結果リスト
+            pose_results: ポーズ検出結果
             serve_phases: サーブフェーズリスト
             
         Returns:
             トス軌道解析結果
         """
-        left_wrist_trajectory = self._extract_landmark_trajectory(pose_results, 'left_wrist')
-        
-        if not left_wrist_trajectory:
+        if not len(pose_results):
             return {
                 'max_height': 0.0,
                 'forward_distance': 0.0,
@@ -417,13 +394,13 @@ class MotionAnalyzer:
         toss_phase = next((p for p in serve_phases if p.name == 'ball_toss'), None)
         
         if toss_phase:
-            toss_frames = range(toss_phase.start_frame, toss_phase.end_frame + 1)
-            toss_trajectory = [left_wrist_trajectory[i] for i in toss_frames 
-                             if i < len(left_wrist_trajectory) and left_wrist_trajectory[i] is not None]
+            toss_frames = self._phase_frames(pose_results, toss_phase, 'left_wrist')
+            toss_trajectory = pose_results.xy('left_wrist')[toss_frames]
         else:
-            toss_trajectory = [point for point in left_wrist_trajectory if point is not None]
+            toss_trajectory = self._extract_landmark_trajectory(pose_results, 'left_wrist')
+        toss_trajectory = toss_trajectory.astype(np.float64)
         
-        if not toss_trajectory:
+        if not toss_trajectory.size:
             return {
                 'max_height': 0.0,
                 'forward_distance': 0.0,
@@ -434,13 +411,12 @@ class MotionAnalyzer:
             }
         
         # トスの最高点
-        heights = [point['y'] for point in toss_trajectory]
-        max_height = min(heights)  # y座標が小さいほど高い
+        max_height = float(toss_trajectory[:, 1].min())  # y座標が小さいほど高い
         max_height_normalized = 1.0 - max_height  # 正規化された高さ
         
         # トスの前方距離
-        start_x = toss_trajectory[0]['x']
-        end_x = toss_trajectory[-1]['x']
+        start_x = float(toss_trajectory[0, 0])
+        end_x = float(toss_trajectory[-1, 0])
         forward_distance = abs(end_x - start_x)
         
         # トスの一貫性（軌道の滑らかさ）
@@ -484,53 +460,30 @@ class MotionAnalyzer:
             'recommendations': self._get_toss_recommendations(max_height_normalized, forward_distance, issues)
         }
     
-    def analyze_body_rotation(self, pose_results: List[Dict], serve_phases: List[ServePhase]) -> Dict:
+    def analyze_body_rotation(self, pose_results: PoseSequence, serve_phases: List[ServePhase]) -> Dict:
         """
         体の回転の解析
         
         Args:
-            pose_results: ポーズ検出結果リスト
+            pose_results: ポーズ検出結果
             serve_phases: サーブフェーズリスト
             
         Returns:
             体の回転解析結果
         """
-        shoulder_rotations = []
-        hip_rotations = []
-        
-        for result in pose_results:
-            if result['has_pose']:
-                landmarks = result.get('landmarks', {})
-                
-                # 肩の回転角度計算
-                left_shoulder = landmarks.get('left_shoulder')
-                right_shoulder = landmarks.get('right_shoulder')
-                
-                if left_shoulder and right_shoulder:
-                    shoulder_angle = self._calculate_rotation_angle(left_shoulder, right_shoulder)
-                    shoulder_rotations.append(shoulder_angle)
-                else:
-                    shoulder_rotations.append(None)
-                
-                # 腰の回転角度計算
-                left_hip = landmarks.get('left_hip')
-                right_hip = landmarks.get('right_hip')
-                
-                if left_hip and right_hip:
-                    hip_angle = self._calculate_rotation_angle(left_hip, right_hip)
-                    hip_rotations.append(hip_angle)
-                else:
-                    hip_rotations.append(None)
-            else:
-                shoulder_rotations.append(None)
-                hip_rotations.append(None)
+        # 肩・腰の回転角度計算（左右とも検出できたフレームのみ）
+        shoulders = pose_results.valid('left_shoulder', 'right_shoulder')
+        shoulder_rotations = self._calculate_rotation_angle(
+            pose_results.xy('left_shoulder')[shoulders], pose_results.xy('right_shoulder')[shoulders]
+        )
+        hips = pose_results.valid('left_hip', 'right_hip')
+        hip_rotations = self._calculate_rotation_angle(
+            pose_results.xy('left_hip')[hips], pose_results.xy('right_hip')[hips]
+        )
         
         # 最大回転角度の検出
-        valid_shoulder_rotations = [angle for angle in shoulder_rotations if angle is not None]
-        valid_hip_rotations = [angle for angle in hip_rotations if angle is not None]
-        
-        max_shoulder_rotation = max(valid_shoulder_rotations) if valid_shoulder_rotations else 0
-        max_hip_rotation = max(valid_hip_rotations) if valid_hip_rotations else 0
+        max_shoulder_rotation = float(shoulder_rotations.max()) if shoulder_rotations.size else 0
+        max_hip_rotation = float(hip_rotations.max()) if hip_rotations.size else 0
         
         # 評価
         shoulder_score = 10.0
@@ -563,12 +516,12 @@ class MotionAnalyzer:
             'recommendations': self._get_rotation_recommendations(max_shoulder_rotation, max_hip_rotation, issues)
         }
     
-    def analyze_timing(self, pose_results: List[Dict], serve_phases: List[ServePhase]) -> Dict:
+    def analyze_timing(self, pose_results: PoseSequence, serve_phases: List[ServePhase]) -> Dict:
         """
         タイミングの解析
         
         Args:
-            pose_results: ポーズ検出結果リスト
+            pose_results: ポーズ検出結果
             serve_phases: サーブフェーズリスト
             
         Returns:
@@ -649,60 +602,42 @@ class MotionAnalyzer:
         return sum(scores) if scores else 0.0
     
     # ヘルパーメソッド
-    def _extract_landmark_trajectory(self, pose_results: List[Dict], landmark_name: str) -> List[Optional[Dict]]:
-        """ランドマークの軌道を抽出"""
-        trajectory = []
-        for result in pose_results:
-            if result['has_pose'] and landmark_name in result.get('landmarks', {}):
-                trajectory.append(result['landmarks'][landmark_name])
-            else:
-                trajectory.append(None)
-        return trajectory
+    def _extract_landmark_trajectory(self, pose_results: PoseSequence, landmark_name: str) -> np.ndarray:
+        """ランドマークの軌道を抽出（検出フレームの (x, y) のみ、フレーム順）"""
+        return pose_results.xy(landmark_name)[pose_results.valid(landmark_name)]
     
-    def _calculate_joint_angle(self, point1: Optional[Dict], point2: Optional[Dict], point3: Optional[Dict]) -> Optional[float]:
-        """3点から関節角度を計算"""
-        if not all([point1, point2, point3]):
-            return None
-        
+    def _phase_frames(self, pose_results: PoseSequence, phase: ServePhase, *landmark_names: str) -> np.ndarray:
+        """フェーズ期間（終了フレームを含む）のうち指定したランドマークを検出できたフレームのインデックス"""
+        start = max(phase.start_frame, 0)
+        end = min(phase.end_frame + 1, len(pose_results))
+        frames = np.arange(start, max(start, end))
+        return frames[pose_results.valid(*landmark_names)[frames]]
+    
+    def _calculate_joint_angle(self, point1: np.ndarray, point2: np.ndarray, point3: np.ndarray) -> np.ndarray:
+        """3点の (x, y) の配列からフレームごとの関節角度を計算（度、計算できないフレームは NaN）"""
         # ベクトル計算
-        v1 = np.array([point1['x'] - point2['x'], point1['y'] - point2['y']])
-        v2 = np.array([point3['x'] - point2['x'], point3['y'] - point2['y']])
+        v1 = point1.astype(np.float64) - point2
+        v2 = point3.astype(np.float64) - point2
         
         # 角度計算
-        cos_angle = np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cos_angle = (v1 * v2).sum(axis=-1) / (np.linalg.norm(v1, axis=-1) * np.linalg.norm(v2, axis=-1))
         cos_angle = np.clip(cos_angle, -1.0, 1.0)
-        angle = np.arccos(cos_angle) * 180 / np.pi
-        
-        return angle
+        return np.arccos(cos_angle) * 180 / np.pi
     
-    def _calculate_rotation_angle(self, left_point: Dict, right_point: Dict) -> float:
-        """2点から回転角度を計算"""
-        dx = right_point['x'] - left_point['x']
-        dy = right_point['y'] - left_point['y']
-        angle = math.atan2(dy, dx) * 180 / math.pi
-        return abs(angle)
+    def _calculate_rotation_angle(self, left_points: np.ndarray, right_points: np.ndarray) -> np.ndarray:
+        """2点の (x, y) の配列からフレームごとの回転角度を計算（度）"""
+        delta = right_points.astype(np.float64) - left_points
+        return np.abs(np.arctan2(delta[:, 1], delta[:, 0]) * 180 / math.pi)
     
-    def _calculate_trajectory_smoothness(self, trajectory: List[Dict]) -> float:
-        """軌道の滑らかさを計算（Noneチェック追加）"""
+    def _calculate_trajectory_smoothness(self, trajectory: np.ndarray) -> float:
+        """軌道（検出フレームの (x, y) の配列）の滑らかさを計算"""
         if len(trajectory) < 3:
             return 0.0
         
-        # Noneでない有効なポイントのみを抽出
-        valid_points = [point for point in trajectory if point is not None]
-        
-        if len(valid_points) < 3:
-            return 0.0
-        
         # 速度変化の標準偏差を計算
-        velocities = []
-        for i in range(1, len(valid_points)):
-            dx = valid_points[i]['x'] - valid_points[i-1]['x']
-            dy = valid_points[i]['y'] - valid_points[i-1]['y']
-            velocity = math.sqrt(dx*dx + dy*dy)
-            velocities.append(velocity)
-        
-        if len(velocities) < 2:
-            return 1.0
+        deltas = np.diff(trajectory.astype(np.float64), axis=0)
+        velocities = np.sqrt(deltas[:, 0] * deltas[:, 0] + deltas[:, 1] * deltas[:, 1])
         
         velocity_std = np.std(velocities)
         velocity_mean = np.mean(velocities)
@@ -714,7 +649,7 @@ class MotionAnalyzer:
         smoothness = 1.0 - min(velocity_std / velocity_mean, 1.0)
         return max(smoothness, 0.0)
     
-    def _extract_video_metadata(self, pose_results: List[Dict]) -> Dict:
+    def _extract_video_metadata(self, pose_results: PoseSequence) -> Dict:
         """動画メタデータの抽出"""
         if not pose_results:
             return {
@@ -725,13 +660,13 @@ class MotionAnalyzer:
             }
         
         total_frames = len(pose_results)
-        detected_frames = sum(1 for result in pose_results if result.get('has_pose', False))
+        detected_frames = pose_results.detected_count
         
         # フレームレートの推定（タイムスタンプから）
         fps = 30.0  # デフォルト値
         if len(pose_results) > 1:
-            first_timestamp = pose_results[0].get('timestamp', 0.0)
-            last_timestamp = pose_results[-1].get('timestamp', 0.0)
+            first_timestamp = float(pose_results.timestamps[0])
+            last_timestamp = float(pose_results.timestamps[-1])
             if last_timestamp > first_timestamp:
                 duration = last_timestamp - first_timestamp
                 fps = (total_frames - 1) / duration if duration > 0 else 30.0
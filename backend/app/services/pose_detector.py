@@ -6,10 +6,16 @@ MediaPipeを使用した人体ポーズ検出機能
 import cv2
 import mediapipe as mp
 import numpy as np
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 import json
 import time
 
+from services.frame_queue import FrameWriter, prefetch
+from services.json_codec import write_json
+from services.pose_format import LANDMARK_NAMES, load_pose_arrays, save_pose_arrays
+from services.pose_sequence import VISIBILITY_THRESHOLD, PoseSequence
+from services.tracing import NULL_TRACER
+
 
 class PoseDetector:
     """MediaPipeを使用したポーズ検出クラス"""
@@ -30,6 +36,13 @@ class PoseDetector:
         self.mp_drawing = mp.solutions.drawing_utils
         self.mp_drawing_styles = mp.solutions.drawing_styles
         
+        self.model_complexity = model_complexity
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        
+        # 直前の process_video でのフレームごとの推論時間（秒、メトリクス用）
+        self.last_frame_times: List[float] = []
+        
         self.pose = self.mp_pose.Pose(
             static_image_mode=False,
             model_complexity=model_complexity,
@@ -38,44 +51,44 @@ class PoseDetector:
             min_tracking_confidence=min_tracking_confidence
         )
         
-        # テニスサービス解析に重要なランドマーク
-        self.key_landmarks = {
-            'nose': 0,
-            'left_eye_inner': 1,
-            'left_eye': 2,
-            'left_eye_outer': 3,
-            'right_eye_inner': 4,
-            'right_eye': 5,
-            'right_eye_outer': 6,
-            'left_ear': 7,
-            'right_ear': 8,
-            'mouth_left': 9,
-            'mouth_right': 10,
-            'left_shoulder': 11,
-            'right_shoulder': 12,
-            'left_elbow': 13,
-            'right_elbow': 14,
-            'left_wrist': 15,
-            'right_wrist': 16,
-            'left_pinky': 17,
-            'right_pinky': 18,
-            'left_index': 19,
-            'right_index': 20,
-            'left_thumb': 21,
-            'right_thumb': 22,
-            'left_hip': 23,
-            'right_hip': 24,
-            'left_knee': 25,
-            'right_knee': 26,
-            'left_ankle': 27,
-            'right_ankle': 28,
-            'left_heel': 29,
-            'right_heel': 30,
-            'left_foot_index': 31,
-            'right_foot_index': 32
-        }
+        # テニスサービス解析に重要なランドマーク（名前 -> MediaPipe のインデックス）
+        self.key_landmarks = {name: index for index, name in enumerate(LANDMARK_NAMES)}
+    
+    def reset(self):
+        """
+        トラッキング状態のリセット
+        
+        static_image_mode=False では前フレームの検出結果を次フレームの
+        追跡に使うため、別の動画を処理する前に呼び出す。グラフは再構築
+        せず実行のみを再開するので、モデルの再読み込みは発生しない。
+        """
+        self.pose.reset()
+    
+    def close(self):
+        """MediaPipe グラフの解放"""
+        self.pose.close()
+    
+    def warm_up(self, width: int = 384, height: int = 216) -> float:
+        """
+        ダミーフレームで推論を一度実行してモデルを温める
+        
+        グラフの構築後も最初の推論ではモデルの読み込みや推論エンジンの初期化が
+        発生するため、ジョブを受け付ける前に済ませておく。
+        
+        Args:
+            width: ダミーフレームの幅（前処理後の解像度に合わせる）
+            height: ダミーフレームの高さ
+            
+        Returns:
+            所要時間（秒）
+        """
+        start_time = time.perf_counter()
+        self.detect_pose(np.zeros((height, width, 3), dtype=np.uint8))
+        self.reset()
+        return time.perf_counter() - start_time
     
-    def detect_pose(self, frame: np.ndarray, frame_number: int = 0, timestamp: float = 0.0) -> Dict:
+    def detect_pose(self, frame: np.ndarray, frame_number: int = 0, timestamp: float = 0.0,
+                    tracer=NULL_TRACER) -> Dict:
         """
         単一フレームのポーズ検出
         
@@ -83,15 +96,12 @@ class PoseDetector:
             frame: 入力画像フレーム
             frame_number: フレーム番号
             timestamp: タイムスタンプ
+            tracer: 処理タイムラインの記録先（サンプル対象のフレームのみ記録する）
             
         Returns:
             ポーズ検出結果の辞書
         """
-        # BGRからRGBに変換
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # ポーズ検出実行
-        results = self.pose.process(rgb_frame)
+        results = self._infer(frame, frame_number, tracer)
         
         # 結果を辞書形式で構造化
         pose_data = {
@@ -125,17 +135,34 @@ class PoseDetector:
         
         return pose_data
     
-    def process_video(self, video_path: str, output_path: Optional[str] = None) -> List[Dict]:
+    def _infer(self, frame: np.ndarray, frame_number: int, tracer):
+        """BGR フレームの推論（MediaPipe の結果をそのまま返す）"""
+        # BGRからRGBに変換
+        with tracer.span('cvtColor', 'pose', frame=frame_number):
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        
+        # ポーズ検出実行
+        with tracer.span('pose.process', 'pose', frame=frame_number):
+            return self.pose.process(rgb_frame)
+    
+    def process_video(self, video_path: str, output_path: Optional[str] = None,
+                      progress_callback: Optional[Callable[[int, int], None]] = None,
+                      tracer=None, queue_depth: int = 0) -> PoseSequence:
         """
         動画全体のポーズ検出処理
         
         Args:
             video_path: 入力動画ファイルパス
             output_path: 出力動画ファイルパス（オプション）
+            progress_callback: 進捗通知関数（処理済みフレーム数, 総フレーム数）
+            tracer: 処理タイムラインの記録先（services.tracing.Tracer、オプション）
+            queue_depth: デコードの先読み・可視化動画の書き込み待ちの最大フレーム数
+                         （0 なら1スレッドで順に処理）
             
         Returns:
-            全フレームのポーズ検出結果リスト
+            全フレームのポーズ検出結果（配列で保持し、反復すると従来の辞書形式を返す）
         """
+        tracer = tracer or NULL_TRACER
         cap = cv2.VideoCapture(video_path)
         
         if not cap.isOpened():
@@ -149,153 +176,208 @@ class PoseDetector:
         
         print(f"動画情報: {width}x{height}, {fps}fps, {frame_count}フレーム")
         
-        # 出力動画の設定
+        # デコードは読み込みスレッドで先行させる（読み込み終了・中断時に VideoCapture を解放する）
+        frames = prefetch(self._read_frames(cap, tracer), queue_depth, name='decode')
+        return self.process_frames(frames, fps, frame_count, output_path, progress_callback=progress_callback,
+                                   tracer=tracer, queue_depth=queue_depth)
+    
+    @staticmethod
+    def _read_frames(cap, tracer) -> Iterator[np.ndarray]:
+        """VideoCapture のフレームを順に返す（デコード時間をトレースに記録、終了時に解放）"""
+        frame_number = 0
+        try:
+            while True:
+                with tracer.frame(frame_number).span('decode', 'pose', frame=frame_number):
+                    ret, frame = cap.read()
+                if not ret:
+                    return
+                yield frame
+                frame_number += 1
+        finally:
+            cap.release()
+    
+    def process_frames(self, frames: Iterable[np.ndarray], fps: float, frame_count: int = 0,
+                       output_path: Optional[str] = None,
+                       progress_callback: Optional[Callable[[int, int], None]] = None,
+                       tracer=None, queue_depth: int = 0) -> PoseSequence:
+        """
+        フレーム列のポーズ検出処理（動画ファイルを介さずに前処理済みフレームを受け取る）
+        
+        Args:
+            frames: BGR フレームの列（VideoProcessor.stream_frames の戻り値など）
+            fps: フレーム列のフレームレート（タイムスタンプの算出と出力動画に使う）
+            frame_count: 見込みフレーム数（配列の事前確保と進捗表示に使う、不明なら 0）
+            output_path: 可視化動画の出力ファイルパス（オプション）
+            progress_callback: 進捗通知関数（処理済みフレーム数, 総フレーム数）
+            tracer: 処理タイムラインの記録先（services.tracing.Tracer、オプション）
+            queue_depth: 可視化動画の書き込み待ちの最大フレーム数（0 なら呼び出し元のスレッドで書き込む）
+            
+        Returns:
+            全フレームのポーズ検出結果（配列で保持し、反復すると従来の辞書形式を返す）
+        """
+        tracer = tracer or NULL_TRACER
+        
+        # 出力動画は最初のフレームの解像度で作成し、エンコードは書き込みスレッドで行う
         out = None
-        if output_path:
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
         
-        pose_results = []
+        # フレームごとの辞書は作らず、ランドマークを事前確保した配列に直接書き込む
+        pose_results = PoseSequence(frame_count)
         frame_number = 0
+        self.last_frame_times = []
         
+        frames = iter(frames)
         try:
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
+            for frame in frames:
+                frame_tracer = tracer.frame(frame_number)
                 timestamp = frame_number / fps
                 
                 # ポーズ検出実行
-                pose_data = self.detect_pose(frame, frame_number, timestamp)
-                pose_results.append(pose_data)
+                inference_start = time.perf_counter()
+                results = self._infer(frame, frame_number, frame_tracer)
+                index = pose_results.append(frame_number, timestamp, results.pose_landmarks)
+                self.last_frame_times.append(time.perf_counter() - inference_start)
                 
                 # 可視化（出力動画がある場合）
-                if out is not None and pose_data['has_pose']:
-                    annotated_frame = self._draw_pose_landmarks(frame, pose_data)
-                    out.write(annotated_frame)
+                if output_path and out is None:
+                    height, width = frame.shape[:2]
+                    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+                    out = FrameWriter(cv2.VideoWriter(output_path, fourcc, fps, (width, height)), queue_depth,
+                                      name='encode-visualization', tracer=tracer, category='pose')
+                landmark_row = pose_results.landmark_row(index)
+                if out is not None and landmark_row is not None:
+                    with frame_tracer.span('draw', 'pose', frame=frame_number):
+                        annotated_frame = self._draw_pose_landmarks(frame, landmark_row)
+                    out.write(annotated_frame, frame_number)
                 elif out is not None:
-                    out.write(frame)
+                    out.write(frame, frame_number)
                 
                 frame_number += 1
                 
                 # 進捗表示
                 if frame_number % 30 == 0:
-                    progress = (frame_number / frame_count) * 100
+                    progress = (frame_number / frame_count) * 100 if frame_count > 0 else 0.0
                     print(f"処理進捗: {progress:.1f}% ({frame_number}/{frame_count})")
+                    if progress_callback:
+                        progress_callback(frame_number, frame_count)
         
         finally:
-            cap.release()
-            if out:
+            # 途中で失敗した場合も先読み中のデコードを止める
+            close = getattr(frames, 'close', None)
+            if close is not None:
+                close()
+            if out is not None:
                 out.release()
         
+        if progress_callback:
+            progress_callback(frame_number, frame_count)
+        
         print(f"ポーズ検出完了: {len(pose_results)}フレーム処理")
         return pose_results
     
-    def _draw_pose_landmarks(self, frame: np.ndarray, pose_data: Dict) -> np.ndarray:
+    # 描画する主要な関節と骨格線
+    DRAW_POINTS = ['left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow',
+                   'left_wrist', 'right_wrist', 'left_hip', 'right_hip',
+                   'left_knee', 'right_knee', 'left_ankle', 'right_ankle']
+    DRAW_CONNECTIONS = [
+        ('left_shoulder', 'right_shoulder'),
+        ('left_shoulder', 'left_elbow'),
+        ('left_elbow', 'left_wrist'),
+        ('right_shoulder', 'right_elbow'),
+        ('right_elbow', 'right_wrist'),
+        ('left_shoulder', 'left_hip'),
+        ('right_shoulder', 'right_hip'),
+        ('left_hip', 'right_hip'),
+        ('left_hip', 'left_knee'),
+        ('left_knee', 'left_ankle'),
+        ('right_hip', 'right_knee'),
+        ('right_knee', 'right_ankle')
+    ]
+    
+    def _draw_pose_landmarks(self, frame: np.ndarray, landmarks: np.ndarray) -> np.ndarray:
         """
         フレームにポーズランドマークを描画
         
         Args:
             frame: 入力フレーム
-            pose_data: ポーズ検出結果
+            landmarks: 1フレーム分の (ランドマーク, [x, y, z, visibility]) 配列
             
         Returns:
             ランドマークが描画されたフレーム
         """
         annotated_frame = frame.copy()
-        
-        if not pose_data['has_pose']:
-            return annotated_frame
-        
-        # ランドマークを描画
-        landmarks = pose_data['landmarks']
         height, width = frame.shape[:2]
         
+        # 画素座標と可視判定をまとめて計算
+        pixels = (landmarks[:, :2] * (width, height)).astype(np.int32).tolist()
+        visible = (landmarks[:, 3] > VISIBILITY_THRESHOLD).tolist()
+        index = self.key_landmarks
+        
         # 主要な関節を描画
-        key_points = ['left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow',
-                     'left_wrist', 'right_wrist', 'left_hip', 'right_hip',
-                     'left_knee', 'right_knee', 'left_ankle', 'right_ankle']
-        
-        for point_name in key_points:
-            if point_name in landmarks:
-                landmark = landmarks[point_name]
-                if landmark['visibility'] > 0.5:
-                    x = int(landmark['x'] * width)
-                    y = int(landmark['y'] * height)
-                    cv2.circle(annotated_frame, (x, y), 5, (0, 255, 0), -1)
+        for point_name in self.DRAW_POINTS:
+            if visible[index[point_name]]:
+                cv2.circle(annotated_frame, tuple(pixels[index[point_name]]), 5, (0, 255, 0), -1)
         
         # 骨格線を描画
-        connections = [
-            ('left_shoulder', 'right_shoulder'),
-            ('left_shoulder', 'left_elbow'),
-            ('left_elbow', 'left_wrist'),
-            ('right_shoulder', 'right_elbow'),
-            ('right_elbow', 'right_wrist'),
-            ('left_shoulder', 'left_hip'),
-            ('right_shoulder', 'right_hip'),
-            ('left_hip', 'right_hip'),
-            ('left_hip', 'left_knee'),
-            ('left_knee', 'left_ankle'),
-            ('right_hip', 'right_knee'),
-            ('right_knee', 'right_ankle')
-        ]
-        
-        for start_point, end_point in connections:
-            if (start_point in landmarks and end_point in landmarks and
-                landmarks[start_point]['visibility'] > 0.5 and
-                landmarks[end_point]['visibility'] > 0.5):
-                
-                start_x = int(landmarks[start_point]['x'] * width)
-                start_y = int(landmarks[start_point]['y'] * height)
-                end_x = int(landmarks[end_point]['x'] * width)
-                end_y = int(landmarks[end_point]['y'] * height)
-                
-                cv2.line(annotated_frame, (start_x, start_y), (end_x, end_y), (255, 0, 0), 2)
+        for start_point, end_point in self.DRAW_CONNECTIONS:
+            start, end = index[start_point], index[end_point]
+            if visible[start] and visible[end]:
+                cv2.line(annotated_frame, tuple(pixels[start]), tuple(pixels[end]), (255, 0, 0), 2)
         
         return annotated_frame
     
-    def save_pose_data(self, pose_results: List[Dict], output_path: str):
+    def save_pose_data(self, pose_results: Union[PoseSequence, List[Dict]], output_path: str,
+                       precision: str = 'float32', compress: bool = True):
         """
-        ポーズ検出結果をJSONファイルに保存
+        ポーズ検出結果をファイルに保存
+        
+        拡張子が .npz ならフレーム×33×4 の配列のバイナリ形式、それ以外は従来の JSON 形式で保存する。
         
         Args:
-            pose_results: ポーズ検出結果リスト
+            pose_results: ポーズ検出結果（PoseSequence または辞書のリスト）
             output_path: 出力ファイルパス
+            precision: バイナリ形式の保存精度（'float32' / 'int16'）
+            compress: バイナリ形式を圧縮するか
         """
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(pose_results, f, indent=2, ensure_ascii=False)
+        sequence = PoseSequence.coerce(pose_results)
+        if output_path.endswith('.npz'):
+            save_pose_arrays(sequence.to_arrays(), output_path, precision=precision, compress=compress)
+        else:
+            write_json(sequence.to_results(), output_path)
         
         print(f"ポーズデータを保存しました: {output_path}")
     
-    def load_pose_data(self, input_path: str) -> List[Dict]:
+    def load_pose_data(self, input_path: str) -> PoseSequence:
         """
-        JSONファイルからポーズ検出結果を読み込み
+        ファイルからポーズ検出結果を読み込み（.npz のバイナリ形式と JSON 形式に対応）
         
         Args:
             input_path: 入力ファイルパス
             
         Returns:
-            ポーズ検出結果リスト
+            ポーズ検出結果
         """
-        with open(input_path, 'r', encoding='utf-8') as f:
-            pose_results = json.load(f)
+        if input_path.endswith('.npz'):
+            pose_results = PoseSequence.from_arrays(load_pose_arrays(input_path))
+        else:
+            with open(input_path, 'r', encoding='utf-8') as f:
+                pose_results = PoseSequence.from_results(json.load(f))
         
         print(f"ポーズデータを読み込みました: {input_path}")
         return pose_results
     
-    def get_pose_statistics(self, pose_results: List[Dict]) -> Dict:
+    def get_pose_statistics(self, pose_results: Union[PoseSequence, List[Dict]]) -> Dict:
         """
         ポーズ検出結果の統計情報を取得
         
         Args:
-            pose_results: ポーズ検出結果リスト
+            pose_results: ポーズ検出結果（PoseSequence または辞書のリスト）
             
         Returns:
             統計情報の辞書
         """
-        total_frames = len(pose_results)
-        detected_frames = sum(1 for result in pose_results if result['has_pose'])
+        sequence = PoseSequence.coerce(pose_results)
+        total_frames = len(sequence)
+        detected_frames = sequence.detected_count
         
         if detected_frames == 0:
             return {
@@ -307,27 +389,20 @@ class PoseDetector:
             }
         
         # 平均信頼度計算
-        total_confidence = sum(result['detection_confidence'] for result in pose_results if result['has_pose'])
-        average_confidence = total_confidence / detected_frames
-        
-        # ランドマーク可視性統計
-        landmark_visibility = {}
-        for landmark_name in self.key_landmarks.keys():
-            visible_count = 0
-            total_visibility = 0.0
-            
-            for result in pose_results:
-                if result['has_pose'] and landmark_name in result['landmarks']:
-                    visibility = result['landmarks'][landmark_name]['visibility']
-                    if visibility > 0.5:
-                        visible_count += 1
-                    total_visibility += visibility
-            
-            if detected_frames > 0:
-                landmark_visibility[landmark_name] = {
-                    'visible_rate': visible_count / detected_frames,
-                    'average_visibility': total_visibility / detected_frames
-                }
+        confidence = sequence.detection_confidence[sequence.has_pose]
+        average_confidence = float(confidence.sum(dtype=np.float64)) / detected_frames
+        
+        # ランドマーク可視性統計（検出フレームのみ）
+        visibility = sequence.landmarks[sequence.has_pose, :, 3].astype(np.float64)
+        visible_rates = (visibility > VISIBILITY_THRESHOLD).sum(axis=0) / detected_frames
+        average_visibility = visibility.sum(axis=0) / detected_frames
+        landmark_visibility = {
+            name: {
+                'visible_rate': float(visible_rates[index]),
+                'average_visibility': float(average_visibility[index])
+            }
+            for name, index in self.key_landmarks.items()
+        }
         
         return {
             'total_frames': total_frames,
@@ -0,0 +1,227 @@
+"""
+テニスサービス動作解析 - ポーズデータ形式
+ポーズ検出結果をフレーム×ランドマーク×[x, y, z, visibility] の配列として保存するバイナリ形式と、
+従来の JSON 形式（フレームごとの辞書のリスト）との相互変換
+"""
+
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from services.json_codec import replace_file, write_json
+
+# 解析出力ディレクトリ内のファイル名（バイナリが正、JSON はダウンロード要求時にだけ作成する）
+POSE_DATA_FILENAME = 'pose_data.npz'
+POSE_JSON_FILENAME = 'pose_data.json'
+
+# 形式のバージョン（読み込み側の互換性判定用）
+FORMAT_VERSION = 1
+
+# 保存精度（'int16' はチャンネルごとの刻み幅で量子化する）
+PRECISIONS = ('float32', 'int16')
+
+# MediaPipe Pose の 33 ランドマーク（配列の2次元目の順序）
+LANDMARK_NAMES = [
+    'nose',
+    'left_eye_inner', 'left_eye', 'left_eye_outer',
+    'right_eye_inner', 'right_eye', 'right_eye_outer',
+    'left_ear', 'right_ear',
+    'mouth_left', 'mouth_right',
+    'left_shoulder', 'right_shoulder',
+    'left_elbow', 'right_elbow',
+    'left_wrist', 'right_wrist',
+    'left_pinky', 'right_pinky',
+    'left_index', 'right_index',
+    'left_thumb', 'right_thumb',
+    'left_hip', 'right_hip',
+    'left_knee', 'right_knee',
+    'left_ankle', 'right_ankle',
+    'left_heel', 'right_heel',
+    'left_foot_index', 'right_foot_index'
+]
+
+# 1ランドマークあたりの値（配列の3次元目の順序）
+CHANNELS = ('x', 'y', 'z', 'visibility')
+
+_INT16_MAX = np.iinfo(np.int16).max
+
+
+def results_to_arrays(pose_results: List[Dict], landmark_names: List[str] = LANDMARK_NAMES) -> Dict[str, np.ndarray]:
+    """
+    フレームごとの辞書のリストを配列に変換
+
+    Args:
+        pose_results: PoseDetector.detect_pose の結果のリスト
+        landmark_names: ランドマーク名（配列の順序）
+
+    Returns:
+        {'landmarks': (frames, 33, 4) float32, 'present': (frames, 33) bool, 'frame_number', 'timestamp',
+         'has_pose', 'detection_confidence'}
+        ポーズ未検出のフレーム・ランドマークの値は 0
+    """
+    frames = len(pose_results)
+    landmarks = np.zeros((frames, len(landmark_names), len(CHANNELS)), dtype=np.float32)
+    present = np.zeros((frames, len(landmark_names)), dtype=bool)
+    for frame_index, result in enumerate(pose_results):
+        if not result.get('has_pose'):
+            continue
+        frame_landmarks = result.get('landmarks') or {}
+        for landmark_index, name in enumerate(landmark_names):
+            landmark = frame_landmarks.get(name)
+            if landmark is not None:
+                landmarks[frame_index, landmark_index] = [landmark[channel] for channel in CHANNELS]
+                present[frame_index, landmark_index] = True
+
+    return {
+        'landmarks': landmarks,
+        'present': present,
+        'frame_number': np.array([result.get('frame_number', index) for index, result in enumerate(pose_results)],
+                                 dtype=np.int32),
+        'timestamp': np.array([result.get('timestamp', 0.0) for result in pose_results], dtype=np.float64),
+        'has_pose': np.array([bool(result.get('has_pose')) for result in pose_results], dtype=bool),
+        'detection_confidence': np.array([result.get('detection_confidence', 0.0) for result in pose_results],
+                                         dtype=np.float64)
+    }
+
+
+def arrays_to_results(arrays: Dict[str, np.ndarray], landmark_names: Optional[List[str]] = None) -> List[Dict]:
+    """
+    配列を従来のフレームごとの辞書のリストに変換（JSON ダウンロード・旧形式の利用箇所向け）
+
+    Args:
+        arrays: results_to_arrays / load_pose_arrays の戻り値
+        landmark_names: ランドマーク名（省略時は arrays['landmark_names'] または LANDMARK_NAMES）
+
+    Returns:
+        PoseDetector.detect_pose と同じ形式の辞書のリスト
+    """
+    if landmark_names is None:
+        landmark_names = list(arrays.get('landmark_names', LANDMARK_NAMES))
+
+    # 要素ごとの NumPy スカラー変換を避けるため一度に Python のリストへ変換する
+    landmarks = arrays['landmarks'].tolist()
+    present = arrays['present'].tolist() if arrays.get('present') is not None else None
+    frame_numbers = arrays['frame_number'].tolist()
+    timestamps = arrays['timestamp'].tolist()
+    has_pose = arrays['has_pose'].tolist()
+    confidences = arrays['detection_confidence'].tolist()
+
+    pose_results = []
+    for frame_index, frame_landmarks in enumerate(landmarks):
+        result = {
+            'frame_number': frame_numbers[frame_index],
+            'timestamp': timestamps[frame_index],
+            'landmarks': {},
+            'visibility_scores': {},
+            'detection_confidence': confidences[frame_index],
+            'has_pose': has_pose[frame_index]
+        }
+        if has_pose[frame_index]:
+            for landmark_index, (name, (x, y, z, visibility)) in enumerate(zip(landmark_names, frame_landmarks)):
+                if present is not None and not present[frame_index][landmark_index]:
+                    continue
+                result['landmarks'][name] = {'x': x, 'y': y, 'z': z, 'visibility': visibility}
+                result['visibility_scores'][name] = visibility
+        pose_results.append(result)
+    return pose_results
+
+
+def save_pose_arrays(arrays: Dict[str, np.ndarray], output_path: str, precision: str = 'float32',
+                     compress: bool = True) -> int:
+    """
+    ポーズ配列をバイナリ形式（.npz）で保存
+
+    Args:
+        arrays: results_to_arrays の戻り値
+        output_path: 出力ファイルパス
+        precision: 'float32'、または 'int16'（チャンネルごとに最大絶対値を 32767 に合わせて量子化、
+                   誤差は刻み幅の半分以下）
+        compress: zip 圧縮するか（未検出フレームが多い動画ほど小さくなる）
+
+    Returns:
+        書き込んだバイト数
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"サポートされていない保存精度です: {precision}")
+
+    landmarks = np.asarray(arrays['landmarks'], dtype=np.float32)
+    payload = {
+        'format_version': np.array(FORMAT_VERSION, dtype=np.int32),
+        'landmark_names': np.array(arrays.get('landmark_names', LANDMARK_NAMES)),
+        'frame_number': np.asarray(arrays['frame_number'], dtype=np.int32),
+        'timestamp': np.asarray(arrays['timestamp'], dtype=np.float64),
+        'has_pose': np.asarray(arrays['has_pose'], dtype=bool),
+        'detection_confidence': np.asarray(arrays['detection_confidence'], dtype=np.float32)
+    }
+
+    if precision == 'int16':
+        peak = np.abs(landmarks).max(axis=(0, 1)) if landmarks.size else np.zeros(len(CHANNELS), dtype=np.float32)
+        scale = np.where(peak > 0, peak / _INT16_MAX, 1.0).astype(np.float32)
+        payload['landmarks'] = np.round(landmarks / scale).astype(np.int16)
+        payload['scale'] = scale
+    else:
+        payload['landmarks'] = landmarks
+
+    # 検出フレームで一部のランドマークが欠けている場合だけ有無のマスクを保存する（MediaPipe の結果は常に 33 点）
+    present = arrays.get('present')
+    if present is not None and not np.array_equal(present, payload['has_pose'][:, None] & np.ones_like(present)):
+        payload['present'] = np.asarray(present, dtype=bool)
+
+    # 書き込み途中のファイルが読まれないよう一時ファイル経由で置き換える
+    replace_file(output_path, lambda f: (np.savez_compressed if compress else np.savez)(f, **payload))
+    return os.path.getsize(output_path)
+
+
+def load_pose_arrays(input_path: str) -> Dict[str, np.ndarray]:
+    """
+    バイナリ形式のポーズ配列を読み込み（int16 は float32 に戻す）
+
+    Args:
+        input_path: 入力ファイルパス
+
+    Returns:
+        {'landmarks', 'present'（欠けたランドマークがなければ None）, 'frame_number', 'timestamp', 'has_pose',
+         'detection_confidence', 'landmark_names'}
+    """
+    with np.load(input_path, allow_pickle=False) as data:
+        version = int(data['format_version'])
+        if version > FORMAT_VERSION:
+            raise ValueError(f"未対応のポーズデータ形式です: version {version}")
+
+        landmarks = data['landmarks']
+        if 'scale' in data.files:
+            landmarks = landmarks.astype(np.float32) * data['scale']
+
+        return {
+            'landmarks': landmarks,
+            'present': data['present'] if 'present' in data.files else None,
+            'frame_number': data['frame_number'],
+            'timestamp': data['timestamp'],
+            'has_pose': data['has_pose'],
+            'detection_confidence': data['detection_confidence'],
+            'landmark_names': [str(name) for name in data['landmark_names']]
+        }
+
+
+def export_pose_json(output_dir: str) -> Optional[str]:
+    """
+    バイナリ形式から従来の pose_data.json を作成（作成済みで新しければそのまま使う）
+
+    Args:
+        output_dir: 解析出力ディレクトリ
+
+    Returns:
+        pose_data.json のパス（どちらの形式もなければ None）
+    """
+    json_path = os.path.join(output_dir, POSE_JSON_FILENAME)
+    binary_path = os.path.join(output_dir, POSE_DATA_FILENAME)
+
+    if not os.path.exists(binary_path):
+        return json_path if os.path.exists(json_path) else None
+    if os.path.exists(json_path) and os.path.getmtime(json_path) >= os.path.getmtime(binary_path):
+        return json_path
+
+    write_json(arrays_to_results(load_pose_arrays(binary_path)), json_path)
+    print(f"ポーズデータをJSONに書き出しました: {json_path}")
+    return json_path
@@ -0,0 +1,248 @@
+"""
+テニスサービス動作解析 - ポーズ系列
+動画1本分のポーズ検出結果を1つの配列（フレーム×ランドマーク×[x, y, z, visibility]）で保持する
+"""
+
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+from services.pose_format import LANDMARK_NAMES, arrays_to_results, results_to_arrays
+
+# ランドマークを可視とみなす visibility の下限
+VISIBILITY_THRESHOLD = 0.5
+
+
+class PoseSequence:
+    """
+    配列で保持するポーズ検出結果
+
+    フレームごとの辞書を作らずに MediaPipe の結果を事前確保した配列へ直接書き込み、
+    動作解析・統計・描画はランドマーク名ごとのビューとマスクで行う。
+    従来のフレームごとの辞書が必要な箇所には、インデックス・反復で辞書形式を返す。
+    """
+
+    def __init__(self, capacity: int = 0, landmark_names: List[str] = LANDMARK_NAMES):
+        """
+        ポーズ系列の初期化
+
+        Args:
+            capacity: 事前に確保するフレーム数（超えた場合は倍に拡張する）
+            landmark_names: ランドマーク名（配列の2次元目の順序）
+        """
+        self.landmark_names = list(landmark_names)
+        self._index = {name: index for index, name in enumerate(self.landmark_names)}
+        self._length = 0
+        self._allocate(max(capacity, 1))
+
+    def _allocate(self, capacity: int):
+        """配列を capacity フレーム分に確保し直す（記録済みのフレームは引き継ぐ）"""
+        landmarks = np.zeros((capacity, len(self.landmark_names), 4), dtype=np.float32)
+        present = np.zeros((capacity, len(self.landmark_names)), dtype=bool)
+        frame_numbers = np.zeros(capacity, dtype=np.int32)
+        timestamps = np.zeros(capacity, dtype=np.float64)
+        has_pose = np.zeros(capacity, dtype=bool)
+        confidence = np.zeros(capacity, dtype=np.float64)
+        if self._length:
+            landmarks[:self._length] = self._landmarks[:self._length]
+            present[:self._length] = self._present[:self._length]
+            frame_numbers[:self._length] = self._frame_numbers[:self._length]
+            timestamps[:self._length] = self._timestamps[:self._length]
+            has_pose[:self._length] = self._has_pose[:self._length]
+            confidence[:self._length] = self._confidence[:self._length]
+        self._landmarks, self._present = landmarks, present
+        self._frame_numbers, self._timestamps = frame_numbers, timestamps
+        self._has_pose, self._confidence = has_pose, confidence
+
+    def append(self, frame_number: int, timestamp: float, pose_landmarks=None) -> int:
+        """
+        1フレーム分の検出結果を追加
+
+        Args:
+            frame_number: フレーム番号
+            timestamp: タイムスタンプ（秒）
+            pose_landmarks: MediaPipe の results.pose_landmarks（未検出なら None）
+
+        Returns:
+            追加したフレームのインデックス
+        """
+        index = self._length
+        if index >= len(self._has_pose):
+            self._allocate(len(self._has_pose) * 2)
+        self._length += 1
+
+        self._frame_numbers[index] = frame_number
+        self._timestamps[index] = timestamp
+        if pose_landmarks is None:
+            return index
+
+        # ランドマークごとの辞書を作らず、フレームの行に平坦なリストで一度に書き込む
+        points = pose_landmarks.landmark
+        count = min(len(points), len(self.landmark_names))
+        self._landmarks[index].reshape(-1)[:count * 4] = [
+            value for point in points[:count] for value in (point.x, point.y, point.z, point.visibility)
+        ]
+        self._present[index, :count] = True
+        self._has_pose[index] = True
+
+        # 検出信頼度は参照時にまとめて計算する
+        self._confidence[index] = np.nan
+        return index
+
+    # --- 配列ビュー ---
+
+    @property
+    def landmarks(self) -> np.ndarray:
+        """(フレーム, ランドマーク, [x, y, z, visibility]) の配列（未検出フレームは 0）"""
+        return self._landmarks[:self._length]
+
+    @property
+    def present(self) -> np.ndarray:
+        """(フレーム, ランドマーク) の有無のマスク（未検出フレームは False）"""
+        return self._present[:self._length]
+
+    @property
+    def frame_numbers(self) -> np.ndarray:
+        return self._frame_numbers[:self._length]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps[:self._length]
+
+    @property
+    def has_pose(self) -> np.ndarray:
+        """ポーズを検出できたフレームのマスク"""
+        return self._has_pose[:self._length]
+
+    @property
+    def detection_confidence(self) -> np.ndarray:
+        """全体的な検出信頼度（可視ランドマークの visibility の平均、未検出フレームは 0）"""
+        confidence = self._confidence[:self._length]
+        pending = np.isnan(confidence)
+        if pending.any():
+            visibility = self.landmarks[pending, :, 3].astype(np.float64)
+            visible = self.present[pending] & (visibility > VISIBILITY_THRESHOLD)
+            counts = visible.sum(axis=1)
+            totals = np.where(visible, visibility, 0.0).sum(axis=1)
+            confidence[pending] = np.divide(totals, counts, out=np.zeros_like(totals), where=counts > 0)
+        return confidence
+
+    @property
+    def detected_count(self) -> int:
+        return int(np.count_nonzero(self.has_pose))
+
+    def landmark(self, name: str) -> np.ndarray:
+        """ランドマーク1つの (フレーム, [x, y, z, visibility]) ビュー"""
+        return self.landmarks[:, self._index[name]]
+
+    def xy(self, name: str) -> np.ndarray:
+        """ランドマーク1つの (フレーム, [x, y]) ビュー"""
+        return self.landmarks[:, self._index[name], :2]
+
+    def valid(self, *names: str) -> np.ndarray:
+        """指定したランドマークがすべて検出されているフレームのマスク"""
+        mask = self.has_pose.copy()
+        for name in names:
+            mask &= self.present[:, self._index[name]]
+        return mask
+
+    def visible(self, threshold: float = VISIBILITY_THRESHOLD) -> np.ndarray:
+        """(フレーム, ランドマーク) の可視マスク（欠けたランドマークと未検出フレームは False）"""
+        return self.present & (self.landmarks[:, :, 3] > threshold)
+
+    # --- 変換 ---
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """pose_format の保存用の配列（コピーせずビューを返す）"""
+        return {
+            'landmarks': self.landmarks,
+            'present': self.present,
+            'frame_number': self.frame_numbers,
+            'timestamp': self.timestamps,
+            'has_pose': self.has_pose,
+            'detection_confidence': self.detection_confidence,
+            'landmark_names': self.landmark_names
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'PoseSequence':
+        """pose_format の配列（load_pose_arrays / results_to_arrays の戻り値）から作成"""
+        frames = len(arrays['has_pose'])
+        sequence = cls(frames, arrays.get('landmark_names', LANDMARK_NAMES))
+        sequence._landmarks[:frames] = arrays['landmarks']
+        present = arrays.get('present')
+        sequence._present[:frames] = (present if present is not None
+                                      else np.asarray(arrays['has_pose'], dtype=bool)[:, None])
+        sequence._frame_numbers[:frames] = arrays['frame_number']
+        sequence._timestamps[:frames] = arrays['timestamp']
+        sequence._has_pose[:frames] = arrays['has_pose']
+        sequence._confidence[:frames] = arrays['detection_confidence']
+        sequence._length = frames
+        return sequence
+
+    @classmethod
+    def from_results(cls, pose_results: List[Dict]) -> 'PoseSequence':
+        """従来のフレームごとの辞書のリストから作成"""
+        return cls.from_arrays(results_to_arrays(pose_results))
+
+    @classmethod
+    def coerce(cls, pose_results: Union['PoseSequence', List[Dict]]) -> 'PoseSequence':
+        """PoseSequence ならそのまま、辞書のリストなら変換して返す"""
+        return pose_results if isinstance(pose_results, cls) else cls.from_results(pose_results)
+
+    def to_results(self) -> List[Dict]:
+        """従来のフレームごとの辞書のリスト（JSON 出力・旧形式の利用箇所向け）"""
+        return arrays_to_results(self.to_arrays(), self.landmark_names)
+
+    # --- 従来の辞書のリストとの互換 ---
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __bool__(self) -> bool:
+        return self._length > 0
+
+    def __getitem__(self, index: int) -> Dict:
+        """1フレーム分を従来の辞書形式で返す"""
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return self.frame(index)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for index in range(self._length):
+            yield self.frame(index)
+
+    def frame(self, index: int) -> Dict:
+        """
+        1フレーム分の従来の辞書（PoseDetector.detect_pose と同じ形式）
+
+        Args:
+            index: フレームのインデックス
+
+        Returns:
+            {'frame_number', 'timestamp', 'landmarks', 'visibility_scores', 'detection_confidence', 'has_pose'}
+        """
+        has_pose = bool(self._has_pose[index])
+        result = {
+            'frame_number': int(self._frame_numbers[index]),
+            'timestamp': float(self._timestamps[index]),
+            'landmarks': {},
+            'visibility_scores': {},
+            'detection_confidence': float(self.detection_confidence[index]),
+            'has_pose': has_pose
+        }
+        if has_pose:
+            present = self._present[index].tolist()
+            for landmark_index, (name, (x, y, z, visibility)) in enumerate(
+                    zip(self.landmark_names, self._landmarks[index].tolist())):
+                if not present[landmark_index]:
+                    continue
+                result['landmarks'][name] = {'x': x, 'y': y, 'z': z, 'visibility': visibility}
+                result['visibility_scores'][name] = visibility
+        return result
+
+    def landmark_row(self, index: int) -> Optional[np.ndarray]:
+        """1フレーム分の (ランドマーク, [x, y, z, visibility]) 配列（未検出なら None）"""
+        return self._landmarks[index] if self._has_pose[index] else None
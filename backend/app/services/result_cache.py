@@ -0,0 +1,126 @@
+"""
+テニスサービス動作解析 - 解析結果キャッシュ
+動画の内容ハッシュと解析パラメータから既存の解析IDを引く索引
+"""
+
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Optional
+
+from services.database import connect
+
+
+def pipeline_fingerprint(frame_skip: int, scale: float, model_complexity: int, analyzer_version: str,
+                         fused: bool = False, analysis_fps: float = 0.0, enhancement: str = 'full',
+                         target_short_side: int = 0, preprocess_segments: int = 1) -> str:
+    """
+    解析結果に影響するパイプラインパラメータの指紋
+
+    Args:
+        frame_skip: 前処理のフレーム間引き
+        scale: 前処理の固定の縮小率（0 なら target_short_side で縮小）
+        model_complexity: MediaPipe Pose モデルの複雑さ
+        analyzer_version: 解析ロジックのバージョン
+        fused: 前処理済みフレームを再エンコードせずにポーズ検出に渡すか（ポーズ検出の入力画素が変わる）
+        analysis_fps: 前処理で残す実効フレームレート（0 なら frame_skip で間引く）
+        enhancement: 前処理の補正のプロファイル（'auto' は動画ごとに選ぶ指定のまま含める）
+        target_short_side: 前処理後の短辺の画素数
+        preprocess_segments: 前処理を時間区間に分けて並列に実行するプロセス数
+
+    Returns:
+        16進ハッシュ文字列
+    """
+    return _digest({
+        'frame_skip': frame_skip,
+        'scale': scale,
+        'model_complexity': model_complexity,
+        'analyzer_version': analyzer_version,
+        'fused': fused,
+        'analysis_fps': analysis_fps,
+        'enhancement': enhancement,
+        'target_short_side': target_short_side,
+        'preprocess_segments': preprocess_segments
+    })
+
+
+def advice_key(params: Dict) -> str:
+    """
+    アドバイス生成に影響するパラメータの指紋（APIキーは含めない）
+
+    Args:
+        params: 解析ジョブのパラメータ
+
+    Returns:
+        16進ハッシュ文字列
+    """
+    return _digest({
+        'user_level': params.get('user_level', 'intermediate'),
+        'focus_areas': sorted(params.get('focus_areas') or []),
+        'use_chatgpt': bool(params.get('use_chatgpt', False)),
+        'user_concerns': params.get('user_concerns', '')
+    })
+
+
+def _digest(values: Dict) -> str:
+    """辞書を正規化した JSON の SHA-256"""
+    payload = json.dumps(values, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """解析結果キャッシュ索引クラス"""
+
+    def __init__(self, db_path: str):
+        """
+        キャッシュ索引の初期化
+
+        Args:
+            db_path: SQLite データベースファイルパス
+        """
+        self._lock = threading.Lock()
+        self._conn = connect(db_path)
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS result_index (
+                    content_hash TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    advice_key TEXT NOT NULL,
+                    analysis_id TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (content_hash, fingerprint, advice_key)
+                );
+                CREATE INDEX IF NOT EXISTS idx_result_index_analysis ON result_index (analysis_id);
+            """)
+
+    def lookup(self, content_hash: str, fingerprint: str, advice: str) -> Optional[str]:
+        """
+        同じ動画・同じパラメータの解析IDを検索
+
+        Returns:
+            解析ID、見つからなければ None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT analysis_id FROM result_index "
+                "WHERE content_hash = ? AND fingerprint = ? AND advice_key = ?",
+                (content_hash, fingerprint, advice)
+            ).fetchone()
+        return row['analysis_id'] if row else None
+
+    def add(self, content_hash: str, fingerprint: str, advice: str, analysis_id: str):
+        """解析IDを索引に登録（同じキーの既存エントリは置き換える）"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO result_index "
+                "(content_hash, fingerprint, advice_key, analysis_id, created_at) VALUES (?, ?, ?, ?, ?)",
+                (content_hash, fingerprint, advice, analysis_id, time.time())
+            )
+
+    def remove(self, analysis_id: str):
+        """解析IDを索引から削除"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM result_index WHERE analysis_id = ?", (analysis_id,)
+            )
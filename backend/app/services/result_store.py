@@ -0,0 +1,332 @@
+"""
+テニスサービス動作解析 - 解析結果ストア
+解析ごとのメタデータ・状態・スコア要約を索引付きで保存し、最近の要約をメモリにキャッシュする
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from services.database import connect, ensure_columns
+from services.json_codec import NumpyJSONEncoder
+from services.upload_storage import hash_file
+
+# 最終参照時刻を書き込む最小間隔（秒）
+TOUCH_INTERVAL = 60.0
+
+# 解析出力ディレクトリ内の成果物
+ARTIFACT_FILES = [
+    'analysis_result.json',
+    'advice_result.json',
+    'pose_data.npz',
+    'pose_data.json',
+    'preprocessed_video.mp4',
+    'pose_visualization.mp4'
+]
+
+
+def summarize_result(analysis_data: Dict) -> Dict:
+    """
+    解析結果から状態確認用の要約を作成
+
+    Args:
+        analysis_data: analysis_result.json の内容
+
+    Returns:
+        要約の辞書
+    """
+    return {
+        'overall_score': analysis_data.get('overall_score', analysis_data.get('total_score', 0.0)),
+        'technical_scores': {
+            category: results.get('overall_score', 0.0)
+            for category, results in analysis_data.get('technical_analysis', {}).items()
+        }
+    }
+
+
+def _to_number(value):
+    """NumPy スカラーを SQLite に渡せる Python の数値に変換"""
+    return value.item() if hasattr(value, 'item') else value
+
+
+class ResultStore:
+    """解析結果ストアクラス"""
+
+    def __init__(self, db_path: str, cache_size: int = 256):
+        """
+        解析結果ストアの初期化
+
+        Args:
+            db_path: SQLite データベースファイルパス
+            cache_size: メモリに保持する要約の最大件数
+        """
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        self._lock = threading.Lock()
+        self._conn = connect(db_path)
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS analyses (
+                    analysis_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    output_dir TEXT NOT NULL,
+                    overall_score REAL,
+                    summary TEXT,
+                    files TEXT,
+                    frame_count INTEGER,
+                    detected_frames INTEGER,
+                    created_at REAL NOT NULL,
+                    completed_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_analyses_status ON analyses (status);
+                CREATE INDEX IF NOT EXISTS idx_analyses_completed ON analyses (completed_at);
+            """)
+            ensure_columns(self._conn, 'analyses', {'last_accessed': 'REAL'})
+        self._touched: Dict[str, float] = {}
+
+    def record(self, analysis_id: str, output_dir: str, analysis_data: Dict,
+               status: str = 'done', completed_at: Optional[float] = None):
+        """
+        完了した解析を登録
+
+        Args:
+            analysis_id: 解析ID
+            output_dir: 解析出力ディレクトリ
+            analysis_data: 解析結果（analysis_result.json の内容）
+            status: 解析状態（アドバイス生成前の結果は 'partial'）
+            completed_at: 完了時刻（省略時は現在時刻）
+        """
+        summary = summarize_result(analysis_data)
+        previous = self.get(analysis_id)
+        files = self._stat_files(output_dir, previous['files'] if previous else None)
+        completed_at = completed_at or time.time()
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyses "
+                "(analysis_id, status, output_dir, overall_score, summary, files, frame_count, "
+                "detected_frames, created_at, completed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (analysis_id, status, output_dir, _to_number(summary['overall_score']),
+                 json.dumps(summary, cls=NumpyJSONEncoder, ensure_ascii=False), json.dumps(files),
+                 _to_number(analysis_data.get('frame_count')),
+                 _to_number(analysis_data.get('pose_detection', {}).get('detected_frames')),
+                 completed_at, completed_at)
+            )
+
+        with self._cache_lock:
+            self._cache.pop(analysis_id, None)
+
+    def get(self, analysis_id: str) -> Optional[Dict]:
+        """
+        解析の要約を取得（最近参照したものはメモリから返す）
+
+        Args:
+            analysis_id: 解析ID
+
+        Returns:
+            {'analysis_id', 'status', 'summary', 'files', ...}、未登録なら None
+        """
+        with self._cache_lock:
+            cached = self._cache.get(analysis_id)
+            if cached is not None:
+                self._cache.move_to_end(analysis_id)
+                return cached
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM analyses WHERE analysis_id = ?", (analysis_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        record = dict(row)
+        record['summary'] = json.loads(record['summary']) if record['summary'] else None
+        record['files'] = json.loads(record['files']) if record['files'] else {}
+        if record['status'] == 'partial':
+            # ワーカーがアドバイス生成後に書き換えるためキャッシュしない
+            return record
+
+        with self._cache_lock:
+            self._cache[analysis_id] = record
+            self._cache.move_to_end(analysis_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return record
+
+    def artifact_hash(self, analysis_id: str, output_dir: str, filename: str) -> str:
+        """
+        成果物ファイルの SHA-256（ETag 用）
+
+        登録済みのサイズ・更新時刻が一致すれば保存済みのハッシュを返し、
+        ファイルが書き換えられていれば計算し直して登録内容を更新する。
+
+        Args:
+            analysis_id: 解析ID
+            output_dir: 解析出力ディレクトリ
+            filename: 成果物のファイル名
+
+        Returns:
+            16進ハッシュ文字列
+        """
+        file_path = os.path.join(output_dir, filename)
+        stat = os.stat(file_path)
+        record = self.get(analysis_id)
+        info = record['files'].get(filename) if record else None
+        if info and info.get('sha256') and info.get('size') == stat.st_size and info.get('mtime') == stat.st_mtime:
+            return info['sha256']
+
+        info = _stat_file(file_path)
+        if record is not None:
+            files = dict(record['files'], **{filename: info})
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE analyses SET files = ? WHERE analysis_id = ?", (json.dumps(files), analysis_id)
+                )
+            with self._cache_lock:
+                self._cache.pop(analysis_id, None)
+        return info['sha256']
+
+    def touch(self, analysis_id: str):
+        """解析結果の最終参照時刻を更新（保持期間・容量超過時の削除順に使う）"""
+        now = time.time()
+        with self._cache_lock:
+            if now - self._touched.get(analysis_id, 0.0) < TOUCH_INTERVAL:
+                return
+            self._touched[analysis_id] = now
+        with self._lock:
+            self._conn.execute(
+                "UPDATE analyses SET last_accessed = ? WHERE analysis_id = ?", (now, analysis_id)
+            )
+
+    def access_times(self) -> Dict[str, float]:
+        """解析ID -> 最終参照時刻（未参照なら完了時刻）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT analysis_id, COALESCE(last_accessed, completed_at, created_at) AS accessed FROM analyses"
+            ).fetchall()
+        return {row['analysis_id']: row['accessed'] for row in rows}
+
+    def mark_removed(self, analysis_id: str, filenames: List[str]):
+        """削除した成果物を登録内容に反映"""
+        record = self.get(analysis_id)
+        if record is None:
+            return
+
+        files = dict(record['files'])
+        for filename in filenames:
+            files[filename] = {'exists': False, 'size': 0}
+        with self._lock:
+            self._conn.execute(
+                "UPDATE analyses SET files = ? WHERE analysis_id = ?", (json.dumps(files), analysis_id)
+            )
+        with self._cache_lock:
+            self._cache.pop(analysis_id, None)
+
+    def remove(self, analysis_id: str):
+        """解析を削除"""
+        with self._lock:
+            self._conn.execute("DELETE FROM analyses WHERE analysis_id = ?", (analysis_id,))
+        with self._cache_lock:
+            self._cache.pop(analysis_id, None)
+            self._touched.pop(analysis_id, None)
+
+    def import_output_dir(self, output_dir: str) -> bool:
+        """
+        既存の解析出力ディレクトリを取り込む
+
+        Args:
+            output_dir: output/<analysis_id> ディレクトリ
+
+        Returns:
+            取り込んだ場合 True（analysis_result.json がない・壊れている場合は False）
+        """
+        result_file = os.path.join(output_dir, 'analysis_result.json')
+        if not os.path.isfile(result_file):
+            return False
+
+        try:
+            with open(result_file, 'r', encoding='utf-8') as f:
+                analysis_data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"解析結果の読み込みに失敗しました: {result_file} ({e})")
+            return False
+
+        analysis_id = os.path.basename(os.path.normpath(output_dir))
+        self.record(analysis_id, output_dir, analysis_data, completed_at=os.path.getmtime(result_file))
+        return True
+
+    def import_all(self, output_folder: str, skip_existing: bool = True) -> Dict[str, int]:
+        """
+        出力フォルダ内の全解析を一括で取り込む
+
+        Args:
+            output_folder: 出力フォルダ（output/）
+            skip_existing: 登録済みの解析を読み込み直さない
+
+        Returns:
+            {'imported': 件数, 'skipped': 件数, 'failed': 件数}
+        """
+        stats = {'imported': 0, 'skipped': 0, 'failed': 0}
+        existing = self._existing_ids() if skip_existing else set()
+
+        for entry in sorted(os.listdir(output_folder)):
+            output_dir = os.path.join(output_folder, entry)
+            if not os.path.isdir(output_dir):
+                continue
+            if entry in existing:
+                stats['skipped'] += 1
+            elif self.import_output_dir(output_dir):
+                stats['imported'] += 1
+            else:
+                stats['failed'] += 1
+
+        return stats
+
+    def _existing_ids(self) -> set:
+        with self._lock:
+            rows = self._conn.execute("SELECT analysis_id FROM analyses").fetchall()
+        return {row['analysis_id'] for row in rows}
+
+    @staticmethod
+    def _stat_files(output_dir: str, previous: Optional[Dict[str, Dict]] = None) -> Dict[str, Dict]:
+        """
+        成果物ファイルの有無・サイズ・更新時刻
+
+        内容ハッシュはここでは計算しない（動画を含むため、ジョブの完了を待たせないよう
+        初回のダウンロード時に artifact_hash で計算する）。前回の登録からサイズ・更新時刻が
+        変わっていないファイルは登録済みのハッシュを引き継ぐ。
+
+        Args:
+            output_dir: 解析出力ディレクトリ
+            previous: 前回登録した成果物情報（オプション）
+        """
+        files = {}
+        for filename in ARTIFACT_FILES:
+            file_path = os.path.join(output_dir, filename)
+            if not os.path.exists(file_path):
+                files[filename] = {'exists': False, 'size': 0}
+                continue
+            info = _stat_file(file_path, with_hash=False)
+            known = (previous or {}).get(filename) or {}
+            if known.get('sha256') and known.get('size') == info['size'] and known.get('mtime') == info['mtime']:
+                info['sha256'] = known['sha256']
+            files[filename] = info
+        return files
+
+
+def _stat_file(file_path: str, with_hash: bool = True) -> Dict:
+    """ファイルのサイズ・更新時刻・SHA-256（with_hash が False なら SHA-256 なし）"""
+    stat = os.stat(file_path)
+    info = {
+        'exists': True,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime
+    }
+    if with_hash:
+        info['sha256'] = hash_file(file_path)['sha256']
+    return info
@@ -0,0 +1,341 @@
+"""
+テニスサービス動作解析 - 保持期間・容量管理
+uploads/ と output/ の古いファイルを保持期間・容量上限・最終参照順で削除する
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from services.video_processor import TEMP_DIR_PREFIX
+
+# 容量超過時の削除順（再生成できる大きな中間ファイルから削除し、結果 JSON は最後に残す）
+#   ファイル名: 解析出力ディレクトリ内の該当ファイルのみ削除
+#   'upload': アップロードされた元動画
+#   'analysis': 解析出力ディレクトリ全体
+EVICTION_TIERS = [
+    'preprocessed_video.mp4',
+    'upload',
+    'pose_visualization.mp4',
+    'pose_data.json',  # pose_data.npz から再作成できる
+    'pose_data.npz',
+    'analysis'
+]
+
+
+def _tree_size(path: str) -> int:
+    """ディレクトリ配下のファイルサイズ合計"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _owner_pid(dir_name: str) -> Optional[int]:
+    """一時ディレクトリ名から作成したプロセスのIDを取得（形式が違えば None）"""
+    pid = dir_name[len(TEMP_DIR_PREFIX):].split('_', 1)[0]
+    return int(pid) if pid.isdigit() else None
+
+
+def _pid_alive(pid: int) -> bool:
+    """プロセスが存在するか"""
+    if os.name == 'nt':
+        # Windows の os.kill はシグナル 0 でもプロセスを終了させるため、プロセスハンドルで確認する
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # 別ユーザーのプロセス
+    except OSError:
+        return False
+    return True
+
+
+class RetentionManager:
+    """保持期間・容量管理クラス（バックグラウンドで定期的に掃除する）"""
+
+    def __init__(self, upload_folder: str, output_folder: str, job_queue, upload_registry, result_store,
+                 chunked_uploads=None, advice_versions=None, result_cache=None, ttl_seconds: float = 7 * 24 * 3600, quota_bytes: int = 0,
+                 interval: float = 600.0):
+        """
+        保持期間・容量管理の初期化
+
+        Args:
+            upload_folder: アップロードフォルダ
+            output_folder: 解析出力フォルダ
+            job_queue: JobQueue（待機中・実行中ジョブのファイルは削除しない）
+            upload_registry: UploadRegistry（アップロードの最終参照時刻）
+            result_store: ResultStore（解析結果の最終参照時刻）
+            chunked_uploads: ChunkedUploadManager（放棄された分割アップロードの削除、オプション）
+            advice_versions: AdviceVersionStore（削除した解析のアドバイス版の登録を削除、オプション）
+            result_cache: ResultCache（削除した解析を指すキャッシュ索引を削除、オプション）
+            ttl_seconds: 最終参照からの保持期間（秒、0 で無効）
+            quota_bytes: uploads/ と output/ の合計容量の上限（バイト、0 で無制限）
+            interval: 掃除の実行間隔（秒）
+        """
+        self.upload_folder = upload_folder
+        self.output_folder = output_folder
+        self.job_queue = job_queue
+        self.upload_registry = upload_registry
+        self.result_store = result_store
+        self.chunked_uploads = chunked_uploads
+        self.advice_versions = advice_versions
+        self.result_cache = result_cache
+        self.ttl_seconds = ttl_seconds
+        self.quota_bytes = quota_bytes
+        self.interval = interval
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sweep_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'runs': 0,
+            'last_run_at': None,
+            'last_duration': None,
+            'usage_bytes': None,
+            'reclaimed_bytes_total': 0,
+            'removed_total': 0,
+            'reclaimed_bytes_by_reason': {'ttl': 0, 'quota': 0, 'partial': 0, 'temp': 0},
+            'last_error': None
+        }
+
+    def start(self):
+        """バックグラウンドの掃除スレッドを起動"""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='retention-sweeper', daemon=True)
+        self._thread.start()
+        print(f"保持期間管理を開始しました（保持期間: {self.ttl_seconds / 3600:.0f}時間, "
+              f"容量上限: {self.quota_bytes // (1024*1024)}MB, 間隔: {self.interval:.0f}秒）")
+
+    def stop(self):
+        """掃除スレッドを停止"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"保持期間管理エラー: {e}")
+                with self._metrics_lock:
+                    self._metrics['last_error'] = str(e)
+            self._stop_event.wait(self.interval)
+
+    def status(self) -> Dict:
+        """掃除の実行状況と累計の回収容量"""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+            metrics['reclaimed_bytes_by_reason'] = dict(self._metrics['reclaimed_bytes_by_reason'])
+        metrics.update({
+            'ttl_seconds': self.ttl_seconds,
+            'quota_bytes': self.quota_bytes,
+            'interval': self.interval
+        })
+        return metrics
+
+    def sweep(self) -> Dict:
+        """
+        1回分の掃除を実行
+
+        Returns:
+            {'reclaimed_bytes': 理由 -> バイト数, 'removed': 削除件数, 'usage_bytes': 掃除後の使用量}
+        """
+        with self._sweep_lock:
+            start_time = time.time()
+            reclaimed = {'ttl': 0, 'quota': 0, 'partial': 0, 'temp': 0}
+            removed = 0
+            cutoff = start_time - self.ttl_seconds if self.ttl_seconds > 0 else None
+
+            if cutoff is not None:
+                if self.chunked_uploads is not None:
+                    reclaimed['partial'] += self.chunked_uploads.expire(cutoff)
+                reclaimed['temp'] += self._sweep_temp_dirs(cutoff)
+
+            entries, active_bytes = self._collect_entries()
+
+            # 保持期間を過ぎたアップロード・解析はまるごと削除
+            if cutoff is not None:
+                expired = [e for e in entries if e['tier'] in ('upload', 'analysis') and e['last_access'] < cutoff]
+                for entry in expired:
+                    reclaimed['ttl'] += self._remove_entry(entry)
+                    removed += 1
+                expired_keys = {(e['tier'] == 'upload', e['key']) for e in expired}
+                entries = [e for e in entries if (e['tier'] == 'upload', e['key']) not in expired_keys]
+
+            # 容量上限を超えていれば削除順の段ごとに最終参照の古いものから削除
+            usage = sum(entry['size'] for entry in entries) + active_bytes
+            if self.quota_bytes > 0 and usage > self.quota_bytes:
+                for tier in EVICTION_TIERS:
+                    candidates = sorted((e for e in entries if e['tier'] == tier), key=lambda e: e['last_access'])
+                    for entry in candidates:
+                        if usage <= self.quota_bytes:
+                            break
+                        freed = self._remove_entry(entry)
+                        reclaimed['quota'] += freed
+                        usage -= freed
+                        removed += 1
+                        entries.remove(entry)
+                    if usage <= self.quota_bytes:
+                        break
+
+            duration = time.time() - start_time
+            with self._metrics_lock:
+                self._metrics['runs'] += 1
+                self._metrics['last_run_at'] = start_time
+                self._metrics['last_duration'] = round(duration, 3)
+                self._metrics['usage_bytes'] = usage
+                self._metrics['removed_total'] += removed
+                self._metrics['last_error'] = None
+                for reason, freed in reclaimed.items():
+                    self._metrics['reclaimed_bytes_by_reason'][reason] += freed
+                    self._metrics['reclaimed_bytes_total'] += freed
+
+            if removed or any(reclaimed.values()):
+                print(f"保持期間管理: {removed}件削除, {sum(reclaimed.values()) / (1024*1024):.1f}MB 回収 "
+                      f"（使用量: {usage / (1024*1024):.1f}MB, {duration:.2f}秒）")
+
+            return {'reclaimed_bytes': reclaimed, 'removed': removed, 'usage_bytes': usage}
+
+    def _collect_entries(self) -> Tuple[List[Dict], int]:
+        """
+        削除候補の一覧を作成（待機中・実行中ジョブの入力・出力は除外）
+
+        解析出力は成果物ファイルごとの候補と、ディレクトリ全体の候補に分ける。
+        ディレクトリ全体の候補のサイズは個別候補にならない残りのファイル分。
+
+        Returns:
+            (削除候補のリスト, 除外したファイルの合計バイト数)
+        """
+        active_paths = set()
+        for job in self.job_queue.active_jobs():
+            active_paths.add(os.path.abspath(job['video_path']))
+            active_paths.add(os.path.abspath(job['output_dir']))
+
+        entries = []
+        active_bytes = 0
+
+        upload_access = self.upload_registry.access_times()
+        if os.path.isdir(self.upload_folder):
+            for item in os.scandir(self.upload_folder):
+                if not item.is_file() or item.name.startswith('.'):
+                    continue
+                stat = item.stat()
+                if os.path.abspath(item.path) in active_paths:
+                    active_bytes += stat.st_size
+                    continue
+                upload_id = os.path.splitext(item.name)[0]
+                entries.append({
+                    'tier': 'upload',
+                    'key': upload_id,
+                    'path': item.path,
+                    'size': stat.st_size,
+                    'last_access': upload_access.get(upload_id, stat.st_mtime)
+                })
+
+        analysis_access = self.result_store.access_times()
+        if os.path.isdir(self.output_folder):
+            for item in os.scandir(self.output_folder):
+                if not item.is_dir():
+                    continue
+                if os.path.abspath(item.path) in active_paths:
+                    active_bytes += _tree_size(item.path)
+                    continue
+
+                last_access = analysis_access.get(item.name, item.stat().st_mtime)
+                remaining = _tree_size(item.path)
+                for tier in EVICTION_TIERS:
+                    file_path = os.path.join(item.path, tier)
+                    if tier in ('upload', 'analysis') or not os.path.isfile(file_path):
+                        continue
+                    size = os.path.getsize(file_path)
+                    remaining -= size
+                    entries.append({
+                        'tier': tier,
+                        'key': item.name,
+                        'path': file_path,
+                        'size': size,
+                        'last_access': last_access
+                    })
+                entries.append({
+                    'tier': 'analysis',
+                    'key': item.name,
+                    'path': item.path,
+                    'size': remaining,
+                    'last_access': last_access
+                })
+
+        return entries, active_bytes
+
+    def _remove_entry(self, entry: Dict) -> int:
+        """候補を削除して回収したバイト数を返す"""
+        tier = entry['tier']
+        try:
+            if tier == 'upload':
+                os.remove(entry['path'])
+                self.upload_registry.remove(entry['key'])
+                return entry['size']
+
+            if tier == 'analysis':
+                # ファイル単位の候補がまだ残っていればその分も含めて回収する
+                freed = _tree_size(entry['path'])
+                shutil.rmtree(entry['path'], ignore_errors=True)
+                # 削除した解析を完了済みとして返したり、キャッシュから再利用したりしないよう登録も消す
+                self.result_store.remove(entry['key'])
+                self.job_queue.remove(entry['key'])
+                if self.result_cache is not None:
+                    self.result_cache.remove(entry['key'])
+                if self.advice_versions is not None:
+                    self.advice_versions.remove(entry['key'])
+                return freed
+
+            os.remove(entry['path'])
+            self.result_store.mark_removed(entry['key'], [tier])
+            return entry['size']
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _sweep_temp_dirs(cutoff: float) -> int:
+        """
+        異常終了したプロセスが残した VideoProcessor の一時ディレクトリを削除
+
+        ディレクトリ名 '<TEMP_DIR_PREFIX><pid>_...' のプロセスが生きていれば（実行中のワーカーの解析中など）
+        保持期間を過ぎていても削除しない。
+        """
+        reclaimed = 0
+        temp_root = tempfile.gettempdir()
+        for item in os.scandir(temp_root):
+            if not item.is_dir() or not item.name.startswith(TEMP_DIR_PREFIX):
+                continue
+            owner_pid = _owner_pid(item.name)
+            if owner_pid is None or _pid_alive(owner_pid):
+                continue
+            if item.stat().st_mtime >= cutoff:
+                continue
+            reclaimed += _tree_size(item.path)
+            shutil.rmtree(item.path, ignore_errors=True)
+        return reclaimed
@@ -0,0 +1,133 @@
+"""
+テニスサービス動作解析 - 処理タイムライン
+解析パイプラインのステージ・フレーム単位の処理時間を Chrome トレース形式（Perfetto で表示可能）で記録
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+from services.json_codec import write_json
+
+# 出力ファイル名（解析出力ディレクトリ内）
+TRACE_FILENAME = 'trace.json'
+
+_NULL_SPAN = nullcontext()
+
+
+class NullTracer:
+    """記録しないトレーサー（トレース無効時・サンプル対象外のフレーム用）"""
+
+    enabled = False
+
+    def frame(self, frame_number: int) -> 'NullTracer':
+        return self
+
+    def span(self, name: str, category: str = 'stage', **args):
+        return _NULL_SPAN
+
+
+NULL_TRACER = NullTracer()
+
+
+class Tracer:
+    """
+    処理タイムラインの記録クラス
+
+    ステージのスパンは常に記録し、フレーム内の処理（デコード・補正・推論・描画・書き込み）は
+    sample_every フレームに1フレームだけ記録してオーバーヘッドを抑える。
+    """
+
+    enabled = True
+
+    def __init__(self, sample_every: int = 10):
+        """
+        トレーサーの初期化
+
+        Args:
+            sample_every: フレーム内の処理を記録する間隔（フレーム数、1 で全フレーム）
+        """
+        self.sample_every = max(1, sample_every)
+        self.events: List[Dict] = []
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self._thread_ids: Dict[str, int] = {}
+
+    def frame(self, frame_number: int):
+        """
+        フレーム内の処理を記録するトレーサー
+
+        Args:
+            frame_number: 読み込み順のフレーム番号
+
+        Returns:
+            サンプル対象のフレームなら self、それ以外は NULL_TRACER
+        """
+        return self if frame_number % self.sample_every == 0 else NULL_TRACER
+
+    @contextmanager
+    def span(self, name: str, category: str = 'stage', **args):
+        """
+        with ブロックの処理時間をスパンとして記録
+
+        Args:
+            name: スパン名
+            category: 分類（'stage', 'preprocess', 'pose' など）
+            **args: トレースビューアーに表示する付加情報
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, category, start, time.perf_counter(), args)
+
+    def add(self, name: str, category: str, start: float, end: float, args: Optional[Dict] = None):
+        """
+        計測済みの区間を記録
+
+        Args:
+            name: スパン名
+            category: 分類
+            start: 開始時刻（time.perf_counter の値）
+            end: 終了時刻（time.perf_counter の値）
+            args: 付加情報
+        """
+        # スレッドの識別子は終了後に再利用されるため、トラックはスレッド名ごとに分ける
+        thread_name = threading.current_thread().name
+        tid = self._thread_ids.setdefault(thread_name, len(self._thread_ids) + 1)
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': round((start - self._origin) * 1e6, 1),
+            'dur': round((end - start) * 1e6, 1),
+            'pid': self._pid,
+            'tid': tid
+        }
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    def save(self, path: str) -> int:
+        """
+        Chrome トレース形式で保存（chrome://tracing や ui.perfetto.dev で開ける）
+
+        Args:
+            path: 出力ファイルパス
+
+        Returns:
+            書き込んだバイト数
+        """
+        metadata = [{'name': 'process_name', 'ph': 'M', 'pid': self._pid, 'args': {'name': 'analysis'}}]
+        metadata += [
+            {'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': tid, 'args': {'name': name}}
+            for name, tid in self._thread_ids.items()
+        ]
+        trace = {
+            'traceEvents': metadata + self.events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'sample_every': self.sample_every}
+        }
+        return len(write_json(trace, path))
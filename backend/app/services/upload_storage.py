@@ -0,0 +1,216 @@
+"""
+テニスサービス動作解析 - アップロード保存
+アップロード動画の保存（SHA-256 を保存と同時に計算）とアップロード情報の管理
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import BinaryIO, Dict, Iterable, List, Optional
+
+from services.database import connect, ensure_columns
+
+# 保存時の読み込み単位（バイト）
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str) -> Dict:
+    """
+    既存ファイルの SHA-256 を計算
+
+    Returns:
+        {'sha256': 16進ハッシュ, 'size': バイト数}
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+
+    return {'sha256': digest.hexdigest(), 'size': size}
+
+
+def save_with_hash(stream: BinaryIO, file_path: str, max_size: int = 0) -> Dict:
+    """
+    ストリームをファイルに保存しながら SHA-256 を計算
+
+    ファイル全体をメモリに保持せず、チャンク単位で書き込みとハッシュ更新を行う。
+
+    Args:
+        stream: 読み込み元ストリーム（werkzeug FileStorage.stream など）
+        file_path: 保存先ファイルパス
+        max_size: 書き込む最大バイト数（0 で無制限。超えた時点で書きかけのファイルを削除して ValueError）
+
+    Returns:
+        {'sha256': 16進ハッシュ, 'size': バイト数}
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, 'wb') as f:
+        while True:
+            chunk = stream.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_size and size > max_size:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+
+    if max_size and size > max_size:
+        os.remove(file_path)
+        raise ValueError(f'書き込みが上限（{max_size}バイト）を超えました')
+
+    return {'sha256': digest.hexdigest(), 'size': size}
+
+
+class UploadRegistry:
+    """
+    アップロード情報管理クラス
+
+    アップロードIDから保存先パス・サイズ・内容ハッシュ・検証済みメタデータを
+    主キー検索で引けるようにし、アップロードフォルダの走査や動画の再プローブを不要にする。
+    """
+
+    def __init__(self, db_path: str):
+        """
+        アップロード情報管理の初期化
+
+        Args:
+            db_path: SQLite データベースファイルパス
+        """
+        self._lock = threading.Lock()
+        self._conn = connect(db_path)
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS uploads (
+                    upload_id TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    file_size INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_uploads_content_hash ON uploads (content_hash);
+            """)
+            ensure_columns(self._conn, 'uploads', {
+                'filename': 'TEXT',
+                'metadata': 'TEXT',
+                'warnings': 'TEXT',
+                'last_accessed': 'REAL'
+            })
+
+    def register(self, upload_id: str, path: str, content_hash: str, file_size: int,
+                 filename: Optional[str] = None):
+        """アップロードを登録"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO uploads (upload_id, path, content_hash, file_size, filename, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (upload_id, path, content_hash, file_size, filename, time.time())
+            )
+
+    def set_metadata(self, upload_id: str, metadata: Dict, warnings: List[str]):
+        """
+        検証済みの動画メタデータを保存（以降の検証でプローブを省略する）
+
+        Args:
+            upload_id: アップロードID
+            metadata: VideoProcessor.get_video_metadata の結果
+            warnings: 検証時の警告
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE uploads SET metadata = ?, warnings = ? WHERE upload_id = ?",
+                (json.dumps(metadata, ensure_ascii=False), json.dumps(warnings, ensure_ascii=False), upload_id)
+            )
+
+    def get(self, upload_id: str) -> Optional[Dict]:
+        """アップロード情報の取得（主キー検索）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM uploads WHERE upload_id = ?", (upload_id,)
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def resolve_legacy(self, upload_id: str, upload_folder: str, extensions: Iterable[str]) -> Optional[Dict]:
+        """
+        登録前に保存されたアップロードを拡張子ごとのパス確認で探して登録
+
+        フォルダ全体を走査せず、'<upload_id>.<ext>' の存在を拡張子の数だけ確認する。
+        実パスがアップロードフォルダ直下にないものは対象外。
+
+        Args:
+            upload_id: アップロードID
+            upload_folder: アップロードフォルダ
+            extensions: 許可される拡張子（'.' なし）
+
+        Returns:
+            登録したアップロード情報、見つからなければ None
+        """
+        root = os.path.realpath(upload_folder)
+        for extension in extensions:
+            for candidate in (extension, extension.upper()):
+                path = os.path.realpath(os.path.join(upload_folder, f'{upload_id}.{candidate}'))
+                # アップロードフォルダ外を指すID（'../' やシンボリックリンク）は扱わない
+                if os.path.dirname(path) != root:
+                    continue
+                if os.path.isfile(path):
+                    hashed = hash_file(path)
+                    self.register(upload_id, path, hashed['sha256'], hashed['size'])
+                    return self.get(upload_id)
+        return None
+
+    def touch(self, upload_id: str):
+        """アップロードの最終参照時刻を更新（保持期間・容量超過時の削除順に使う）"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE uploads SET last_accessed = ? WHERE upload_id = ?", (time.time(), upload_id)
+            )
+
+    def access_times(self) -> Dict[str, float]:
+        """アップロードID -> 最終参照時刻（未参照なら登録時刻）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT upload_id, COALESCE(last_accessed, created_at) AS accessed FROM uploads"
+            ).fetchall()
+        return {row['upload_id']: row['accessed'] for row in rows}
+
+    def remove(self, upload_id: str):
+        """アップロードの登録を削除（ファイルは呼び出し側で削除する）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM uploads WHERE upload_id = ?", (upload_id,))
+
+    def find_by_hash(self, content_hash: str) -> Optional[Dict]:
+        """
+        同じ内容の既存アップロードを検索（ファイルが残っているもののみ）
+
+        Args:
+            content_hash: SHA-256 ハッシュ
+
+        Returns:
+            アップロード情報、見つからなければ None
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM uploads WHERE content_hash = ? ORDER BY created_at",
+                (content_hash,)
+            ).fetchall()
+
+        for row in rows:
+            if os.path.exists(row['path']):
+                return self._row_to_dict(row)
+        return None
+
+    @staticmethod
+    def _row_to_dict(row) -> Dict:
+        """sqlite3.Row をアップロード情報の辞書に変換"""
+        upload = dict(row)
+        upload['metadata'] = json.loads(upload['metadata']) if upload.get('metadata') else None
+        upload['warnings'] = json.loads(upload['warnings']) if upload.get('warnings') else []
+        return upload
@@ -4,14 +4,151 @@
 """
 
 import cv2
+import math
+import multiprocessing
 import numpy as np
 import os
 import tempfile
 import shutil
-from typing import Dict, List, Tuple, Optional, Union
+from typing import Callable, Dict, Iterator, List, Tuple, Optional, Union
 from pathlib import Path
 import time
 
+from services.frame_enhancer import AUTO_PROFILE, ENHANCEMENT_PROFILES, FrameEnhancer, choose_profile, measure_frames
+from services.frame_queue import FrameWriter, prefetch
+from services.tracing import NULL_TRACER
+
+# 受け付ける動画の拡張子（API の ALLOWED_EXTENSIONS もここから作る）
+SUPPORTED_EXTENSIONS = ('.mov', '.mp4', '.m4v', '.avi', '.mkv', '.wmv')
+
+# 一時ディレクトリの接頭辞（'tennis_analyzer_<pid>_'、保持期間管理で残骸を掃除する）
+TEMP_DIR_PREFIX = 'tennis_analyzer_'
+
+
+def sampling_step(source_fps: float, frame_skip: int, target_fps: float = 0.0) -> float:
+    """
+    前処理で残すフレームの間隔（元動画のフレーム数単位）
+
+    Args:
+        source_fps: 元動画のフレームレート
+        frame_skip: 目標 fps を指定しない場合の間引き（このフレーム数に1フレーム残す）
+        target_fps: 解析する実効フレームレート（0 なら frame_skip を使う）
+
+    Returns:
+        間隔（1 以上。目標 fps が元動画以上なら全フレームを残す 1）
+    """
+    if target_fps > 0 and source_fps > 0:
+        return max(1.0, source_fps / target_fps)
+    return float(max(1, frame_skip))
+
+
+def output_size(width: int, height: int, target_short_side: int, scale: float = 0.0) -> Tuple[int, int]:
+    """
+    前処理後の解像度
+
+    Args:
+        width: 元動画の幅
+        height: 元動画の高さ
+        target_short_side: 短辺の目標画素数（元動画の短辺がこれ以下なら縮小しない）
+        scale: 0 より大きければ短辺の目標の代わりに使う固定の縮小率
+
+    Returns:
+        (幅, 高さ)（コーデックのため偶数に丸める）
+    """
+    if scale <= 0:
+        short_side = min(width, height)
+        scale = min(1.0, target_short_side / short_side) if short_side > 0 else 1.0
+    return max(2, int(round(width * scale / 2)) * 2), max(2, int(round(height * scale / 2)) * 2)
+
+
+# 区間ごとの前処理プロセスで使い回すフレーム補正
+_segment_enhancer = None
+
+
+def _init_segment_process():
+    """区間の前処理プロセスの初期化（プロセス数だけ並列に動くため OpenCV 内部のスレッドは使わない）"""
+    cv2.setNumThreads(1)
+
+
+def _open_at(video_path: str, start: int) -> Tuple[cv2.VideoCapture, int]:
+    """
+    動画を開き、フレーム番号 start の直前まで読み進める（次の grab() が start のフレーム）
+
+    CAP_PROP_POS_FRAMES へのシークはコンテナ・コーデックによってはフレーム単位で正確でないため、
+    start の1フレーム手前にシークして1フレーム読み、そのフレームのタイムスタンプ（CAP_PROP_POS_MSEC）
+    から求めたフレーム番号が1フレーム手前と一致する場合だけシーク結果を使う。
+    一致しなければ（可変フレームレート・不正確なシーク）先頭から grab() で読み進める。
+
+    Returns:
+        (VideoCapture, 次に grab() されるフレーム番号。動画が start より短ければ start 未満)
+    """
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    position = 0
+    seek_to = start - 1
+    if seek_to > 0 and fps > 0 and cap.set(cv2.CAP_PROP_POS_FRAMES, seek_to):
+        if cap.grab() and round(cap.get(cv2.CAP_PROP_POS_MSEC) * fps / 1000.0) == seek_to:
+            return cap, start
+        cap.release()
+        cap = cv2.VideoCapture(video_path)
+    while position < start and cap.grab():
+        position += 1
+    return cap, position
+
+
+def _preprocess_segment(task: Tuple) -> Tuple[str, List[int], Tuple[int, ...], int]:
+    """
+    動画の1区間を前処理し、前処理済みフレームを一時ファイルに書き出す（区間の前処理プロセスで実行）
+
+    区間の先頭フレームの位置まで読み進めてから、1プロセスで前処理した場合と同じフレーム番号
+    （step の倍数に最も近いフレーム）だけをデコード・縮小・補正する。
+    フレームはプロセス間で受け渡さず、画素をそのまま並べたファイルに書き出す（メモリに区間全体を持たない）。
+
+    Args:
+        task: (入力動画ファイルパス, 区間の最初に残すフレームの通し番号, 区間の次の区間の最初の通し番号
+              （None なら動画の最後まで）, 間隔, 出力解像度 (幅, 高さ), 縮小の補間方法, 補正のプロファイル,
+              一時ファイルの出力ディレクトリ)
+
+    Returns:
+        (一時ファイルパス, 元のフレーム番号のリスト, フレームの形状, 区間が受け持つ元フレーム数)
+    """
+    global _segment_enhancer
+    video_path, first_kept, end_kept, step, size, interpolation, enhancement, output_dir = task
+    if _segment_enhancer is None:
+        _segment_enhancer = FrameEnhancer()
+
+    start = round(first_kept * step)
+    cap, index = _open_at(video_path, start)
+
+    fd, frames_path = tempfile.mkstemp(prefix='segment_', suffix='.frames', dir=output_dir)
+    frame_numbers = []
+    shape = (size[1], size[0], 3)
+    kept, next_kept = first_kept, start
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while index >= start and (end_kept is None or kept < end_kept):
+                keep = index >= next_kept
+                ret = cap.grab()
+                if ret and keep:
+                    ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                index += 1
+                if keep:
+                    kept += 1
+                    next_kept = round(kept * step)
+                    resized_frame = cv2.resize(frame, size, interpolation=interpolation)
+                    enhanced_frame = np.ascontiguousarray(_segment_enhancer.enhance(resized_frame, enhancement))
+                    shape = enhanced_frame.shape
+                    f.write(enhanced_frame)
+                    frame_numbers.append(index - 1)
+    finally:
+        cap.release()
+
+    # 次の区間の先頭までの読み捨てるフレームもこの区間の読み込み分として数える
+    covered = index if end_kept is None or kept < end_kept else round(end_kept * step)
+    return frames_path, frame_numbers, shape, max(0, covered - start)
+
 
 class VideoProcessor:
     """動画処理クラス"""
@@ -23,9 +160,9 @@ class VideoProcessor:
         Args:
             max_file_size: 最大ファイルサイズ（バイト）
         """
-        self.supported_formats = ['.mov', '.mp4', '.avi', '.mkv', '.wmv']
+        self.supported_formats = list(SUPPORTED_EXTENSIONS)
         self.max_file_size = max_file_size
-        self.temp_dir = tempfile.mkdtemp(prefix='tennis_analyzer_')
+        self._temp_dir = None  # 初回使用時に作成
 
         # 動画品質設定
         self.target_fps = 30
@@ -34,12 +171,81 @@ class VideoProcessor:
 
         # 前処理パラメータ（追加）
         self.frame_skip = 5    # 5フレームに1フレーム残す
-        self.scale = 0.3       # 解像度30%に縮小
+        # 縮小: 短辺を target_short_side 画素に揃える（MediaPipe Pose の入力は 224〜256 画素で、
+        # 短辺 360 画素以上ではランドマークの精度が変わらない）。scale を 0 より大きくすると従来の固定の縮小率
+        self.target_short_side = 360
+        self.scale = 0.0
+        self.interpolation = cv2.INTER_LINEAR  # INTER_AREA は 4K で 10倍以上遅く、精度は変わらない
+
+        # フレーム補正（CLAHE は使い回す）と、補正の自動選択で測定するフレーム数
+        self.enhancer = FrameEnhancer()
+        self.enhancement_samples = 5
+
+        # 前処理を時間区間に分けて並列に実行するプロセス数（1 なら分割しない）と、1区間の最短の長さ（秒）
+        self.segments = 1
+        self.min_segment_seconds = 2.0
+        self._segment_pool = None
+        self._segment_pool_size = 0
 
     def __del__(self):
         """デストラクタ - 一時ディレクトリのクリーンアップ"""
-        if hasattr(self, 'temp_dir') and os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir, ignore_errors=True)
+        self.close()
+
+    @property
+    def temp_dir(self) -> str:
+        """一時ディレクトリ（実際に必要になった時点で作成する）"""
+        if self._temp_dir is None or not os.path.exists(self._temp_dir):
+            self._temp_dir = tempfile.mkdtemp(prefix=f'{TEMP_DIR_PREFIX}{os.getpid()}_')
+        return self._temp_dir
+
+    def output_size(self, width: int, height: int) -> Tuple[int, int]:
+        """元動画の解像度から前処理後の解像度を決める（module の output_size を参照）"""
+        return output_size(width, height, self.target_short_side, self.scale)
+
+    def segment_pool(self, processes: int):
+        """
+        区間の前処理プロセスのプール（初回使用時に起動し、以降のジョブでも使い回す）
+
+        Args:
+            processes: プロセス数
+        """
+        if self._segment_pool is None or self._segment_pool_size != processes:
+            self._close_segment_pool()
+            # MediaPipe/OpenCV のスレッドを fork で複製しないよう spawn を使う
+            self._segment_pool = multiprocessing.get_context('spawn').Pool(processes, initializer=_init_segment_process)
+            self._segment_pool_size = processes
+        return self._segment_pool
+
+    def _close_segment_pool(self):
+        pool = getattr(self, '_segment_pool', None)
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        self._segment_pool = None
+        self._segment_pool_size = 0
+
+    def close(self):
+        """一時ディレクトリを削除し、区間の前処理プロセスを停止"""
+        self._close_segment_pool()
+        temp_dir = getattr(self, '_temp_dir', None)
+        if temp_dir is not None and os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        self._temp_dir = None
+
+    def cleanup_temp_files(self):
+        """一時ディレクトリ内のファイルを削除（ディレクトリ自体は再利用）"""
+        if self._temp_dir is None or not os.path.exists(self._temp_dir):
+            return
+
+        for entry in os.listdir(self.temp_dir):
+            path = os.path.join(self.temp_dir, entry)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
 
     def validate_video(self, file_path: str) -> Dict[str, Union[bool, str, Dict]]:
         """
@@ -93,6 +299,63 @@ class VideoProcessor:
 
         return validation_result
 
+    # コンテナ判定に必要な先頭バイト数
+    HEADER_PROBE_BYTES = 16
+
+    # QuickTime/MP4 の先頭に現れるトップレベル atom
+    _ISO_BMFF_ATOMS = {b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip', b'pnot'}
+    _ASF_HEADER_GUID = bytes.fromhex('3026b2758e66cf11a6d900aa0062ce6c')
+
+    def probe_container_header(self, header: bytes, file_extension: str) -> Dict[str, Union[bool, str]]:
+        """
+        先頭バイトからコンテナ形式を判定（アップロード途中の早期検証用）
+
+        Args:
+            header: ファイル先頭のバイト列（HEADER_PROBE_BYTES 以上）
+            file_extension: 拡張子（'.mp4' など）
+
+        Returns:
+            {'is_valid': bool, 'container': 判定したコンテナ名, 'error_message': str}
+        """
+        probe_result = {
+            'is_valid': False,
+            'container': '',
+            'error_message': ''
+        }
+
+        file_extension = file_extension.lower()
+        if file_extension not in self.supported_formats:
+            probe_result['error_message'] = f'サポートされていないファイル形式です（対応形式: {", ".join(self.supported_formats)}）'
+            return probe_result
+
+        if len(header) < self.HEADER_PROBE_BYTES:
+            probe_result['error_message'] = 'ファイルが短すぎます'
+            return probe_result
+
+        if header[4:8] in self._ISO_BMFF_ATOMS:
+            container = 'mp4'
+        elif header[:4] == b'RIFF' and header[8:12] == b'AVI ':
+            container = 'avi'
+        elif header[:4] == b'\x1a\x45\xdf\xa3':
+            container = 'matroska'
+        elif header[:16] == self._ASF_HEADER_GUID:
+            container = 'asf'
+        else:
+            probe_result['error_message'] = '動画ファイルとして認識できません'
+            return probe_result
+
+        expected = {
+            '.mp4': 'mp4', '.mov': 'mp4', '.m4v': 'mp4',
+            '.avi': 'avi', '.mkv': 'matroska', '.wmv': 'asf'
+        }
+        if expected[file_extension] != container:
+            probe_result['error_message'] = f'拡張子とファイル形式が一致しません（{file_extension} / {container}）'
+            return probe_result
+
+        probe_result['is_valid'] = True
+        probe_result['container'] = container
+        return probe_result
+
     def get_video_metadata(self, video_path: str) -> Optional[Dict]:
         """
         動画メタデータの取得
@@ -130,70 +393,287 @@ class VideoProcessor:
             print(f"メタデータ取得エラー: {e}")
             return None
 
-    def preprocess_video(self, video_path: str, output_path: Optional[str] = None) -> str:
+    def preprocess_video(self, video_path: str, output_path: Optional[str] = None,
+                         progress_callback: Optional[Callable[[int, int], None]] = None,
+                         tracer=None, queue_depth: int = 0, target_fps: float = 0.0,
+                         enhancement: str = 'full') -> str:
         """
-        動画の前処理（リサイズ＋間引き）
+        動画の前処理（リサイズ＋間引き＋補正）
+
+        Args:
+            video_path: 入力動画ファイルパス
+            output_path: 出力動画ファイルパス（省略時は一時ディレクトリ）
+            progress_callback: 進捗通知関数（読み込んだフレーム数, 総フレーム数）
+            tracer: 処理タイムラインの記録先（services.tracing.Tracer、オプション）
+            queue_depth: デコードの先読み・書き込み待ちの最大フレーム数（0 なら1スレッドで順に処理）
+            target_fps: 解析する実効フレームレート（0 なら frame_skip フレームに1フレーム）
+            enhancement: 補正のプロファイル（ENHANCEMENT_PROFILES または 'auto'）
         """
         if output_path is None:
             output_path = os.path.join(self.temp_dir, f"preprocessed_{int(time.time())}.mp4")
 
-        cap = cv2.VideoCapture(video_path)
+        for _ in self.stream_frames(video_path, output_path, progress_callback, tracer, queue_depth, target_fps,
+                                    enhancement):
+            pass
 
-        if not cap.isOpened():
-            raise ValueError(f"動画ファイルを開けません: {video_path}")
+        return output_path
 
-        original_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        original_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        original_fps = cap.get(cv2.CAP_PROP_FPS)
+    def stream_frames(self, video_path: str, output_path: Optional[str] = None,
+                      progress_callback: Optional[Callable[[int, int], None]] = None,
+                      tracer=None, queue_depth: int = 0, target_fps: float = 0.0,
+                      enhancement: str = 'full') -> 'PreprocessedFrames':
+        """
+        前処理済みフレームをメモリ上で順に返す（ポーズ検出に直接渡す融合モード用）
 
-        # 出力設定
-        output_fps = original_fps / self.frame_skip if original_fps > 0 else 10.0
-        output_width = int(original_width * self.scale)
-        output_height = int(original_height * self.scale)
+        Args:
+            video_path: 入力動画ファイルパス
+            output_path: 前処理済み動画も書き出す場合の出力ファイルパス（省略時は書き出さない）
+            progress_callback: 進捗通知関数（読み込んだフレーム数, 総フレーム数）
+            tracer: 処理タイムラインの記録先（services.tracing.Tracer、オプション）
+            queue_depth: デコードの先読み・書き込み待ちの最大フレーム数（0 なら1スレッドで順に処理）
+            target_fps: 解析する実効フレームレート（0 なら frame_skip フレームに1フレーム。
+                        元動画が 30/60/240fps のどれでも同じ時間間隔でフレームを残す）
+            enhancement: 補正のプロファイル（ENHANCEMENT_PROFILES または 'auto'）
+
+        Returns:
+            前処理済みフレームの列（出力の fps・解像度・見込みフレーム数を持つ）
+        """
+        return PreprocessedFrames(self, video_path, output_path, progress_callback, tracer, queue_depth,
+                                  target_fps, enhancement)
 
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, output_fps, (output_width, output_height))
+    def choose_enhancement(self, video_path: str) -> Tuple[str, Dict[str, float]]:
+        """
+        動画から間隔をあけて取り出したフレームの明るさ・コントラスト・ノイズで補正のプロファイルを選ぶ
 
-        frame_count = 0
-        kept_frames = 0
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        Args:
+            video_path: 入力動画ファイルパス
 
+        Returns:
+            (プロファイル, 測定値)（フレームを読めなければ ('none', 測定値 0)）
+        """
+        cap = cv2.VideoCapture(video_path)
+        frames = []
         try:
-            while True:
+            width, height = self.output_size(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                                             int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            for sample in range(self.enhancement_samples):
+                # フレーム数が分かれば動画全体から均等に、分からなければ先頭から順に取り出す
+                if frame_count > 0:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, int((sample + 0.5) * frame_count / self.enhancement_samples))
                 ret, frame = cap.read()
                 if not ret:
-                    break
+                    continue
+                # 前処理後と同じ解像度で測る（ノイズの見え方は縮小で変わる）
+                if width > 0 and height > 0:
+                    frame = cv2.resize(frame, (width, height), interpolation=self.interpolation)
+                frames.append(frame)
+        finally:
+            cap.release()
 
-                # フレーム間引き
-                if frame_count % self.frame_skip == 0:
-                    resized_frame = cv2.resize(frame, (output_width, output_height))
-                    enhanced_frame = self._enhance_frame_quality(resized_frame)
-                    out.write(enhanced_frame)
-                    kept_frames += 1
+        stats = measure_frames(frames)
+        profile = choose_profile(stats) if frames else 'none'
+        return profile, stats
 
-                frame_count += 1
+    def _enhance_frame_quality(self, frame: np.ndarray, profile: str = 'full') -> np.ndarray:
+        """フレーム品質の向上（profile は ENHANCEMENT_PROFILES のいずれか）"""
+        return self.enhancer.enhance(frame, profile)
 
-                if kept_frames % 30 == 0:
-                    progress = (frame_count / total_frames) * 100
-                    print(f"前処理進捗: {progress:.1f}% ({kept_frames}フレーム保存)")
 
-        finally:
+class PreprocessedFrames:
+    """
+    前処理済みフレームの列
+
+    元動画をデコード→間引き→縮小→補正し、前処理済みのフレームを1枚ずつ返す。
+    ポーズ検出に直接渡せば、前処理済み動画の再エンコード（非可逆）と再デコードが不要になる。
+    output_path を指定した場合は返すのと同じフレームを前処理済み動画にも書き出す。
+    processor.segments が 2 以上で動画が十分に長ければ、時間区間ごとに別プロセスで前処理し、
+    区間の順に返す（残すフレームと前処理の結果は1プロセスの場合と同じ）。
+    """
+
+    def __init__(self, processor: VideoProcessor, video_path: str, output_path: Optional[str] = None,
+                 progress_callback: Optional[Callable[[int, int], None]] = None, tracer=None,
+                 queue_depth: int = 0, target_fps: float = 0.0, enhancement: str = 'full'):
+        """
+        前処理済みフレームの列の初期化（動画を開いて出力の fps・解像度を決める）
+
+        Args:
+            processor: 前処理パラメータ（frame_skip, scale, 補正）を持つ VideoProcessor
+            video_path: 入力動画ファイルパス
+            output_path: 前処理済み動画の出力ファイルパス（オプション）
+            progress_callback: 進捗通知関数（読み込んだフレーム数, 総フレーム数）
+            tracer: 処理タイムラインの記録先（services.tracing.Tracer、オプション）
+            queue_depth: デコードの先読み・前処理済み動画の書き込み待ちの最大フレーム数
+                         （0 ならデコード・書き込みも呼び出し側のスレッドで行う）
+            target_fps: 解析する実効フレームレート（0 なら processor.frame_skip フレームに1フレーム）
+            enhancement: 補正のプロファイル（ENHANCEMENT_PROFILES、'auto' なら動画を測定して選ぶ）
+        """
+        if enhancement != AUTO_PROFILE and enhancement not in ENHANCEMENT_PROFILES:
+            raise ValueError(f"サポートされていない補正プロファイルです: {enhancement}")
+
+        self.processor = processor
+        self.video_path = video_path
+        self.output_path = output_path
+        self.progress_callback = progress_callback
+        self.tracer = tracer or NULL_TRACER
+        self.queue_depth = queue_depth
+
+        self._cap = cv2.VideoCapture(video_path)
+        if not self._cap.isOpened():
+            raise ValueError(f"動画ファイルを開けません: {video_path}")
+
+        original_width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        original_height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        original_fps = self._cap.get(cv2.CAP_PROP_FPS)
+        self.source_frames = int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        self.enhancement_stats = None
+        if enhancement == AUTO_PROFILE:
+            enhancement, self.enhancement_stats = processor.choose_enhancement(video_path)
+        self.enhancement = enhancement
+
+        # 出力設定（残すフレームの間隔は元動画のフレーム数単位、目標 fps 指定時は小数になりうる）
+        self.step = sampling_step(original_fps, processor.frame_skip, target_fps)
+        self.fps = original_fps / self.step if original_fps > 0 else 10.0
+        self.width, self.height = processor.output_size(original_width, original_height)
+        self.frame_count = math.ceil(self.source_frames / self.step) if self.source_frames > 0 else 0
+
+        # 区間数（フレーム数が分からない動画・短い動画は分割しない）
+        duration = self.source_frames / original_fps if original_fps > 0 and self.source_frames > 0 else 0.0
+        self.segments = max(1, min(processor.segments, int(duration / max(processor.min_segment_seconds, 1e-6)),
+                                   self.frame_count))
+
+        self.read_frames = 0
+        self.kept_frames = 0
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        cap, tracer = self._cap, self.tracer
+        if cap is None:
+            raise RuntimeError("前処理済みフレームの列は一度しか読み込めません")
+        self._cap = None
+
+        out = None
+        if self.output_path:
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            out = FrameWriter(cv2.VideoWriter(self.output_path, fourcc, self.fps, (self.width, self.height)),
+                              self.queue_depth, name='encode-preprocessed', tracer=tracer, category='preprocess')
+
+        total_frames = self.source_frames
+
+        if self.segments > 1:
             cap.release()
-            out.release()
+            frames = self._process_segments()
+        else:
+            frames = self._process(cap)
+        try:
+            for index, enhanced_frame in frames:
+                if out is not None:
+                    out.write(enhanced_frame, index)
+                self.kept_frames += 1
 
-        print(f"✅ 前処理完了: {output_path}")
-        print(f"📊 元フレーム数: {total_frames}, 保存フレーム数: {kept_frames}")
-        print(f"🆕 新FPS: {output_fps:.2f}, 新解像度: {output_width}x{output_height}")
+                if self.kept_frames % 30 == 0:
+                    progress = (index / total_frames) * 100 if total_frames > 0 else 0.0
+                    print(f"前処理進捗: {progress:.1f}% ({self.kept_frames}フレーム保存)")
+                    if self.progress_callback:
+                        self.progress_callback(index + 1, total_frames)
 
-        return output_path
+                yield enhanced_frame
+
+        finally:
+            frames.close()
+            if out is not None:
+                out.release()
+
+        if self.progress_callback:
+            self.progress_callback(self.read_frames, total_frames)
 
-    def _enhance_frame_quality(self, frame: np.ndarray) -> np.ndarray:
-        """フレーム品質の向上"""
-        denoised = cv2.bilateralFilter(frame, 9, 75, 75)
-        lab = cv2.cvtColor(denoised, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        l = clahe.apply(l)
-        enhanced = cv2.merge([l, a, b])
-        enhanced = cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
-        return enhanced
+        print(f"✅ 前処理完了: {self.output_path or '（メモリ上で受け渡し）'}")
+        print(f"📊 元フレーム数: {total_frames}, 保存フレーム数: {self.kept_frames}")
+        print(f"🆕 新FPS: {self.fps:.2f}, 新解像度: {self.width}x{self.height}, 補正: {self.enhancement}")
+
+    def _process(self, cap) -> Iterator[Tuple[int, np.ndarray]]:
+        """1プロセスで前処理し、（元のフレーム番号, 前処理済みフレーム）で返す"""
+        # デコードは読み込みスレッドで先行させ、縮小・補正は呼び出し側のスレッドで行う
+        frames = prefetch(self._decode(cap), self.queue_depth, name='decode')
+        try:
+            for index, frame in frames:
+                frame_tracer = self.tracer.frame(index)
+                with frame_tracer.span('resize', 'preprocess', frame=index):
+                    resized_frame = cv2.resize(frame, (self.width, self.height),
+                                               interpolation=self.processor.interpolation)
+                with frame_tracer.span('enhance', 'preprocess', frame=index, profile=self.enhancement):
+                    enhanced_frame = self.processor._enhance_frame_quality(resized_frame, self.enhancement)
+                yield index, enhanced_frame
+        finally:
+            frames.close()
+
+    def _process_segments(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        時間区間ごとに別プロセスで前処理し、（元のフレーム番号, 前処理済みフレーム）を区間の順に返す
+
+        残すフレームの通し番号を均等に分け、各プロセスが自分の区間の先頭まで読み進めて前処理する
+        （_open_at でシーク先のフレームのタイムスタンプを確認するため、残すフレームは1プロセスの場合と同じ）。
+        先頭の区間が終われば、後ろの区間の完了を待たずに返し始める。
+        """
+        # 区間の前処理済みフレームは一時ファイルで受け取り、読み込んだ分だけメモリに置く
+        segment_dir = tempfile.mkdtemp(prefix='segments_', dir=self.processor.temp_dir)
+        bounds = [round(segment * self.frame_count / self.segments) for segment in range(self.segments + 1)]
+        tasks = [
+            (self.video_path, bounds[segment], bounds[segment + 1] if segment + 1 < self.segments else None,
+             self.step, (self.width, self.height), self.processor.interpolation, self.enhancement, segment_dir)
+            for segment in range(self.segments)
+        ]
+        print(f"前処理を{self.segments}区間に分けて並列に実行します")
+
+        try:
+            results = self.processor.segment_pool(self.segments).imap(_preprocess_segment, tasks)
+            for segment in range(self.segments):
+                with self.tracer.span('segment', 'preprocess', segment=segment):
+                    frames_path, frame_numbers, shape, read_frames = next(results)
+                self.read_frames += read_frames
+                try:
+                    with open(frames_path, 'rb') as f:
+                        for index in frame_numbers:
+                            frame = np.empty(shape, dtype=np.uint8)
+                            f.readinto(frame)
+                            yield index, frame
+                finally:
+                    os.remove(frames_path)
+        finally:
+            # 途中で読み込みをやめた場合は、まだ実行中の区間の出力もまとめて削除する
+            shutil.rmtree(segment_dir, ignore_errors=True)
+
+    def _decode(self, cap) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        元動画から残すフレームだけをデコードし、（元のフレーム番号, フレーム）で返す
+
+        読み捨てるフレームは grab() でコンテナから読み進めるだけにし、画素への変換（retrieve）は
+        残すフレームでしか行わない。残すのは step の倍数に最も近いフレーム番号
+        （ずれは元動画の半フレーム以内）。
+        """
+        next_kept = 0
+        kept = 0
+        try:
+            while True:
+                index = self.read_frames
+                keep = index >= next_kept
+                with self.tracer.frame(index).span('decode' if keep else 'grab', 'preprocess', frame=index):
+                    ret = cap.grab()
+                    if ret and keep:
+                        ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                self.read_frames += 1
+
+                # フレーム間引き
+                if keep:
+                    kept += 1
+                    next_kept = round(kept * self.step)
+                    yield index, frame
+        finally:
+            cap.release()
+
+    def __del__(self):
+        """読み込まれなかった場合も動画を閉じる"""
+        if getattr(self, '_cap', None) is not None:
+            self._cap.release()
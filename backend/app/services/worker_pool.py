@@ -0,0 +1,465 @@
+"""
+テニスサービス動作解析 - 解析ワーカープール
+永続ジョブキューからジョブを取り出して解析を実行するワーカープロセス群
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from services.job_queue import JobQueue
+from services.metrics import FRAME_BUCKETS, MetricsStore
+from services.result_store import ResultStore
+
+
+class WorkerPool:
+    """解析ワーカープロセスプールクラス"""
+
+    def __init__(self, db_path: str, num_workers: int = 2, poll_interval: float = 0.5,
+                 model_complexity: int = 2, preprocess_segments: int = 1, target_short_side: int = 360,
+                 monitor_interval: float = 2.0):
+        """
+        ワーカープールの初期化
+
+        Args:
+            db_path: ジョブキューの SQLite データベースファイルパス
+            num_workers: ワーカープロセス数
+            poll_interval: 待機中ジョブがない時のポーリング間隔（秒）
+            model_complexity: 各ワーカーの MediaPipe Pose モデルの複雑さ (0, 1, 2)
+            preprocess_segments: 各ワーカーが前処理を時間区間に分けて並列に実行するプロセス数（1 なら分割しない）
+            target_short_side: 前処理後の短辺の画素数
+            monitor_interval: ワーカーの生存確認の間隔（秒）
+        """
+        self.db_path = db_path
+        self.num_workers = max(1, num_workers)
+        self.poll_interval = poll_interval
+        self.model_complexity = model_complexity
+        self.preprocess_segments = max(1, preprocess_segments)
+        self.target_short_side = target_short_side
+        self.monitor_interval = monitor_interval
+
+        # コア数をワーカー間で分け合い、OpenCV のスレッドの過剰生成を防ぐ
+        self.threads_per_worker = max(1, (os.cpu_count() or 1) // self.num_workers)
+
+        # MediaPipe/OpenCV のスレッドを fork で複製しないよう spawn を使う
+        self._context = multiprocessing.get_context('spawn')
+        self._stop_event = self._context.Event()
+        self._processes: List[multiprocessing.Process] = []
+        # ウォームアップを終えてジョブを受け付けられるワーカー
+        self._ready_events = []
+
+        # 異常終了したワーカーの再起動（監視スレッド）
+        self._daemon = True
+        self._lock = threading.Lock()
+        self._monitor = None
+        self.restarts = 0
+
+    def start(self):
+        """ワーカープロセスを起動し、監視スレッドを開始"""
+        if self._processes:
+            return
+
+        # 前回の終了で中断されたジョブを再投入
+        queue = JobQueue(self.db_path)
+        requeued = queue.requeue_running()
+        queue.close()
+        if requeued:
+            print(f"中断されたジョブを再投入しました: {len(requeued)}件")
+
+        # 区間の前処理プロセスを起動するワーカーは daemon にできない（daemon プロセスは子プロセスを持てない）。
+        # その場合は API プロセスの終了時に停止する
+        self._daemon = self.preprocess_segments <= 1
+        if not self._daemon:
+            atexit.register(self.stop)
+
+        with self._lock:
+            for worker_id in range(self.num_workers):
+                process, ready_event = self._spawn(worker_id)
+                self._processes.append(process)
+                self._ready_events.append(ready_event)
+
+        self._monitor = threading.Thread(target=self._supervise, name='worker-monitor', daemon=True)
+        self._monitor.start()
+        print(f"解析ワーカーを起動しました: {self.num_workers}プロセス")
+
+    def _spawn(self, worker_id: int):
+        """ワーカープロセスを1つ起動（(プロセス, ウォームアップ完了のイベント) を返す）"""
+        ready_event = self._context.Event()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, self.db_path, self.poll_interval, self._stop_event,
+                  self.model_complexity, self.threads_per_worker, ready_event, self.preprocess_segments,
+                  self.target_short_side),
+            name=f'analysis-worker-{worker_id}',
+            daemon=self._daemon
+        )
+        process.start()
+        return process, ready_event
+
+    def _supervise(self):
+        """監視スレッド: monitor_interval ごとに異常終了したワーカーを検出して再起動"""
+        while not self._stop_event.wait(self.monitor_interval):
+            try:
+                self.check_workers()
+            except Exception as e:
+                print(f"ワーカー監視エラー: {e}")
+
+    def check_workers(self) -> List[int]:
+        """
+        異常終了したワーカーのジョブを再投入（または失敗に）し、ワーカーを起動し直す
+
+        Returns:
+            起動し直したワーカー番号のリスト
+        """
+        restarted = []
+        with self._lock:
+            for worker_id, process in enumerate(self._processes):
+                if process.is_alive() or self._stop_event.is_set():
+                    continue
+
+                queue = JobQueue(self.db_path)
+                try:
+                    recovered = queue.recover_worker(worker_id, process.pid)
+                finally:
+                    queue.close()
+                print(f"ワーカー{worker_id} が異常終了しました (pid={process.pid}, 終了コード {process.exitcode}, "
+                      f"再投入 {len(recovered['requeued'])}件, 失敗 {len(recovered['failed'])}件)")
+
+                self._processes[worker_id], self._ready_events[worker_id] = self._spawn(worker_id)
+                self.restarts += 1
+                restarted.append(worker_id)
+        return restarted
+
+    def stop(self, timeout: float = 10.0):
+        """監視スレッドとワーカープロセスを停止（実行中のジョブは完了を待つ）"""
+        self._stop_event.set()
+        if self._monitor is not None:
+            self._monitor.join(timeout)
+            self._monitor = None
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self._ready_events = []
+
+    def alive_count(self) -> int:
+        """生存中のワーカー数"""
+        return sum(1 for process in self._processes if process.is_alive())
+
+    def ready_count(self) -> int:
+        """ウォームアップを終えて生存中のワーカー数"""
+        return sum(1 for process, ready in zip(self._processes, self._ready_events)
+                   if process.is_alive() and ready.is_set())
+
+    def status(self) -> Dict:
+        """ワーカーの生存状況"""
+        return {
+            'configured': self.num_workers,
+            'alive': self.alive_count(),
+            'ready': self.ready_count(),
+            'restarts': self.restarts,
+            'pids': [process.pid for process in self._processes]
+        }
+
+
+class WorkerServices:
+    """ワーカープロセスごとに一度だけ構築されるサービス群"""
+
+    def __init__(self, model_complexity: int = 2, warm_up: bool = True, preprocess_segments: int = 1,
+                 target_short_side: int = 360):
+        """
+        サービス群の初期化（MediaPipe グラフの構築とモデル読み込みはここで一度だけ行う）
+
+        Args:
+            model_complexity: MediaPipe Pose モデルの複雑さ (0, 1, 2)
+            warm_up: ダミーフレームで推論を一度実行してからジョブを受け付けるか
+            preprocess_segments: 前処理を時間区間に分けて並列に実行するプロセス数（1 なら分割しない）
+            target_short_side: 前処理後の短辺の画素数
+        """
+        start_time = time.perf_counter()
+        from services.video_processor import VideoProcessor
+        from services.pose_detector import PoseDetector
+        from services.motion_analyzer import MotionAnalyzer
+        imported_at = time.perf_counter()
+
+        self.video_processor = VideoProcessor()
+        self.video_processor.segments = preprocess_segments
+        self.video_processor.target_short_side = target_short_side
+        self.pose_detector = PoseDetector(model_complexity=model_complexity)
+        self.motion_analyzer = MotionAnalyzer()
+        initialized_at = time.perf_counter()
+
+        # 起動の内訳（秒）: モジュール読み込み・グラフ構築・ウォームアップ
+        self.startup_timings = {
+            'import': imported_at - start_time,
+            'init': initialized_at - imported_at,
+            'warmup': self.warm_up() if warm_up else 0.0
+        }
+        self.startup_seconds = sum(self.startup_timings.values())
+        self.jobs_served = 0
+
+        # 同じバッチのジョブが続く間はアドバイス生成器（API クライアント）を使い回す
+        self._advice_generator = None
+        self._advice_batch_id = None
+
+    @contextmanager
+    def lease(self, batch_id: Optional[str] = None):
+        """
+        1件のジョブ用に初期状態のパイプラインを貸し出す
+
+        ポーズ検出器のトラッキング状態をリセットし、アドバイス生成器は
+        ジョブごとに作り直す（APIキーを次のジョブに持ち越さないため）。
+        ただし直前のジョブと同じバッチ（共通のパラメータ・APIキー）であれば再利用する。
+        返却時に前処理の一時ファイルを削除する。
+
+        Args:
+            batch_id: ジョブのバッチID（単独のジョブは None）
+
+        Yields:
+            AnalysisPipeline
+        """
+        from services.analysis_pipeline import AnalysisPipeline
+
+        self.pose_detector.reset()
+        if batch_id is None or batch_id != self._advice_batch_id:
+            self._advice_generator = _create_advice_generator()
+            self._advice_batch_id = batch_id
+        pipeline = AnalysisPipeline(
+            self.video_processor,
+            self.pose_detector,
+            self.motion_analyzer,
+            self._advice_generator
+        )
+        try:
+            yield pipeline
+        finally:
+            self.video_processor.cleanup_temp_files()
+            self.jobs_served += 1
+
+    def warm_up(self) -> float:
+        """
+        前処理後と同じ解像度のダミーフレームで補正とポーズ推論を一度実行
+
+        Returns:
+            所要時間（秒）
+        """
+        import numpy as np
+
+        start_time = time.perf_counter()
+        width, height = self.video_processor.output_size(*self.video_processor.target_resolution)
+        self.video_processor._enhance_frame_quality(np.zeros((height, width, 3), dtype=np.uint8))
+        self.pose_detector.warm_up(width, height)
+        return time.perf_counter() - start_time
+
+    def close(self):
+        """MediaPipe グラフと一時ディレクトリの解放"""
+        self.pose_detector.close()
+        self.video_processor.close()
+
+
+def _create_advice_generator():
+    """アドバイス生成器の作成（利用できない場合は None）"""
+    try:
+        from services.advice_generator_compact import AdviceGenerator
+    except ImportError:
+        print("Warning: AdviceGenerator not available")
+        return None
+    return AdviceGenerator()
+
+
+class _ProgressRecorder:
+    """ステージ・フレーム進捗をジョブキューに記録（ステージごとのスループットを算出）"""
+
+    def __init__(self, queue: JobQueue, analysis_id: str):
+        self.queue = queue
+        self.analysis_id = analysis_id
+        self.progress: Dict[str, Dict] = {}
+        self._stage_started: Dict[str, float] = {}
+        self._current_stage: Optional[str] = None
+
+    def on_stage(self, stage: str):
+        self._close_stage()
+        self._current_stage = stage
+        self._stage_started[stage] = time.time()
+        self.queue.set_stage(self.analysis_id, stage)
+
+    def finish(self):
+        """最後のステージの所要時間を記録"""
+        self._close_stage()
+
+    def mark_latency(self, name: str, since: float):
+        """
+        ジョブ登録からの経過時間を記録（'time_to_result' / 'time_to_advice'）
+
+        Args:
+            name: 記録名
+            since: 起点の時刻（ジョブの登録時刻）
+        """
+        self.progress.setdefault('latency', {})[name] = round(time.time() - since, 3)
+        self.queue.set_progress(self.analysis_id, self.progress)
+
+    def _close_stage(self):
+        """実行中ステージの所要時間を記録（受付制御の処理時間見積もりに使う）"""
+        stage = self._current_stage
+        if stage is None:
+            return
+        self.progress.setdefault(stage, {})['elapsed'] = round(time.time() - self._stage_started[stage], 3)
+        self.queue.set_progress(self.analysis_id, self.progress)
+        self._current_stage = None
+
+    def on_progress(self, stage: str, processed: int, total: int):
+        started = self._stage_started.setdefault(stage, time.time())
+        elapsed = time.time() - started
+        self.progress[stage] = {
+            'frames': processed,
+            'total_frames': total,
+            'percent': round(min(processed / total, 1.0) * 100, 1) if total > 0 else None,
+            'fps': round(processed / elapsed, 2) if elapsed > 0 else None,
+            'elapsed': round(elapsed, 3)
+        }
+        self.queue.set_progress(self.analysis_id, self.progress)
+
+
+def _record_metrics(metrics: MetricsStore, recorder: _ProgressRecorder, stats: Dict,
+                    state: str, duration: float, kind: str = JobQueue.KIND_ANALYSIS):
+    """1件のジョブの計測値をメトリクスに加算"""
+    for stage, progress in recorder.progress.items():
+        if progress.get('elapsed') is not None:
+            metrics.observe('analyzer_stage_duration_seconds', progress['elapsed'], {'stage': stage})
+    if stats.get('serialize_seconds'):
+        metrics.observe('analyzer_stage_duration_seconds', stats['serialize_seconds'], {'stage': 'serialize'})
+
+    frame_times = stats.get('frame_times') or []
+    if frame_times:
+        metrics.observe_many('analyzer_pose_frame_inference_seconds', frame_times, bounds=FRAME_BUCKETS)
+        metrics.observe('analyzer_pose_video_inference_seconds', sum(frame_times))
+    if stats.get('pose_frames'):
+        metrics.inc('analyzer_pose_frames_total', stats['pose_frames'])
+        metrics.inc('analyzer_pose_detected_frames_total', stats.get('detected_frames', 0))
+    if stats.get('enhancement'):
+        metrics.inc('analyzer_enhancement_profile_total', labels={'profile': stats['enhancement']})
+    for artifact, size in (stats.get('bytes_written') or {}).items():
+        metrics.inc('analyzer_bytes_written_total', size, {'artifact': artifact})
+
+    for name, seconds in (recorder.progress.get('latency') or {}).items():
+        metrics.observe(f'analyzer_{name}_seconds', seconds)
+
+    metrics.observe('analyzer_job_duration_seconds', duration, {'kind': kind, 'state': state})
+    metrics.inc('analyzer_jobs_total', labels={'kind': kind, 'state': state})
+    metrics.inc('analyzer_worker_busy_seconds_total', duration)
+
+
+def _run_job(services: WorkerServices, queue: JobQueue, store: ResultStore, job: Dict,
+             metrics: Optional[MetricsStore] = None):
+    """1件のジョブを実行して結果をキューに記録"""
+    analysis_id = job['analysis_id']
+    params = job['params']
+    recorder = _ProgressRecorder(queue, analysis_id)
+    start_time = time.time()
+    pipeline = None
+    state = JobQueue.FAILED
+
+    def on_result(partial_result: Dict):
+        # アドバイス生成を待たずにスコア・フェーズを状態確認・ダウンロードで参照できるようにする
+        store.record(analysis_id, job['output_dir'], partial_result, status='partial')
+        recorder.mark_latency('time_to_result', job['created_at'])
+
+    # アドバイス生成に渡すパラメータ（解析ジョブ・アドバイス再生成ジョブ共通）
+    advice_params = {
+        'user_level': params.get('user_level', 'intermediate'),
+        'focus_areas': params.get('focus_areas', []),
+        'use_chatgpt': params.get('use_chatgpt', False),
+        'api_key': params.get('api_key', ''),
+        'user_concerns': params.get('user_concerns', '')
+    }
+
+    try:
+        os.makedirs(job['output_dir'], exist_ok=True)
+        with services.lease(job.get('batch_id')) as pipeline:
+            if job.get('kind') == JobQueue.KIND_ADVICE:
+                # 元の解析の動作解析結果からアドバイスだけを再生成（結果ストアは更新しない）
+                result = None
+                pipeline.rerun_advice(
+                    job['output_dir'],
+                    params['advice_version'],
+                    on_stage=recorder.on_stage,
+                    **advice_params
+                )
+            else:
+                result = pipeline.run(
+                    job['video_path'],
+                    job['output_dir'],
+                    on_stage=recorder.on_stage,
+                    on_progress=recorder.on_progress,
+                    trace_sample_every=params.get('trace_sample_every', 0),
+                    pose_precision=params.get('pose_precision', 'float32'),
+                    pose_compress=params.get('pose_compress', True),
+                    fused=params.get('fused_pipeline', True),
+                    write_preprocessed=params.get('write_preprocessed', False),
+                    queue_depth=params.get('frame_queue_depth', 0),
+                    analysis_fps=params.get('analysis_fps', 0.0),
+                    enhancement=params.get('enhancement', 'auto'),
+                    on_result=on_result,
+                    **advice_params
+                )
+        recorder.finish()
+        recorder.mark_latency('time_to_advice', job['created_at'])
+        if result is not None:
+            store.record(analysis_id, job['output_dir'], result)
+        queue.complete(analysis_id)
+        state = JobQueue.DONE
+        print(f"ジョブ完了: {analysis_id}")
+    except Exception as e:
+        traceback.print_exc()
+        recorder.finish()
+        queue.fail(analysis_id, str(e))
+        print(f"ジョブ失敗: {analysis_id} ({e})")
+
+    if metrics is not None:
+        try:
+            stats = pipeline.stats if pipeline is not None else {}
+            _record_metrics(metrics, recorder, stats, state, time.time() - start_time,
+                            job.get('kind') or JobQueue.KIND_ANALYSIS)
+        except Exception as e:
+            print(f"メトリクス記録エラー: {e}")
+
+
+def _worker_main(worker_id: int, db_path: str, poll_interval: float, stop_event,
+                 model_complexity: int = 2, num_threads: int = 1, ready_event=None, preprocess_segments: int = 1,
+                 target_short_side: int = 360):
+    """ワーカープロセスのメインループ"""
+    import cv2
+    cv2.setNumThreads(num_threads)
+
+    queue = JobQueue(db_path)
+    store = ResultStore(db_path, cache_size=0)
+    metrics = MetricsStore(db_path)
+    services = WorkerServices(model_complexity=model_complexity, preprocess_segments=preprocess_segments,
+                              target_short_side=target_short_side)
+    for phase, seconds in services.startup_timings.items():
+        metrics.observe('analyzer_worker_startup_seconds', seconds, {'phase': phase})
+    if ready_event is not None:
+        ready_event.set()
+    print(f"ワーカー{worker_id} 準備完了 (pid={os.getpid()}, 初期化 {services.startup_seconds:.2f}秒: "
+          + ', '.join(f'{phase} {seconds:.2f}秒' for phase, seconds in services.startup_timings.items()) + ")")
+
+    try:
+        while not stop_event.is_set():
+            job = queue.claim(worker_id, os.getpid())
+            if job is None:
+                stop_event.wait(poll_interval)
+                continue
+
+            print(f"ワーカー{worker_id} ジョブ開始: {job['analysis_id']}")
+            _run_job(services, queue, store, job, metrics)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        services.close()
+        queue.close()
@@ -0,0 +1,873 @@
+#!/usr/bin/env python3
+"""
+テニスサービス動作解析 - ベンチマークスクリプト
+解析パイプラインの各処理の所要時間を計測する
+
+使い方:
+    python benchmark.py serialization [--output-folder app/output] [--repeat 20] [--no-orjson]
+    python benchmark.py startup [--repeat 3] [--video sample.mp4] [--json startup_history.jsonl]
+    python benchmark.py pose-format [--output-folder app/output] [--synthetic-frames 600]
+    python benchmark.py pipeline [--video sample.mp4] [--repeat 3]
+    python benchmark.py frame-queue [--video sample.mp4] [--depths 0,2,4,8,16]
+    python benchmark.py sampler [--fps-list 30,60,120,240] [--analysis-fps 12]
+    python benchmark.py enhancement [--video serve.mp4] [--frames 30]
+    python benchmark.py segments [--resolutions 1920x1080,3840x2160] [--segments 1,2,4]
+    python benchmark.py resize [--video serve.mp4] [--short-sides 256,360,480]
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+from typing import Callable, Dict, List
+
+# プロジェクトルートをパスに追加
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+import numpy as np
+
+from services.analysis_pipeline import ANALYZER_VERSION
+from services import json_codec
+from services.json_codec import dumps_bytes, write_json
+from services.pose_format import (LANDMARK_NAMES, POSE_DATA_FILENAME, POSE_JSON_FILENAME, arrays_to_results,
+                                  load_pose_arrays, results_to_arrays, save_pose_arrays)
+
+
+def convert_numpy_types(obj):
+    """
+    NumPy型をPython標準型に変換する再帰関数
+
+    serialization ベンチマークの比較対象（json_codec 導入前の保存・レスポンス処理）。
+    """
+    if isinstance(obj, np.integer):
+        return int(obj)
+    elif isinstance(obj, np.floating):
+        return float(obj)
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, dict):
+        return {key: convert_numpy_types(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_numpy_types(item) for item in obj]
+    elif isinstance(obj, tuple):
+        return tuple(convert_numpy_types(item) for item in obj)
+    else:
+        return obj
+
+
+def load_samples(output_folder: str, filename: str, limit: int) -> List:
+    """出力フォルダから解析結果のサンプルを読み込む"""
+    samples = []
+    for entry in sorted(os.listdir(output_folder)):
+        file_path = os.path.join(output_folder, entry, filename)
+        if not os.path.isfile(file_path):
+            continue
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                samples.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+        if len(samples) >= limit:
+            break
+    return samples
+
+
+def to_numpy_values(obj):
+    """
+    数値を NumPy スカラーに置き換え（動作解析直後の結果を再現する）
+
+    bool はそのまま残す（動作解析の判定結果は Python の bool で、従来の変換処理も np.bool_ を扱わない）。
+    """
+    if isinstance(obj, bool):
+        return obj
+    if isinstance(obj, int):
+        return np.int64(obj)
+    if isinstance(obj, float):
+        return np.float64(obj)
+    if isinstance(obj, dict):
+        return {key: to_numpy_values(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [to_numpy_values(item) for item in obj]
+    return obj
+
+
+def time_per_item(func: Callable, items: List, repeat: int) -> float:
+    """1件あたりの平均所要時間（ミリ秒）"""
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            func(item)
+    return (time.perf_counter() - start_time) * 1000 / (repeat * len(items))
+
+
+def benchmark_serialization(args):
+    """解析結果の JSON 化（変更前: 変換2回 + シリアライズ3回 / 変更後: 一回パス）"""
+    if args.no_orjson:
+        json_codec.orjson_available = False
+    results = {}
+    for label, filename in (('analysis_result', 'analysis_result.json'), ('pose_data', 'pose_data.json')):
+        if label == 'pose_data' and not args.include_pose:
+            continue
+
+        samples = [to_numpy_values(s) for s in load_samples(args.output_folder, filename, args.limit)]
+        if not samples:
+            print(f"⚠️ サンプルが見つかりません: {args.output_folder}/*/{filename}")
+            continue
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, filename)
+
+            def legacy(data):
+                # 旧 analyze_video: 保存用に変換して indent=2 で書き込み、
+                # サイズ計測用に dumps、レスポンス用に再度変換して jsonify
+                converted = convert_numpy_types(data)
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    json.dump(converted, f, indent=2, ensure_ascii=False)
+                len(json.dumps(converted, ensure_ascii=False))
+                json.dumps(convert_numpy_types(data), indent=None, separators=(',', ':'))
+
+            def single_pass(data):
+                # 保存したバイト列をそのままレスポンス本文として使う
+                len(write_json(data, file_path))
+
+            before_ms = time_per_item(legacy, samples, args.repeat)
+            after_ms = time_per_item(single_pass, samples, args.repeat)
+
+        sizes = [len(dumps_bytes(s)) for s in samples]
+        results[label] = {
+            'samples': len(samples),
+            'avg_bytes': sum(sizes) // len(sizes),
+            'before_ms': before_ms,
+            'after_ms': after_ms
+        }
+
+        print(f"\n📄 {label} ({len(samples)}件, 平均 {results[label]['avg_bytes'] / 1024:.1f}KB)")
+        print(f"  変更前: {before_ms:.3f} ms/解析")
+        print(f"  変更後: {after_ms:.3f} ms/解析 ({before_ms / after_ms:.1f}倍)")
+
+    print(f"\nエンコーダー: {'orjson' if json_codec.orjson_available else 'json (標準ライブラリ)'}")
+    return results
+
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app')
+
+# API プロセスの起動（main.py の読み込み）
+API_STARTUP_SCRIPT = '''
+import json, time
+start = time.perf_counter()
+import main
+print(json.dumps({'api_import': time.perf_counter() - start}))
+'''
+
+# ワーカーの起動と最初の2フレームの推論時間
+WORKER_STARTUP_SCRIPT = '''
+import json, sys, time
+import cv2
+import numpy as np
+start = time.perf_counter()
+from services.worker_pool import WorkerServices
+services = WorkerServices(model_complexity={model_complexity}, warm_up={warm_up})
+total = time.perf_counter() - start
+
+processor = services.video_processor
+width, height = processor.output_size(*processor.target_resolution)
+frame = np.zeros((height, width, 3), dtype=np.uint8)
+video = {video!r}
+if video:
+    cap = cv2.VideoCapture(video)
+    ret, first = cap.read()
+    cap.release()
+    if ret:
+        frame = cv2.resize(first, processor.output_size(first.shape[1], first.shape[0]),
+                           interpolation=processor.interpolation)
+
+timings = dict(services.startup_timings, total=total)
+for key in ('first_frame', 'second_frame'):
+    frame_start = time.perf_counter()
+    services.pose_detector.detect_pose(frame)
+    timings[key] = time.perf_counter() - frame_start
+services.close()
+print(json.dumps(timings))
+'''
+
+
+def run_fresh(script: str, temp_dir: str) -> Dict[str, float]:
+    """新しいインタープリターでスクリプトを実行して最終行の JSON を返す"""
+    python_path = os.pathsep.join(filter(None, [APP_DIR, os.environ.get('PYTHONPATH')]))
+    env = dict(os.environ, PYTHONPATH=python_path, ANALYZER_DB_PATH=os.path.join(temp_dir, 'analyzer.db'))
+    completed = subprocess.run([sys.executable, '-c', script], cwd=temp_dir, env=env,
+                               capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def benchmark_startup(args):
+    """API プロセスとワーカーの起動時間（ウォームアップなし/あり）と最初のフレームの推論時間"""
+    video = os.path.abspath(args.video) if args.video else ''
+    variants = {
+        'api': API_STARTUP_SCRIPT,
+        'worker_cold': WORKER_STARTUP_SCRIPT.format(model_complexity=args.model_complexity,
+                                                    warm_up=False, video=video),
+        'worker_warm': WORKER_STARTUP_SCRIPT.format(model_complexity=args.model_complexity,
+                                                    warm_up=True, video=video)
+    }
+
+    results = {}
+    for name, script in variants.items():
+        runs = []
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as temp_dir:
+                try:
+                    runs.append(run_fresh(script, temp_dir))
+                except subprocess.CalledProcessError as e:
+                    print(f"⚠️ {name} の計測に失敗しました:\n{e.stderr}")
+                    break
+        if not runs:
+            continue
+
+        results[name] = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        print(f"\n🚀 {name} (中央値, {len(runs)}回)")
+        for key, seconds in results[name].items():
+            print(f"  {key}: {seconds * 1000:.1f} ms")
+
+    if 'worker_cold' in results and 'worker_warm' in results:
+        cold, warm = results['worker_cold'], results['worker_warm']
+        print(f"\n最初のジョブの最初のフレーム: {cold['first_frame'] * 1000:.1f} ms → {warm['first_frame'] * 1000:.1f} ms"
+              f"（ウォームアップ {warm['warmup'] * 1000:.1f} ms は起動時に実行）")
+
+    if args.json:
+        # リリースごとの推移を追えるように1行ずつ追記する
+        record = {
+            'timestamp': time.time(),
+            'analyzer_version': ANALYZER_VERSION,
+            'python': sys.version.split()[0],
+            'model_complexity': args.model_complexity,
+            'results': results
+        }
+        with open(args.json, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        print(f"\n結果を追記しました: {args.json}")
+    return results
+
+
+def synthetic_pose_results(frames: int, detection_rate: float = 0.9, seed: int = 0) -> List[Dict]:
+    """ランダムなポーズ検出結果（サンプルがない場合の計測用）"""
+    rng = np.random.default_rng(seed)
+    pose_results = []
+    for frame_number in range(frames):
+        has_pose = bool(rng.random() < detection_rate)
+        result = {'frame_number': frame_number, 'timestamp': frame_number / 30.0, 'landmarks': {},
+                  'visibility_scores': {}, 'detection_confidence': 0.0, 'has_pose': has_pose}
+        if has_pose:
+            for name in LANDMARK_NAMES:
+                x, y, z, visibility = (float(v) for v in rng.uniform([0, 0, -0.5, 0], [1, 1, 0.5, 1]))
+                result['landmarks'][name] = {'x': x, 'y': y, 'z': z, 'visibility': visibility}
+                result['visibility_scores'][name] = visibility
+            result['detection_confidence'] = float(rng.uniform(0.5, 1.0))
+        pose_results.append(result)
+    return pose_results
+
+
+def load_pose_samples(output_folder: str, limit: int) -> List[List[Dict]]:
+    """出力フォルダからポーズ検出結果を読み込む（バイナリ形式・JSON 形式のどちらでも）"""
+    samples = []
+    if not os.path.isdir(output_folder):
+        return samples
+    for entry in sorted(os.listdir(output_folder)):
+        binary_path = os.path.join(output_folder, entry, POSE_DATA_FILENAME)
+        json_path = os.path.join(output_folder, entry, POSE_JSON_FILENAME)
+        try:
+            if os.path.isfile(binary_path):
+                samples.append(arrays_to_results(load_pose_arrays(binary_path)))
+            elif os.path.isfile(json_path):
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    samples.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+        if len(samples) >= limit:
+            break
+    return samples
+
+
+def benchmark_pose_format(args):
+    """ポーズデータの形式ごとのファイルサイズ・保存時間・読み込み時間・量子化誤差"""
+    samples = load_pose_samples(args.output_folder, args.limit)
+    if not samples:
+        print(f"⚠️ サンプルが見つからないため {args.synthetic_frames} フレームのランダムデータで計測します")
+        samples = [synthetic_pose_results(args.synthetic_frames)]
+    frames = sum(len(sample) for sample in samples)
+
+    variants = {
+        'json (indent=2, 変更前)': ('json_indent', None, None),
+        'json': ('json', None, None),
+        'float32': ('npz', 'float32', False),
+        'float32 + 圧縮': ('npz', 'float32', True),
+        'int16': ('npz', 'int16', False),
+        'int16 + 圧縮': ('npz', 'int16', True)
+    }
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for label, (kind, precision, compress) in variants.items():
+            path = os.path.join(temp_dir, 'pose_data.npz' if kind == 'npz' else 'pose_data.json')
+            save_ms, load_ms, dict_ms, size, max_error = 0.0, 0.0, 0.0, 0, 0.0
+            for sample in samples:
+                reference = results_to_arrays(sample)
+
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    if kind == 'json_indent':
+                        with open(path, 'w', encoding='utf-8') as f:
+                            json.dump(sample, f, indent=2, ensure_ascii=False)
+                    elif kind == 'json':
+                        write_json(sample, path)
+                    else:
+                        save_pose_arrays(results_to_arrays(sample), path, precision=precision, compress=compress)
+                save_ms += (time.perf_counter() - start) * 1000 / args.repeat
+                size += os.path.getsize(path)
+
+                # 読み込みは解析で使う配列まで（JSON は辞書のリストからの変換を含む）
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    if kind == 'npz':
+                        arrays = load_pose_arrays(path)
+                    else:
+                        with open(path, 'rb') as f:
+                            arrays = results_to_arrays(json.loads(f.read()))
+                load_ms += (time.perf_counter() - start) * 1000 / args.repeat
+
+                # 従来の辞書のリストまで（JSON ダウンロード・旧形式の利用箇所）
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    if kind == 'npz':
+                        arrays_to_results(load_pose_arrays(path))
+                    else:
+                        with open(path, 'rb') as f:
+                            json.loads(f.read())
+                dict_ms += (time.perf_counter() - start) * 1000 / args.repeat
+
+                mask = reference['has_pose']
+                if mask.any():
+                    max_error = max(max_error, float(np.abs(
+                        arrays['landmarks'][mask] - reference['landmarks'][mask]
+                    ).max()))
+
+            results[label] = {
+                'bytes': size,
+                'bytes_per_frame': size / frames if frames else 0.0,
+                'save_ms': save_ms,
+                'load_ms': load_ms,
+                'load_dicts_ms': dict_ms,
+                'max_error': max_error
+            }
+
+    baseline = results['json (indent=2, 変更前)']
+    print(f"\n🦴 ポーズデータ形式 ({len(samples)}件, {frames}フレーム, {args.repeat}回平均)")
+    print(f"  {'形式':<24}{'サイズ':>10}{'比率':>8}{'保存':>10}{'読込(配列)':>12}{'読込(辞書)':>12}{'最大誤差':>11}")
+    for label, result in results.items():
+        print(f"  {label:<24}{result['bytes'] / 1024:>8.1f}KB{baseline['bytes'] / result['bytes']:>7.1f}x"
+              f"{result['save_ms']:>8.2f}ms{result['load_ms']:>10.2f}ms{result['load_dicts_ms']:>10.2f}ms"
+              f"{result['max_error']:>11.2e}")
+    return results
+
+
+def synthetic_clip(path: str, width: int = 1920, height: int = 1080, fps: float = 30.0,
+                   seconds: float = 5.0) -> str:
+    """動く図形とノイズの動画を作成（計測用の動画がない場合のデコード・前処理の負荷用）"""
+    import cv2
+
+    rng = np.random.default_rng(0)
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    for index in range(int(fps * seconds)):
+        frame = background.copy()
+        x = int(width * (0.2 + 0.6 * index / (fps * seconds)))
+        cv2.circle(frame, (x, height // 3), height // 12, (255, 255, 255), -1)
+        cv2.rectangle(frame, (x - width // 40, height // 3), (x + width // 40, height * 3 // 4), (40, 40, 200), -1)
+        out.write(frame)
+    out.release()
+    return path
+
+
+def benchmark_pipeline(args):
+    """前処理→ポーズ検出の2パス方式（前処理済み動画を経由）と融合モード（メモリ上で受け渡し）の比較"""
+    from services.pose_detector import PoseDetector
+    from services.video_processor import VideoProcessor
+
+    processor = VideoProcessor()
+    detector = PoseDetector(model_complexity=args.model_complexity)
+    detector.warm_up()
+
+    def two_pass(video, temp_dir):
+        preprocessed_path = os.path.join(temp_dir, 'preprocessed_video.mp4')
+        processor.preprocess_video(video, preprocessed_path)
+        return detector.process_video(preprocessed_path, os.path.join(temp_dir, 'pose_visualization.mp4'))
+
+    def fused(video, temp_dir, write_preprocessed=False):
+        preprocessed_path = os.path.join(temp_dir, 'preprocessed_video.mp4') if write_preprocessed else None
+        frames = processor.stream_frames(video, preprocessed_path)
+        return detector.process_frames(frames, frames.fps, frames.frame_count,
+                                       os.path.join(temp_dir, 'pose_visualization.mp4'))
+
+    variants = {
+        '2パス (変更前)': two_pass,
+        '融合': fused,
+        '融合 + 前処理済み動画': lambda video, temp_dir: fused(video, temp_dir, write_preprocessed=True)
+    }
+
+    results = {}
+    with tempfile.TemporaryDirectory() as clip_dir:
+        video = args.video
+        if not video:
+            print(f"⚠️ 動画が指定されていないため {args.width}x{args.height} {args.seconds}秒の合成動画で計測します")
+            video = synthetic_clip(os.path.join(clip_dir, 'synthetic.mp4'), args.width, args.height,
+                                   seconds=args.seconds)
+
+        sequences = {}
+        for label, run in variants.items():
+            seconds, written = [], 0
+            for _ in range(args.repeat):
+                with tempfile.TemporaryDirectory() as temp_dir:
+                    detector.reset()
+                    start = time.perf_counter()
+                    sequences[label] = run(video, temp_dir)
+                    seconds.append(time.perf_counter() - start)
+                    written = sum(os.path.getsize(os.path.join(temp_dir, name)) for name in os.listdir(temp_dir))
+            sequence = sequences[label]
+            results[label] = {
+                'seconds': statistics.median(seconds),
+                'frames': len(sequence),
+                'detected_frames': sequence.detected_count,
+                'bytes_written': written
+            }
+
+        # 融合モードは非可逆な再エンコードを経ないため、ランドマークは2パス方式とわずかに異なる
+        reference = sequences['2パス (変更前)']
+        for label, sequence in sequences.items():
+            frames = min(len(reference), len(sequence))
+            both = reference.has_pose[:frames] & sequence.has_pose[:frames]
+            results[label]['max_landmark_diff'] = float(np.abs(
+                reference.landmarks[:frames][both, :, :2] - sequence.landmarks[:frames][both, :, :2]
+            ).max()) if both.any() else 0.0
+
+    detector.close()
+
+    baseline = results['2パス (変更前)']
+    print(f"\n🎬 前処理＋ポーズ検出 ({os.path.basename(args.video) or '合成動画'}, 中央値, {args.repeat}回)")
+    print(f"  {'方式':<22}{'所要時間':>10}{'比率':>8}{'フレーム':>8}{'検出':>6}{'書き込み':>12}{'座標差(最大)':>14}")
+    for label, result in results.items():
+        print(f"  {label:<22}{result['seconds'] * 1000:>8.0f}ms{baseline['seconds'] / result['seconds']:>7.2f}x"
+              f"{result['frames']:>8}{result['detected_frames']:>6}{result['bytes_written'] / 1024:>10.0f}KB"
+              f"{result['max_landmark_diff']:>14.4f}")
+    return results
+
+
+# 前処理＋ポーズ検出1回分の所要時間とピークメモリ（設定ごとに新しいプロセスで計測する）
+FRAME_QUEUE_SCRIPT = '''
+import json, os, resource, tempfile, time
+from services.pose_detector import PoseDetector
+from services.video_processor import VideoProcessor
+processor = VideoProcessor()
+detector = PoseDetector(model_complexity={model_complexity})
+detector.warm_up()
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+with tempfile.TemporaryDirectory() as temp_dir:
+    visualization_path = os.path.join(temp_dir, 'pose_visualization.mp4')
+    start = time.perf_counter()
+    if {fused}:
+        frames = processor.stream_frames({video!r}, queue_depth={depth})
+        sequence = detector.process_frames(frames, frames.fps, frames.frame_count, visualization_path,
+                                           queue_depth={depth})
+    else:
+        preprocessed_path = os.path.join(temp_dir, 'preprocessed_video.mp4')
+        processor.preprocess_video({video!r}, preprocessed_path, queue_depth={depth})
+        sequence = detector.process_video(preprocessed_path, visualization_path, queue_depth={depth})
+    seconds = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'seconds': seconds, 'frames': len(sequence), 'baseline_kb': baseline, 'peak_kb': peak}}))
+'''
+
+
+def benchmark_frame_queue(args):
+    """デコード先読み・非同期書き込みのキューの深さごとの処理速度とピークメモリ"""
+    from services.video_processor import VideoProcessor
+
+    with tempfile.TemporaryDirectory() as clip_dir:
+        video = os.path.abspath(args.video) if args.video else ''
+        if not video:
+            print(f"⚠️ 動画が指定されていないため {args.width}x{args.height} {args.seconds}秒の合成動画で計測します")
+            video = synthetic_clip(os.path.join(clip_dir, 'synthetic.mp4'), args.width, args.height,
+                                   seconds=args.seconds)
+        metadata = VideoProcessor().get_video_metadata(video) or {}
+        source_frames = metadata.get('frame_count', 0)
+
+        results = {}
+        for fused in (False, True):
+            for depth in (int(depth) for depth in args.depths.split(',')):
+                label = f"{'融合' if fused else '2パス'} depth={depth}"
+                script = FRAME_QUEUE_SCRIPT.format(model_complexity=args.model_complexity, fused=fused,
+                                                   video=video, depth=depth)
+                runs = []
+                for _ in range(args.repeat):
+                    with tempfile.TemporaryDirectory() as temp_dir:
+                        try:
+                            runs.append(run_fresh(script, temp_dir))
+                        except subprocess.CalledProcessError as e:
+                            print(f"⚠️ {label} の計測に失敗しました:\n{e.stderr}")
+                            break
+                if not runs:
+                    continue
+                seconds = statistics.median(run['seconds'] for run in runs)
+                results[label] = {
+                    'seconds': seconds,
+                    'source_fps': source_frames / seconds if seconds > 0 else 0.0,
+                    'frames': runs[0]['frames'],
+                    # 推論モデルの読み込み後からの増分（Linux の ru_maxrss は KB）
+                    'peak_rss_mb': max(run['peak_kb'] for run in runs) / 1024,
+                    'pipeline_rss_mb': max(run['peak_kb'] - run['baseline_kb'] for run in runs) / 1024
+                }
+
+    print(f"\n🧵 デコード先読み・非同期書き込み ({os.path.basename(args.video) or '合成動画'}, "
+          f"{source_frames}フレーム, 中央値, {args.repeat}回)")
+    print(f"  {'設定':<18}{'所要時間':>10}{'元動画fps':>10}{'ピークRSS':>12}{'増分':>10}")
+    for label, result in results.items():
+        print(f"  {label:<18}{result['seconds'] * 1000:>8.0f}ms{result['source_fps']:>10.1f}"
+              f"{result['peak_rss_mb']:>10.0f}MB{result['pipeline_rss_mb']:>8.0f}MB")
+    return results
+
+
+def benchmark_sampler(args):
+    """全フレームを read() して間引く方式（変更前）と grab() で読み飛ばす方式のデコード時間"""
+    import cv2
+    from services.video_processor import VideoProcessor, sampling_step
+
+    processor = VideoProcessor()
+
+    def read_all(video, step):
+        # 変更前: 読み捨てるフレームも画素まで変換する
+        cap = cv2.VideoCapture(video)
+        index, kept, next_kept = 0, 0, 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index >= next_kept:
+                kept += 1
+                next_kept = round(kept * step)
+            index += 1
+        cap.release()
+        return kept
+
+    def grab(video, target_fps):
+        frames = processor.stream_frames(video, target_fps=target_fps)
+        # 縮小・補正を除いたデコードだけを計測する
+        return sum(1 for _ in frames._decode(frames._cap))
+
+    results = {}
+    with tempfile.TemporaryDirectory() as clip_dir:
+        for fps in (float(value) for value in args.fps_list.split(',')):
+            video = synthetic_clip(os.path.join(clip_dir, f'synthetic_{fps:.0f}fps.mp4'), args.width, args.height,
+                                   fps=fps, seconds=args.seconds)
+            for target_fps in (0.0, args.analysis_fps):
+                step = sampling_step(fps, processor.frame_skip, target_fps)
+                label = f"{fps:.0f}fps → {'1/' + str(processor.frame_skip) if not target_fps else f'{target_fps:g}fps'}"
+                timings = {}
+                for name, run in (('read', lambda: read_all(video, step)), ('grab', lambda: grab(video, target_fps))):
+                    seconds = []
+                    for _ in range(args.repeat):
+                        start = time.perf_counter()
+                        kept = run()
+                        seconds.append(time.perf_counter() - start)
+                    timings[name] = statistics.median(seconds)
+                results[label] = {'source_frames': int(fps * args.seconds), 'kept_frames': kept,
+                                  'read_ms': timings['read'] * 1000, 'grab_ms': timings['grab'] * 1000}
+
+    print(f"\n🎞️ フレームの間引き（{args.width}x{args.height} {args.seconds:g}秒の合成動画, デコードのみ, 中央値, {args.repeat}回)")
+    print(f"  {'元動画 → 解析':<20}{'元':>6}{'残す':>6}{'read()':>10}{'grab()':>10}{'比率':>7}")
+    for label, result in results.items():
+        print(f"  {label:<20}{result['source_frames']:>6}{result['kept_frames']:>6}{result['read_ms']:>8.0f}ms"
+              f"{result['grab_ms']:>8.0f}ms{result['read_ms'] / result['grab_ms']:>6.2f}x")
+    return results
+
+
+# 撮影条件の再現（元の解像度のフレームに適用してから前処理の解像度に縮小する）
+ENHANCEMENT_CONDITIONS = {
+    '通常': lambda frame, rng: frame,
+    '暗い': lambda frame, rng: frame * 0.25,
+    '低コントラスト': lambda frame, rng: 128 + (frame - 128) * 0.3,
+    'ノイズ': lambda frame, rng: frame + rng.normal(0, 12, frame.shape),
+    '暗い＋ノイズ': lambda frame, rng: frame * 0.25 + rng.normal(0, 8, frame.shape)
+}
+
+
+def benchmark_enhancement(args):
+    """補正のプロファイルごとの1フレームあたりの処理時間と、撮影条件ごとのポーズ検出率・自動選択の結果"""
+    import cv2
+    from services.frame_enhancer import ENHANCEMENT_PROFILES, choose_profile, measure_frames
+    from services.pose_detector import PoseDetector
+    from services.video_processor import VideoProcessor, sampling_step
+
+    processor = VideoProcessor()
+    detector = PoseDetector(model_complexity=args.model_complexity)
+    detector.warm_up()
+
+    with tempfile.TemporaryDirectory() as clip_dir:
+        video = args.video
+        if not video:
+            print("⚠️ 動画が指定されていないため合成動画で計測します（人物が映っていないため検出率は参考になりません）")
+            video = synthetic_clip(os.path.join(clip_dir, 'synthetic.mp4'), args.width, args.height,
+                                   seconds=args.seconds)
+
+        # 前処理と同じ間隔で元の解像度のフレームを取り出す
+        cap = cv2.VideoCapture(video)
+        step = sampling_step(cap.get(cv2.CAP_PROP_FPS), processor.frame_skip)
+        width, height = processor.output_size(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                                              int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        source_frames, index, next_kept = [], 0, 0
+        while len(source_frames) < args.frames and cap.grab():
+            if index >= next_kept:
+                source_frames.append(cap.retrieve()[1].astype(np.float32))
+                next_kept = round(len(source_frames) * step)
+            index += 1
+        cap.release()
+
+    results = {}
+    for condition, degrade in ENHANCEMENT_CONDITIONS.items():
+        rng = np.random.default_rng(0)
+        frames = [cv2.resize(np.clip(degrade(frame, rng), 0, 255).astype(np.uint8), (width, height),
+                             interpolation=processor.interpolation)
+                  for frame in source_frames]
+        stats = measure_frames(frames[::max(1, len(frames) // processor.enhancement_samples)])
+        row = {'auto': choose_profile(stats), 'stats': stats, 'profiles': {}}
+        for profile in ENHANCEMENT_PROFILES:
+            start = time.perf_counter()
+            enhanced = [processor.enhancer.enhance(frame, profile) for frame in frames]
+            enhance_ms = (time.perf_counter() - start) * 1000 / len(frames)
+            detector.reset()
+            sequence = detector.process_frames(iter(enhanced), 10.0, len(enhanced))
+            row['profiles'][profile] = {'enhance_ms': enhance_ms, 'detected_frames': sequence.detected_count,
+                                        'confidence': float(sequence.detection_confidence.mean())}
+        results[condition] = row
+    detector.close()
+
+    print(f"\n✨ フレーム補正（{os.path.basename(args.video) or '合成動画'}, {len(source_frames)}フレーム, "
+          f"{width}x{height}, 検出数/フレーム数 と 1フレームの補正時間）")
+    print(f"  {'撮影条件':<12}" + ''.join(f"{profile:>16}" for profile in ENHANCEMENT_PROFILES) + f"{'自動選択':>10}")
+    for condition, row in results.items():
+        cells = ''.join(f"{cell['detected_frames']:>5}/{len(source_frames):<3}{cell['enhance_ms']:>6.1f}ms"
+                        for cell in row['profiles'].values())
+        print(f"  {condition:<12}{cells}{row['auto']:>10}")
+    return results
+
+
+def benchmark_segments(args):
+    """前処理を時間区間ごとに別プロセスで実行した場合と1プロセスの場合の所要時間"""
+    from services.video_processor import VideoProcessor
+
+    results = {}
+    with tempfile.TemporaryDirectory() as clip_dir:
+        for resolution in args.resolutions.split(','):
+            width, height = (int(value) for value in resolution.split('x'))
+            video = args.video or synthetic_clip(os.path.join(clip_dir, f'synthetic_{resolution}.mp4'), width, height,
+                                                 seconds=args.seconds)
+            reference = None
+            for segments in (int(value) for value in args.segments.split(',')):
+                processor = VideoProcessor()
+                processor.segments = segments
+                processor.min_segment_seconds = 0.0
+                if segments > 1:
+                    processor.segment_pool(segments)  # プロセスの起動はワーカーの起動時に済んでいるものとして除く
+                seconds = []
+                for _ in range(args.repeat):
+                    frames = processor.stream_frames(video, enhancement=args.enhancement)
+                    start = time.perf_counter()
+                    output = [frame for frame in frames]
+                    seconds.append(time.perf_counter() - start)
+                processor.close()
+
+                # 区間に分けても前処理の結果は1プロセスと同じになる
+                reference = reference if reference is not None else output
+                identical = len(output) == len(reference) and all(
+                    np.array_equal(frame, expected) for frame, expected in zip(output, reference))
+                results[f'{resolution} × {segments}'] = {'resolution': resolution, 'segments': frames.segments,
+                                                        'seconds': statistics.median(seconds),
+                                                        'frames': len(output), 'identical': identical}
+            if args.video:
+                break
+
+    print(f"\n🧩 区間ごとの並列前処理（CPU コア数 {os.cpu_count()}, 補正 {args.enhancement}, 中央値, {args.repeat}回)")
+    print(f"  {'解像度':<12}{'区間':>6}{'所要時間':>10}{'比率':>8}{'フレーム':>8}{'一致':>6}")
+    baselines = {}
+    for result in results.values():
+        baseline = baselines.setdefault(result['resolution'], result['seconds'])
+        print(f"  {result['resolution']:<12}{result['segments']:>6}{result['seconds'] * 1000:>8.0f}ms"
+              f"{baseline / result['seconds']:>7.2f}x{result['frames']:>8}{'○' if result['identical'] else '×':>6}")
+    return results
+
+
+def benchmark_resize(args):
+    """元動画の解像度ごとに、従来の固定の縮小率と短辺の目標画素数での縮小・補正・推論の時間とポーズ検出数"""
+    import cv2
+    from services.pose_detector import PoseDetector
+    from services.video_processor import VideoProcessor, output_size, sampling_step
+
+    processor = VideoProcessor()
+    detector = PoseDetector(model_complexity=args.model_complexity)
+    detector.warm_up()
+
+    with tempfile.TemporaryDirectory() as clip_dir:
+        video = args.video
+        if not video:
+            print("⚠️ 動画が指定されていないため合成動画で計測します（人物が映っていないため検出数は参考になりません）")
+            video = synthetic_clip(os.path.join(clip_dir, 'synthetic.mp4'), 1920, 1080, seconds=args.seconds)
+
+        # 前処理と同じ間隔で取り出したフレームを、各解像度で撮影した動画の代わりに使う
+        cap = cv2.VideoCapture(video)
+        step = sampling_step(cap.get(cv2.CAP_PROP_FPS), processor.frame_skip)
+        clip_frames, index, next_kept = [], 0, 0
+        while len(clip_frames) < args.frames and cap.grab():
+            if index >= next_kept:
+                clip_frames.append(cap.retrieve()[1])
+                next_kept = round(len(clip_frames) * step)
+            index += 1
+        cap.release()
+
+    interpolations = {'linear': cv2.INTER_LINEAR, 'area': cv2.INTER_AREA}
+    policies = [('×0.3 (変更前)', 0, 0.3)] + [(f'短辺 {short_side}', short_side, 0.0)
+                                           for short_side in (int(value) for value in args.short_sides.split(','))]
+    results = []
+    for resolution in args.resolutions.split(','):
+        width, height = (int(value) for value in resolution.split('x'))
+        sources = [cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA) for frame in clip_frames]
+        for label, short_side, scale in policies:
+            size = output_size(width, height, short_side, scale)
+            for name, interpolation in interpolations.items():
+                start = time.perf_counter()
+                resized = [cv2.resize(frame, size, interpolation=interpolation) for frame in sources]
+                resize_ms = (time.perf_counter() - start) * 1000 / len(sources)
+                start = time.perf_counter()
+                enhanced = [processor.enhancer.enhance(frame, args.enhancement) for frame in resized]
+                enhance_ms = (time.perf_counter() - start) * 1000 / len(sources)
+                detector.reset()
+                start = time.perf_counter()
+                sequence = detector.process_frames(iter(enhanced), 10.0, len(enhanced))
+                pose_ms = (time.perf_counter() - start) * 1000 / len(sources)
+                results.append({'resolution': resolution, 'policy': label, 'interpolation': name,
+                                'size': f'{size[0]}x{size[1]}', 'resize_ms': resize_ms, 'enhance_ms': enhance_ms,
+                                'pose_ms': pose_ms, 'detected_frames': sequence.detected_count,
+                                'confidence': float(sequence.detection_confidence.mean())})
+    detector.close()
+
+    print(f"\n📐 前処理の縮小（{os.path.basename(args.video) or '合成動画'}, {len(clip_frames)}フレーム, "
+          f"補正 {args.enhancement}, 1フレームあたり）")
+    print(f"  {'元動画':<11}{'縮小':<14}{'補間':<8}{'出力':>10}{'縮小':>9}{'補正':>9}{'推論':>9}{'検出':>8}{'信頼度':>8}")
+    for result in results:
+        print(f"  {result['resolution']:<11}{result['policy']:<14}{result['interpolation']:<8}{result['size']:>10}"
+              f"{result['resize_ms']:>7.2f}ms{result['enhance_ms']:>7.1f}ms{result['pose_ms']:>7.1f}ms"
+              f"{result['detected_frames']:>5}/{len(clip_frames):<3}{result['confidence']:>7.2f}")
+    return results
+
+
+def main():
+    """ベンチマークのメイン関数"""
+    parser = argparse.ArgumentParser(description='テニスサービス動作解析のベンチマーク')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serialization = subparsers.add_parser('serialization', help='解析結果の JSON 化')
+    serialization.add_argument('--output-folder', default=os.path.join(os.path.dirname(__file__), 'app', 'output'),
+                               help='サンプルの解析出力フォルダ')
+    serialization.add_argument('--limit', type=int, default=10, help='使用するサンプル数')
+    serialization.add_argument('--repeat', type=int, default=20, help='繰り返し回数')
+    serialization.add_argument('--include-pose', action='store_true', help='pose_data.json も計測する')
+    serialization.add_argument('--no-orjson', action='store_true', help='orjson があっても標準ライブラリで計測する')
+    serialization.set_defaults(func=benchmark_serialization)
+
+    startup = subparsers.add_parser('startup', help='API プロセス・ワーカーの起動時間')
+    startup.add_argument('--repeat', type=int, default=3, help='繰り返し回数（毎回新しいプロセスで計測）')
+    startup.add_argument('--model-complexity', type=int, default=int(os.environ.get('POSE_MODEL_COMPLEXITY', '2')),
+                         help='MediaPipe Pose モデルの複雑さ')
+    startup.add_argument('--video', default='', help='最初のフレームの推論に使う動画（省略時は黒画像）')
+    startup.add_argument('--json', default='', help='結果を追記する JSON Lines ファイル')
+    startup.set_defaults(func=benchmark_startup)
+
+    pose_format = subparsers.add_parser('pose-format', help='ポーズデータの形式ごとのサイズ・読み込み時間')
+    pose_format.add_argument('--output-folder', default=os.path.join(os.path.dirname(__file__), 'app', 'output'),
+                             help='サンプルの解析出力フォルダ')
+    pose_format.add_argument('--limit', type=int, default=5, help='使用するサンプル数')
+    pose_format.add_argument('--repeat', type=int, default=5, help='繰り返し回数')
+    pose_format.add_argument('--synthetic-frames', type=int, default=600,
+                             help='サンプルがない場合に生成するフレーム数')
+    pose_format.set_defaults(func=benchmark_pose_format)
+
+    pipeline = subparsers.add_parser('pipeline', help='前処理＋ポーズ検出の2パス方式と融合モードの比較')
+    pipeline.add_argument('--video', default='', help='計測に使う動画（省略時は合成動画）')
+    pipeline.add_argument('--width', type=int, default=1920, help='合成動画の幅')
+    pipeline.add_argument('--height', type=int, default=1080, help='合成動画の高さ')
+    pipeline.add_argument('--seconds', type=float, default=5.0, help='合成動画の長さ（秒）')
+    pipeline.add_argument('--repeat', type=int, default=3, help='繰り返し回数')
+    pipeline.add_argument('--model-complexity', type=int, default=int(os.environ.get('POSE_MODEL_COMPLEXITY', '2')),
+                          help='MediaPipe Pose モデルの複雑さ')
+    pipeline.set_defaults(func=benchmark_pipeline)
+
+    frame_queue = subparsers.add_parser('frame-queue', help='デコード先読み・非同期書き込みのキューの深さごとの比較')
+    frame_queue.add_argument('--video', default='', help='計測に使う動画（省略時は合成動画）')
+    frame_queue.add_argument('--width', type=int, default=1920, help='合成動画の幅')
+    frame_queue.add_argument('--height', type=int, default=1080, help='合成動画の高さ')
+    frame_queue.add_argument('--seconds', type=float, default=5.0, help='合成動画の長さ（秒）')
+    frame_queue.add_argument('--depths', default='0,2,4,8,16', help='計測するキューの深さ（カンマ区切り、0 はスレッドなし）')
+    frame_queue.add_argument('--repeat', type=int, default=2, help='繰り返し回数（毎回新しいプロセスで計測）')
+    frame_queue.add_argument('--model-complexity', type=int,
+                             default=int(os.environ.get('POSE_MODEL_COMPLEXITY', '2')),
+                             help='MediaPipe Pose モデルの複雑さ')
+    frame_queue.set_defaults(func=benchmark_frame_queue)
+
+    sampler = subparsers.add_parser('sampler', help='フレームの間引き（read と grab）のデコード時間')
+    sampler.add_argument('--fps-list', default='30,60,120,240', help='合成動画のフレームレート（カンマ区切り）')
+    sampler.add_argument('--analysis-fps', type=float, default=12.0, help='目標 fps での間引きも計測する')
+    sampler.add_argument('--width', type=int, default=1920, help='合成動画の幅')
+    sampler.add_argument('--height', type=int, default=1080, help='合成動画の高さ')
+    sampler.add_argument('--seconds', type=float, default=3.0, help='合成動画の長さ（秒）')
+    sampler.add_argument('--repeat', type=int, default=3, help='繰り返し回数')
+    sampler.set_defaults(func=benchmark_sampler)
+
+    enhancement = subparsers.add_parser('enhancement', help='補正のプロファイルごとの処理時間とポーズ検出率')
+    enhancement.add_argument('--video', default='', help='計測に使う人物の映った動画（省略時は合成動画）')
+    enhancement.add_argument('--frames', type=int, default=30, help='計測するフレーム数（前処理と同じ間隔で取り出す）')
+    enhancement.add_argument('--width', type=int, default=1920, help='合成動画の幅')
+    enhancement.add_argument('--height', type=int, default=1080, help='合成動画の高さ')
+    enhancement.add_argument('--seconds', type=float, default=5.0, help='合成動画の長さ（秒）')
+    enhancement.add_argument('--model-complexity', type=int,
+                             default=int(os.environ.get('POSE_MODEL_COMPLEXITY', '2')),
+                             help='MediaPipe Pose モデルの複雑さ')
+    enhancement.set_defaults(func=benchmark_enhancement)
+
+    segments = subparsers.add_parser('segments', help='前処理の区間ごとの並列実行と1プロセスの比較')
+    segments.add_argument('--video', default='', help='計測に使う動画（省略時は解像度ごとの合成動画）')
+    segments.add_argument('--resolutions', default='1920x1080,3840x2160', help='合成動画の解像度（カンマ区切り）')
+    segments.add_argument('--seconds', type=float, default=8.0, help='合成動画の長さ（秒）')
+    segments.add_argument('--segments', default='1,2,4', help='計測する区間数（カンマ区切り、最初の値が基準）')
+    segments.add_argument('--enhancement', default='full', help='補正のプロファイル')
+    segments.add_argument('--repeat', type=int, default=3, help='繰り返し回数')
+    segments.set_defaults(func=benchmark_segments)
+
+    resize = subparsers.add_parser('resize', help='元動画の解像度ごとの縮小方法の時間とポーズ検出数')
+    resize.add_argument('--video', default='', help='計測に使う人物の映った動画（省略時は合成動画）')
+    resize.add_argument('--resolutions', default='854x480,1280x720,1920x1080,3840x2160',
+                        help='再現する元動画の解像度（カンマ区切り）')
+    resize.add_argument('--short-sides', default='256,360,480', help='比較する短辺の目標画素数（カンマ区切り）')
+    resize.add_argument('--frames', type=int, default=20, help='計測するフレーム数（前処理と同じ間隔で取り出す）')
+    resize.add_argument('--seconds', type=float, default=5.0, help='合成動画の長さ（秒）')
+    resize.add_argument('--enhancement', default='clahe', help='補正のプロファイル')
+    resize.add_argument('--model-complexity', type=int, default=int(os.environ.get('POSE_MODEL_COMPLEXITY', '2')),
+                        help='MediaPipe Pose モデルの複雑さ')
+    resize.set_defaults(func=benchmark_resize)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
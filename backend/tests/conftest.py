@@ -0,0 +1,31 @@
+"""
+テニスサービス動作解析 - テスト共通設定
+app/ 以下のサービスを `from services.x import Y` で読み込めるようにする
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """
+    一時ディレクトリの DB・アップロード・出力フォルダで読み込んだ main モジュール
+
+    ワーカープールは起動せず、登録したジョブは待機中のまま残る（Flask がなければスキップ）。
+    """
+    pytest.importorskip('flask')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('ANALYZER_DB_PATH', str(tmp_path / 'analyzer.db'))
+    sys.modules.pop('main', None)
+    import main
+    monkeypatch.setattr(main, 'get_worker_pool', lambda: None)
+    # send_file は相対パスをアプリのディレクトリ基準で解決するため絶対パスにする
+    main.app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    main.app.config['OUTPUT_FOLDER'] = str(tmp_path / 'output')
+    yield main
+    sys.modules.pop('main', None)
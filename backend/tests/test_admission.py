@@ -0,0 +1,122 @@
+"""
+テニスサービス動作解析 - 受付制御のテスト
+待機中ジョブ数の上限・待ち時間の上限・クライアント間の公平な実行順
+"""
+
+import time
+
+import pytest
+
+from services.admission import AdmissionController
+from services.job_queue import JobQueue
+
+
+class FakeJobQueue:
+    """active_jobs() だけを持つジョブキュー"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def running(self, client_id: str, estimate: float, elapsed: float):
+        self.jobs.append({'state': JobQueue.RUNNING, 'client_id': client_id, 'estimated_seconds': estimate,
+                          'started_at': time.time() - elapsed, 'created_at': time.time() - elapsed})
+
+    def queued(self, client_id: str, estimate: float):
+        self.jobs.append({'state': JobQueue.QUEUED, 'client_id': client_id, 'estimated_seconds': estimate,
+                          'started_at': None, 'created_at': time.time() - 100 + len(self.jobs)})
+
+    def active_jobs(self):
+        return list(self.jobs)
+
+
+class FixedThroughput:
+    """見積もりの無いジョブの処理時間を固定値にする"""
+
+    def estimate_seconds(self, duration, fps):
+        return 100.0
+
+
+@pytest.fixture
+def queue():
+    return FakeJobQueue()
+
+
+def controller(queue, **kwargs) -> AdmissionController:
+    return AdmissionController(queue, FixedThroughput(), kwargs.pop('num_workers', 1), **kwargs)
+
+
+def test_idle_queue_admits_immediately(queue):
+    decision = controller(queue).check('a', [60.0])
+
+    assert decision == {'admitted': True, 'reason': None, 'estimated_wait': 0.0,
+                        'estimated_seconds': 60.0, 'retry_after': None}
+
+
+def test_client_queue_full_retries_when_own_job_starts(queue):
+    queue.running('b', 100.0, 40.0)
+    queue.queued('a', 30.0)
+    queue.queued('a', 30.0)
+    admission = controller(queue, max_queued_per_client=2)
+
+    decision = admission.check('a', [30.0])
+
+    assert (decision['admitted'], decision['reason']) == (False, 'client_queue_full')
+    # 実行中ジョブの残り 60 秒後に 'a' の先頭ジョブが開始して枠が空く
+    assert decision['retry_after'] == 60
+    assert admission.check('c', [30.0])['admitted']
+
+
+def test_queue_full_counts_all_clients(queue):
+    queue.running('a', 100.0, 70.0)
+    for client_id in ('a', 'b', 'c'):
+        queue.queued(client_id, 30.0)
+
+    decision = controller(queue, max_queue_depth=3).check('d', [10.0])
+
+    assert (decision['admitted'], decision['reason']) == (False, 'queue_full')
+    assert decision['retry_after'] == 30
+
+
+def test_wait_too_long_retries_after_excess(queue):
+    queue.running('a', 100.0, 40.0)
+    queue.queued('b', 30.0)
+    queue.queued('c', 30.0)
+
+    decision = controller(queue, max_wait_seconds=100.0).check('d', [10.0])
+
+    # 開始まで 60 + 30 + 30 = 120 秒、上限を 20 秒超える
+    assert (decision['admitted'], decision['reason']) == (False, 'wait_too_long')
+    assert decision['estimated_wait'] == pytest.approx(120.0, abs=0.5)
+    assert decision['retry_after'] == 20
+
+
+def test_new_client_is_not_queued_behind_heavy_client(queue):
+    for _ in range(5):
+        queue.queued('a', 10.0)
+
+    decision = controller(queue).check('b', [10.0])
+
+    # 'a' の先頭ジョブの次に実行される（'a' の5件すべての後ではない）
+    assert decision['admitted']
+    assert decision['estimated_wait'] == 10.0
+
+
+def test_running_jobs_count_towards_fair_order(queue):
+    queue.running('a', 100.0, 50.0)
+    queue.queued('a', 10.0)
+    queue.queued('a', 10.0)
+
+    decision = controller(queue, num_workers=2).check('b', [10.0])
+
+    # 'a' はすでに1件実行中なので 'b' のジョブが 'a' の待機中ジョブより先に空きワーカーで開始する
+    assert decision['estimated_wait'] == 0.0
+
+
+def test_jobs_without_estimate_use_default(queue):
+    queue.jobs.append({'state': JobQueue.RUNNING, 'client_id': 'a', 'estimated_seconds': None,
+                       'started_at': time.time(), 'created_at': time.time()})
+
+    decision = controller(queue, max_wait_seconds=50.0).check('b', [10.0])
+
+    assert decision['reason'] == 'wait_too_long'
+    assert decision['estimated_wait'] == pytest.approx(100.0, abs=0.5)
@@ -0,0 +1,49 @@
+"""
+テニスサービス動作解析 - アドバイスの版管理のテスト
+再生成した版は解析ごとに 2 から連番になり、同じパラメータの版を探せる
+"""
+
+import pytest
+
+from services.advice_versions import AdviceVersionStore, advice_filename
+
+PARAMS = {'user_level': 'advanced', 'focus_areas': ['toss'], 'use_chatgpt': False, 'user_concerns': ''}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AdviceVersionStore(str(tmp_path / 'analyzer.db'))
+
+
+def test_versions_are_numbered_per_analysis_from_two(store):
+    assert store.create('a', 'job-1', 'key-1', PARAMS)['version'] == 2
+    assert store.create('a', 'job-2', 'key-2', PARAMS)['version'] == 3
+    assert store.create('b', 'job-3', 'key-1', PARAMS)['version'] == 2
+
+    assert [version['version'] for version in store.list('a')] == [2, 3]
+    assert store.get('a', 3)['job_id'] == 'job-2'
+    assert store.get('a', 3)['params'] == PARAMS
+    assert store.get('a', 4) is None
+
+
+def test_find_returns_versions_with_the_same_key_newest_first(store):
+    store.create('a', 'job-1', 'key-1', PARAMS)
+    store.create('a', 'job-2', 'key-2', PARAMS)
+    store.create('a', 'job-3', 'key-1', PARAMS)
+    store.create('b', 'job-4', 'key-1', PARAMS)
+
+    assert [version['job_id'] for version in store.find('a', 'key-1')] == ['job-3', 'job-1']
+    assert store.find('a', 'key-3') == []
+
+
+def test_numbering_restarts_after_remove(store):
+    store.create('a', 'job-1', 'key-1', PARAMS)
+    store.remove('a')
+
+    assert store.list('a') == []
+    assert store.create('a', 'job-2', 'key-1', PARAMS)['version'] == 2
+
+
+def test_advice_filename_keeps_the_original_name_for_version_one():
+    assert advice_filename(1) == 'advice_result.json'
+    assert advice_filename(2) == 'advice_v2.json'
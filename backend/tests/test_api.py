@@ -0,0 +1,196 @@
+"""
+テニスサービス動作解析 - API エンドポイントのテスト
+Flask のテストクライアントでダウンロード・アドバイス・一括解析の応答を確認する
+"""
+
+import io
+import json
+import os
+import uuid
+import zipfile
+
+import cv2
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def client(api):
+    return api.app.test_client()
+
+
+@pytest.fixture
+def analysis_dir(api):
+    """解析結果だけが出力済みの解析（結果ストア未登録）"""
+    analysis_id = str(uuid.uuid4())
+    output_dir = os.path.join(api.app.config['OUTPUT_FOLDER'], analysis_id)
+    os.makedirs(output_dir)
+    with open(os.path.join(output_dir, 'analysis_result.json'), 'w') as f:
+        json.dump({'overall_score': 7.5, 'advice': {'summary': '元のアドバイス'}}, f)
+    return analysis_id, output_dir
+
+
+def test_download_supports_range_and_conditional_requests(client, analysis_dir):
+    analysis_id, output_dir = analysis_dir
+    with open(os.path.join(output_dir, 'analysis_result.json'), 'rb') as f:
+        content = f.read()
+
+    response = client.get(f'/api/download/{analysis_id}/analysis')
+    assert response.status_code == 200
+    assert response.data == content
+    etag = response.headers['ETag']
+
+    assert client.get(f'/api/download/{analysis_id}/analysis',
+                      headers={'If-None-Match': etag}).status_code == 304
+
+    partial = client.get(f'/api/download/{analysis_id}/analysis', headers={'Range': 'bytes=0-9'})
+    assert partial.status_code == 206
+    assert partial.data == content[:10]
+    assert partial.headers['Content-Range'] == f'bytes 0-9/{len(content)}'
+
+    # ETag が一致しない If-Range は全体を返す
+    stale = client.get(f'/api/download/{analysis_id}/analysis',
+                       headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert stale.status_code == 200
+    assert stale.data == content
+
+
+@pytest.mark.parametrize('analysis_id', ['legacy-result', '.', '..'])
+def test_download_rejects_ids_that_are_not_uuids(api, client, analysis_id):
+    # 出力フォルダ内外の UUID でないディレクトリにも解析結果を置いておく
+    output_dir = os.path.join(api.app.config['OUTPUT_FOLDER'], analysis_id)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, 'analysis_result.json'), 'w') as f:
+        json.dump({'overall_score': 7.5}, f)
+
+    response = client.get(f'/api/download/{analysis_id}/analysis')
+    assert response.status_code == 404
+    assert api.result_store.get(analysis_id) is None
+
+
+@pytest.mark.parametrize('method', ['get', 'post'])
+def test_advice_rejects_ids_that_are_not_uuids(client, method):
+    response = getattr(client, method)('/api/advice/not-a-uuid')
+    assert response.status_code == 404
+
+
+def test_regenerate_advice_requires_a_motion_result(api, client):
+    analysis_id = str(uuid.uuid4())
+    os.makedirs(os.path.join(api.app.config['OUTPUT_FOLDER'], analysis_id))
+
+    assert client.post(f'/api/advice/{analysis_id}', json={}).status_code == 409
+    assert client.post(f'/api/advice/{uuid.uuid4()}', json={}).status_code == 404
+
+
+def test_regenerate_advice_numbers_versions_and_reuses_matching_ones(api, client, analysis_dir):
+    analysis_id, output_dir = analysis_dir
+
+    first = client.post(f'/api/advice/{analysis_id}', json={'user_level': 'advanced'})
+    assert first.status_code == 202
+    assert first.get_json()['version'] == 2
+    job = api.job_queue.get(api.advice_version_store.get(analysis_id, 2)['job_id'])
+    assert job['kind'] == api.JobQueue.KIND_ADVICE
+    assert job['parent_id'] == analysis_id
+    assert job['params']['advice_version'] == 2
+
+    # 同じパラメータは登録済みの版を返し、新しいジョブを作らない
+    again = client.post(f'/api/advice/{analysis_id}', json={'user_level': 'advanced'})
+    assert again.status_code == 200
+    assert again.get_json()['version'] == 2
+    assert again.get_json()['cached'] is True
+
+    other = client.post(f'/api/advice/{analysis_id}', json={'user_level': 'beginner'})
+    assert other.status_code == 202
+    assert other.get_json()['version'] == 3
+    assert [version['version'] for version in api.advice_version_store.list(analysis_id)] == [2, 3]
+
+
+def test_regenerate_advice_reuses_the_original_version(api, client, analysis_dir):
+    analysis_id, output_dir = analysis_dir
+    params = {'user_level': 'advanced', 'focus_areas': ['toss'], 'use_chatgpt': False, 'user_concerns': ''}
+    api.job_queue.enqueue(analysis_id, 'serve.mp4', output_dir, params)
+
+    response = client.post(f'/api/advice/{analysis_id}', json=params)
+    assert response.status_code == 200
+    assert response.get_json()['version'] == 1
+    assert api.advice_version_store.list(analysis_id) == []
+
+
+def test_get_advice_reads_the_requested_version(api, client, analysis_dir):
+    analysis_id, output_dir = analysis_dir
+    client.post(f'/api/advice/{analysis_id}', json={'user_level': 'advanced'})
+
+    pending = client.get(f'/api/advice/{analysis_id}?version=2')
+    assert pending.status_code == 202
+    assert pending.get_json()['advice_status'] == 'pending'
+
+    job = api.job_queue.claim(worker_id=1)
+    with open(os.path.join(output_dir, 'advice_v2.json'), 'w') as f:
+        json.dump({'summary': '再生成したアドバイス'}, f)
+    api.job_queue.complete(job['analysis_id'])
+
+    for requested in ('2', 'latest'):
+        response = client.get(f'/api/advice/{analysis_id}?version={requested}')
+        assert response.status_code == 200
+        assert response.get_json()['version'] == 2
+        assert response.get_json()['advice'] == {'summary': '再生成したアドバイス'}
+
+    api.result_store.import_output_dir(output_dir)
+    original = client.get(f'/api/advice/{analysis_id}')
+    assert original.get_json()['advice'] == {'summary': '元のアドバイス'}
+    assert client.get(f'/api/advice/{analysis_id}?version=3').status_code == 404
+
+
+@pytest.fixture(scope='module')
+def clip_bytes(tmp_path_factory):
+    """一括解析に渡す短い動画の内容"""
+    path = str(tmp_path_factory.mktemp('clip') / 'serve.mp4')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 30.0, (160, 120))
+    for index in range(30):
+        writer.write(np.full((120, 160, 3), index * 8, dtype=np.uint8))
+    writer.release()
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_batch_from_upload_ids_queues_one_job_per_clip(api, client, clip_bytes):
+    uploaded = client.post('/api/upload', data={'video': (io.BytesIO(clip_bytes), 'serve.mp4')},
+                           content_type='multipart/form-data')
+    assert uploaded.status_code == 200
+    upload_id = uploaded.get_json()['upload_id']
+
+    response = client.post('/api/batches', json={'upload_ids': [upload_id, 'missing']})
+    assert response.status_code == 202
+    batch = response.get_json()
+    assert batch['total'] == 2
+    assert [clip['status'] for clip in batch['clips']] == ['queued', 'failed']
+    assert api.job_queue.get(batch['clips'][0]['analysis_id'])['batch_id'] == batch['batch_id']
+
+    status = client.get(batch['status_url'])
+    assert status.status_code == 200
+    assert client.get(batch['status_url'], headers={'If-None-Match': status.headers['ETag']}).status_code == 304
+
+
+def test_batch_from_archive_reports_entries_that_are_not_videos(api, client, clip_bytes):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('first.mp4', clip_bytes)
+        zf.writestr('notes.txt', 'メモ')
+        zf.writestr('nested/second.mp4', clip_bytes + b'\0')
+    archive.seek(0)
+
+    response = client.post('/api/batches', data={'archive': (archive, 'serves.zip'), 'user_level': 'advanced'},
+                           content_type='multipart/form-data')
+    assert response.status_code == 202
+    batch = response.get_json()
+    assert batch['source'] == 'archive'
+    assert [(clip['filename'], clip['status']) for clip in batch['clips']] == [
+        ('first.mp4', 'queued'), ('notes.txt', 'failed'), ('second.mp4', 'queued')
+    ]
+    assert batch['clips'][1]['error']
+    assert os.listdir(os.path.join(api.app.config['UPLOAD_FOLDER'], '.partial')) == []
+
+
+def test_batch_rejects_a_broken_archive(client):
+    response = client.post('/api/batches', data=b'not a zip', content_type='application/zip')
+    assert response.status_code == 400
@@ -0,0 +1,56 @@
+"""
+テニスサービス動作解析 - 一括解析のテスト
+zip アーカイブの展開（件数・サイズの上限）
+"""
+
+import io
+import os
+import zipfile
+
+import pytest
+
+from services.batch_manager import extract_archive
+from services.upload_storage import save_with_hash
+
+
+def make_archive(tmp_path, members):
+    archive_path = tmp_path / 'clips.zip'
+    with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    destination = tmp_path / 'uploads'
+    destination.mkdir()
+    return str(archive_path), destination
+
+
+def test_total_extracted_size_is_capped(tmp_path):
+    archive_path, destination = make_archive(tmp_path, [(f'clip{index}.mp4', bytes(400)) for index in range(4)])
+
+    entries = list(extract_archive(archive_path, str(destination), ['mp4'], 1000, 10, max_total_size=1000))
+
+    assert [entry.get('size') for entry in entries] == [400, 400, None, None]
+    assert all('合計サイズ' in entry['error'] for entry in entries[2:])
+    assert sum(os.path.getsize(destination / name) for name in os.listdir(destination)) == 800
+
+
+def test_member_limits_and_unsupported_files(tmp_path):
+    archive_path, destination = make_archive(tmp_path, [
+        ('notes.txt', b'text'), ('big.mov', bytes(2000)), ('a.mp4', b'a'), ('b.mp4', b'b'), ('__MACOSX/._a.mp4', b'x')
+    ])
+
+    entries = list(extract_archive(archive_path, str(destination), ['mp4', 'mov'], 1000, 1))
+
+    assert [entry['filename'] for entry in entries] == ['notes.txt', 'big.mov', 'a.mp4', 'b.mp4']
+    assert 'error' in entries[0] and 'error' in entries[1] and 'error' in entries[3]
+    assert entries[2]['size'] == 1
+    assert len(os.listdir(destination)) == 1
+
+
+def test_save_with_hash_stops_at_max_size(tmp_path):
+    file_path = tmp_path / 'clip.mp4'
+
+    with pytest.raises(ValueError):
+        save_with_hash(io.BytesIO(bytes(3 * 1024 * 1024)), str(file_path), max_size=1024 * 1024)
+
+    assert not file_path.exists()
+    assert save_with_hash(io.BytesIO(b'abc'), str(file_path), max_size=3)['size'] == 3
@@ -0,0 +1,53 @@
+"""
+テニスサービス動作解析 - 分割アップロードのテスト
+チャンクの追記・先頭バイトでのコンテナ判定・確定
+"""
+
+import hashlib
+import io
+
+import pytest
+
+from services.chunked_upload import ChunkedUploadError, ChunkedUploadManager
+from services.video_processor import SUPPORTED_EXTENSIONS, VideoProcessor
+
+# ISO BMFF（MP4/M4V/MOV）の先頭 atom
+M4V_HEADER = b'\x00\x00\x00\x18ftypM4V \x00\x00\x00\x01isomM4V '
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return ChunkedUploadManager(str(tmp_path / 'uploads.db'), str(tmp_path / 'partial'), 1024 * 1024,
+                                VideoProcessor())
+
+
+def test_m4v_chunked_upload(manager, tmp_path):
+    body = M4V_HEADER + bytes(range(256)) * 8
+    manager.create('u1', 'serve.m4v', '.m4v', len(body))
+
+    # 先頭のチャンクはヘッダー判定に必要なバイト数より短く、2つ目のチャンクで判定される
+    session = manager.append('u1', 0, io.BytesIO(body[:8]))
+    assert session['container'] is None
+    session = manager.append('u1', 8, io.BytesIO(body[8:]), hashlib.sha256(body[8:]).hexdigest())
+    assert session['container'] == 'mp4'
+
+    destination = tmp_path / 'serve.m4v'
+    result = manager.finalize('u1', str(destination))
+    assert result == {'sha256': hashlib.sha256(body).hexdigest(), 'size': len(body)}
+    assert destination.read_bytes() == body
+
+
+def test_m4v_with_other_container_is_rejected(manager):
+    body = b'RIFF\x00\x00\x00\x00AVI LIST' + bytes(64)
+    manager.create('u2', 'serve.m4v', '.m4v', len(body))
+
+    with pytest.raises(ChunkedUploadError) as error:
+        manager.append('u2', 0, io.BytesIO(body))
+    assert error.value.status_code == 415
+    assert manager.get('u2') is None
+
+
+@pytest.mark.parametrize('extension', SUPPORTED_EXTENSIONS)
+def test_every_supported_extension_can_be_probed(extension):
+    result = VideoProcessor().probe_container_header(bytes(16), extension)
+    assert 'サポートされていない' not in result['error_message']
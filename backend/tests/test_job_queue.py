@@ -0,0 +1,96 @@
+"""
+テニスサービス動作解析 - ジョブキューのテスト
+ジョブの取得・異常終了したワーカーのジョブの再投入
+"""
+
+import os
+
+import pytest
+
+from services.job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    job_queue = JobQueue(str(tmp_path / 'jobs.db'))
+    yield job_queue
+    job_queue.close()
+
+
+def enqueue(queue: JobQueue, analysis_id: str, client_id: str = None) -> dict:
+    return queue.enqueue(analysis_id, f'/uploads/{analysis_id}.mp4', f'/output/{analysis_id}',
+                         {'api_key': 'secret'}, client_id=client_id)
+
+
+def test_claim_records_worker_and_attempt(queue):
+    enqueue(queue, 'a')
+
+    job = queue.claim(3, 1234)
+
+    assert job['analysis_id'] == 'a'
+    assert job['state'] == JobQueue.RUNNING
+    assert (job['worker_id'], job['worker_pid'], job['attempts']) == (3, 1234, 1)
+    assert queue.claim(3, 1234) is None
+
+
+def test_claim_is_fair_across_clients(queue):
+    enqueue(queue, 'a1', 'a')
+    enqueue(queue, 'a2', 'a')
+    enqueue(queue, 'b1', 'b')
+
+    claimed = [queue.claim(0)['analysis_id'] for _ in range(3)]
+
+    assert claimed == ['a1', 'b1', 'a2']
+
+
+def test_recover_worker_requeues_then_fails(queue):
+    enqueue(queue, 'a')
+    queue.claim(0, 111)
+
+    assert queue.recover_worker(0, 111) == {'requeued': ['a'], 'failed': []}
+    job = queue.get('a')
+    assert job['state'] == JobQueue.QUEUED
+    assert job['worker_id'] is None and job['worker_pid'] is None
+
+    # 再投入したジョブで再び異常終了したら失敗にする（APIキーも削除）
+    assert queue.claim(0, 222)['attempts'] == JobQueue.MAX_ATTEMPTS
+    assert queue.recover_worker(0, 222) == {'requeued': [], 'failed': ['a']}
+    job = queue.get('a')
+    assert job['state'] == JobQueue.FAILED
+    assert 'api_key' not in job['params']
+    assert queue.counts()[JobQueue.RUNNING] == 0
+
+
+def test_recover_worker_ignores_other_processes(queue):
+    enqueue(queue, 'a')
+    enqueue(queue, 'b')
+    queue.claim(0, os.getpid())
+    queue.claim(1, 222)
+
+    # 同じワーカー番号でも再起動後のプロセスが取得したジョブには触れない
+    assert queue.recover_worker(0, 999) == {'requeued': [], 'failed': []}
+    assert queue.recover_worker(1, 222) == {'requeued': ['b'], 'failed': []}
+    assert queue.get('a')['state'] == JobQueue.RUNNING
+
+
+def test_requeue_running_on_startup(queue):
+    enqueue(queue, 'a')
+    queue.claim(0, 111)
+
+    assert queue.requeue_running() == ['a']
+    assert queue.get('a')['state'] == JobQueue.QUEUED
+
+
+def test_remove_deletes_finished_jobs_of_analysis(queue):
+    enqueue(queue, 'a')
+    queue.claim(0)
+    queue.complete('a')
+    queue.enqueue('a-advice-1', '/uploads/a.mp4', '/output/a', {}, kind='advice', parent_id='a')
+    queue.enqueue('a-advice-2', '/uploads/a.mp4', '/output/a', {}, kind='advice', parent_id='a')
+    queue.claim(0)
+    queue.fail('a-advice-1', 'error')
+
+    assert queue.remove('a') == 2
+    assert queue.get('a') is None
+    assert queue.get('a-advice-1') is None
+    assert queue.get('a-advice-2')['state'] == JobQueue.QUEUED
@@ -0,0 +1,77 @@
+"""
+テニスサービス動作解析 - JSON シリアライズのテスト
+orjson と標準ライブラリの出力の一致・一時ファイル経由の書き込み
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from services import json_codec
+
+BACKENDS = [
+    pytest.param(True, id='orjson',
+                 marks=pytest.mark.skipif(not json_codec.orjson_available, reason='orjson 未インストール')),
+    pytest.param(False, id='json')
+]
+
+SAMPLE = {
+    'frames': np.arange(12, dtype=np.float32).reshape(3, 4)[:, ::2],  # C 連続でない配列
+    'angles': np.array([1.5, np.nan, np.inf]),
+    'score': np.float64('nan'),
+    'count': np.int64(3),
+    'ok': np.bool_(True),
+    'ratio': float('-inf'),
+    'label': 'サーブ',
+    'phases': [{'start': np.int32(0), 'end': 12}]
+}
+
+EXPECTED = {
+    'frames': [[0.0, 2.0], [4.0, 6.0], [8.0, 10.0]],
+    'angles': [1.5, None, None],
+    'score': None,
+    'count': 3,
+    'ok': True,
+    'ratio': None,
+    'label': 'サーブ',
+    'phases': [{'start': 0, 'end': 12}]
+}
+
+
+@pytest.mark.parametrize('use_orjson', BACKENDS)
+def test_backends_produce_same_json(monkeypatch, use_orjson):
+    monkeypatch.setattr(json_codec, 'orjson_available', use_orjson)
+
+    data = json_codec.dumps_bytes(SAMPLE)
+
+    assert b'NaN' not in data and b'Infinity' not in data
+    assert json_codec.loads(data) == EXPECTED
+
+
+def test_backends_produce_identical_bytes(monkeypatch):
+    if not json_codec.orjson_available:
+        pytest.skip('orjson 未インストール')
+    fast = json_codec.dumps_bytes(SAMPLE)
+    monkeypatch.setattr(json_codec, 'orjson_available', False)
+    assert json_codec.dumps_bytes(SAMPLE) == fast
+
+
+def test_write_json_replaces_file_without_leftovers(tmp_path):
+    file_path = tmp_path / 'analysis_result.json'
+    file_path.write_text('old')
+
+    data = json_codec.write_json({'value': np.float32(0.5)}, str(file_path))
+
+    assert file_path.read_bytes() == data
+    assert os.listdir(tmp_path) == ['analysis_result.json']
+
+
+def test_stdlib_backend_rewrites_only_values_with_nan(monkeypatch):
+    monkeypatch.setattr(json_codec, 'orjson_available', False)
+
+    def unexpected(obj):
+        raise AssertionError('NaN を含まない値は置き換えずに変換する')
+
+    monkeypatch.setattr(json_codec, '_finite', unexpected)
+    assert json_codec.loads(json_codec.dumps_bytes({'angles': np.array([1.5, 2.0])})) == {'angles': [1.5, 2.0]}
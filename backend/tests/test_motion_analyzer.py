@@ -0,0 +1,117 @@
+"""
+テニスサービス動作解析 - 動作解析の回帰テスト
+配列ベースの MotionAnalyzer が、フレームごとの辞書で計算していた従来版と同じ結果を返すことを確認する
+
+data/motion_analyzer_baseline.json は synthetic_results() を従来版（PoseSequence 導入前の
+services/motion_analyzer.py）で解析した結果。合成データを変更した場合は従来版で作り直すこと。
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+import pytest
+
+from services.motion_analyzer import MotionAnalyzer
+from services.pose_format import LANDMARK_NAMES
+from services.pose_sequence import PoseSequence
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'data', 'motion_analyzer_baseline.json')
+
+FPS = 30.0
+FRAMES = 96
+UNDETECTED_FRAMES = {0, 1, 40, 41, 95}
+# フレーム -> 欠けているランドマーク（検出フレームで一部だけ欠ける場合）
+MISSING_LANDMARKS = {
+    10: ['right_wrist'],
+    25: ['left_wrist', 'left_knee'],
+    50: ['right_elbow', 'right_shoulder'],
+    60: ['left_hip', 'right_hip'],
+    70: ['right_ankle', 'left_ankle', 'right_knee']
+}
+
+
+def _f32(value: float) -> float:
+    """PoseSequence の float32 配列でも変わらない値に丸める"""
+    return float(np.float32(value))
+
+
+def synthetic_results():
+    """
+    サーブ動作を模した合成ポーズ検出結果（従来の辞書のリスト）
+
+    トスで左手首が上がり、膝を曲げてから右手首が最高点に達する。未検出フレームと、
+    検出フレームで一部のランドマークが欠けたフレームを含む。
+    """
+    rng = np.random.default_rng(19)
+    base = {name: (0.3 + 0.4 * (index % 7) / 6, 0.1 + 0.8 * index / len(LANDMARK_NAMES))
+            for index, name in enumerate(LANDMARK_NAMES)}
+
+    results = []
+    for frame in range(FRAMES):
+        t = frame / (FRAMES - 1)
+        result = {'frame_number': frame * 2, 'timestamp': frame / FPS, 'landmarks': {},
+                  'visibility_scores': {}, 'detection_confidence': 0.0, 'has_pose': frame not in UNDETECTED_FRAMES}
+        if result['has_pose']:
+            offsets = {
+                'left_wrist': (0.02 * t, -0.5 * math.exp(-((t - 0.35) / 0.12) ** 2)),
+                'right_wrist': (0.05 * t, -0.6 * math.exp(-((t - 0.65) / 0.08) ** 2)),
+                'right_elbow': (0.03 * t, -0.3 * math.exp(-((t - 0.6) / 0.1) ** 2)),
+                'left_knee': (0.0, 0.08 * math.exp(-((t - 0.45) / 0.1) ** 2)),
+                'right_knee': (0.0, 0.07 * math.exp(-((t - 0.47) / 0.1) ** 2)),
+                'left_shoulder': (0.06 * math.sin(math.pi * t), 0.04 * math.sin(2 * math.pi * t)),
+                'right_hip': (-0.05 * math.sin(math.pi * t), 0.03 * math.cos(math.pi * t))
+            }
+            missing = MISSING_LANDMARKS.get(frame, [])
+            for name in LANDMARK_NAMES:
+                if name in missing:
+                    continue
+                dx, dy = offsets.get(name, (0.0, 0.0))
+                noise = rng.normal(0.0, 0.002, 3)
+                visibility = _f32(rng.uniform(0.4, 1.0))
+                result['landmarks'][name] = {
+                    'x': _f32(base[name][0] + dx + noise[0]),
+                    'y': _f32(base[name][1] + dy + noise[1]),
+                    'z': _f32(noise[2]),
+                    'visibility': visibility
+                }
+                result['visibility_scores'][name] = visibility
+            result['detection_confidence'] = float(np.mean(list(result['visibility_scores'].values())))
+        results.append(result)
+    return results
+
+
+def assert_matches(actual, expected, path='result'):
+    """数値は浮動小数点の誤差を許して再帰的に比較"""
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict), path
+        assert sorted(actual) == sorted(expected), path
+        for key in expected:
+            assert_matches(actual[key], expected[key], f'{path}.{key}')
+    elif isinstance(expected, list):
+        assert isinstance(actual, (list, tuple)), path
+        assert len(actual) == len(expected), path
+        for index, (a, e) in enumerate(zip(actual, expected)):
+            assert_matches(a, e, f'{path}[{index}]')
+    elif isinstance(expected, float):
+        assert actual == pytest.approx(expected, rel=1e-5, abs=1e-6), path
+    else:
+        assert actual == expected, path
+
+
+@pytest.fixture(scope='module')
+def baseline():
+    with open(BASELINE_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize('as_sequence', [True, False], ids=['sequence', 'dicts'])
+def test_matches_dict_based_baseline(baseline, as_sequence):
+    results = synthetic_results()
+    pose_results = PoseSequence.from_results(results) if as_sequence else results
+
+    analysis = MotionAnalyzer().analyze_serve_motion(pose_results)
+
+    # 数値は JSON に保存した形（NumPy 型を標準型に変換したもの）で比較する
+    assert_matches(json.loads(json.dumps(analysis, default=lambda value: value.item())), baseline)
@@ -0,0 +1,79 @@
+"""
+テニスサービス動作解析 - 解析結果ストアのテスト
+成果物の内容ハッシュは初回のダウンロード時に計算し、変更がなければ再計算しない
+"""
+
+import hashlib
+import os
+
+import pytest
+
+from services import result_store
+from services.result_store import ResultStore
+
+ANALYSIS = {'overall_score': 7.5, 'frame_count': 10, 'pose_detection': {'detected_frames': 8}}
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """hash_file の呼び出しを記録する"""
+    calls = []
+    original = result_store.hash_file
+
+    def recording(file_path):
+        calls.append(os.path.basename(file_path))
+        return original(file_path)
+
+    monkeypatch.setattr(result_store, 'hash_file', recording)
+    return calls
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    directory = tmp_path / 'output' / 'a1'
+    directory.mkdir(parents=True)
+    (directory / 'analysis_result.json').write_text('{}')
+    (directory / 'pose_visualization.mp4').write_bytes(b'video' * 100)
+    return str(directory)
+
+
+def test_record_does_not_hash_artifacts(tmp_path, output_dir, hashed):
+    store = ResultStore(str(tmp_path / 'app.db'))
+
+    store.record('a1', output_dir, ANALYSIS, status='partial')
+    store.record('a1', output_dir, ANALYSIS)
+
+    files = store.get('a1')['files']
+    assert hashed == []
+    assert files['pose_visualization.mp4']['size'] == 500
+    assert 'sha256' not in files['pose_visualization.mp4']
+    assert files['pose_data.npz'] == {'exists': False, 'size': 0}
+
+
+def test_artifact_hash_is_computed_once_and_kept_by_record(tmp_path, output_dir, hashed):
+    store = ResultStore(str(tmp_path / 'app.db'))
+    store.record('a1', output_dir, ANALYSIS)
+
+    expected = hashlib.sha256(b'video' * 100).hexdigest()
+    assert store.artifact_hash('a1', output_dir, 'pose_visualization.mp4') == expected
+    assert store.artifact_hash('a1', output_dir, 'pose_visualization.mp4') == expected
+    store.record('a1', output_dir, ANALYSIS)
+
+    assert hashed == ['pose_visualization.mp4']
+    assert store.get('a1')['files']['pose_visualization.mp4']['sha256'] == expected
+
+
+def test_changed_artifact_is_hashed_again(tmp_path, output_dir, hashed):
+    store = ResultStore(str(tmp_path / 'app.db'))
+    store.record('a1', output_dir, ANALYSIS)
+    store.artifact_hash('a1', output_dir, 'pose_visualization.mp4')
+
+    video_path = os.path.join(output_dir, 'pose_visualization.mp4')
+    with open(video_path, 'wb') as f:
+        f.write(b'other')
+    os.utime(video_path, (1, 1))
+    store.record('a1', output_dir, ANALYSIS)
+
+    assert 'sha256' not in store.get('a1')['files']['pose_visualization.mp4']
+    assert store.artifact_hash('a1', output_dir, 'pose_visualization.mp4') == hashlib.sha256(b'other').hexdigest()
+    assert hashed == ['pose_visualization.mp4', 'pose_visualization.mp4']
@@ -0,0 +1,90 @@
+"""
+テニスサービス動作解析 - 保持期間・容量管理のテスト
+解析の削除に伴う登録の削除・一時ディレクトリの掃除
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from services import retention
+from services.job_queue import JobQueue
+from services.result_cache import ResultCache
+from services.result_store import ResultStore
+from services.retention import RetentionManager
+from services.upload_storage import UploadRegistry
+from services.video_processor import TEMP_DIR_PREFIX
+
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def manager(tmp_path):
+    db_path = str(tmp_path / 'app.db')
+    for folder in ('uploads', 'output'):
+        (tmp_path / folder).mkdir()
+    job_queue = JobQueue(db_path)
+    yield RetentionManager(str(tmp_path / 'uploads'), str(tmp_path / 'output'), job_queue, UploadRegistry(db_path),
+                           ResultStore(db_path), result_cache=ResultCache(db_path), ttl_seconds=DAY)
+    job_queue.close()
+
+
+def finished_analysis(manager, analysis_id: str, age: float) -> str:
+    output_dir = os.path.join(manager.output_folder, analysis_id)
+    os.makedirs(output_dir)
+    with open(os.path.join(output_dir, 'analysis_result.json'), 'w') as f:
+        f.write('{}')
+    os.utime(output_dir, (time.time() - age, time.time() - age))
+
+    manager.job_queue.enqueue(analysis_id, '/uploads/clip.mp4', output_dir, {})
+    manager.job_queue.claim(0)
+    manager.job_queue.complete(analysis_id)
+    manager.job_queue.enqueue(f'{analysis_id}-advice', '/uploads/clip.mp4', output_dir, {},
+                              kind='advice', parent_id=analysis_id)
+    manager.result_cache.add('hash', 'fingerprint', 'advice', analysis_id)
+    return output_dir
+
+
+def test_expired_analysis_removes_job_and_cache_entry(manager):
+    output_dir = finished_analysis(manager, 'old', 2 * DAY)
+    manager.job_queue.claim(0)
+    manager.job_queue.complete('old-advice')
+
+    result = manager.sweep()
+
+    assert result['removed'] == 1
+    assert not os.path.exists(output_dir)
+    assert manager.job_queue.get('old') is None
+    assert manager.job_queue.get('old-advice') is None
+    assert manager.result_cache.lookup('hash', 'fingerprint', 'advice') is None
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_temp_sweep_skips_directories_of_running_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(retention.tempfile, 'gettempdir', lambda: str(tmp_path))
+    old = time.time() - 2 * DAY
+    names = {
+        'running': f'{TEMP_DIR_PREFIX}{os.getppid()}_a',
+        'own': f'{TEMP_DIR_PREFIX}{os.getpid()}_b',
+        'dead': f'{TEMP_DIR_PREFIX}{dead_pid()}_c',
+        'dead_recent': f'{TEMP_DIR_PREFIX}{dead_pid()}_d'
+    }
+    for key, name in names.items():
+        path = tmp_path / name
+        path.mkdir()
+        (path / 'frame.jpg').write_bytes(b'x' * 10)
+        if key != 'dead_recent':
+            os.utime(path, (old, old))
+
+    reclaimed = RetentionManager._sweep_temp_dirs(time.time() - DAY)
+
+    assert reclaimed == 10
+    assert sorted(os.listdir(tmp_path)) == sorted(names[key] for key in ('running', 'own', 'dead_recent'))
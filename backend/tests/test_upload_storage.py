@@ -0,0 +1,34 @@
+"""
+テニスサービス動作解析 - アップロード情報管理のテスト
+登録前に保存されたアップロードの解決
+"""
+
+import os
+
+from services.upload_storage import UploadRegistry
+
+UPLOAD_ID = '0b7c6a52-3f0e-4d8e-9a43-5d2f1c7e8b90'
+
+
+def test_resolve_legacy_registers_file_in_upload_folder(tmp_path):
+    upload_folder = tmp_path / 'uploads'
+    upload_folder.mkdir()
+    (upload_folder / f'{UPLOAD_ID}.MP4').write_bytes(b'video')
+    registry = UploadRegistry(str(tmp_path / 'uploads.db'))
+
+    upload_info = registry.resolve_legacy(UPLOAD_ID, str(upload_folder), ['mov', 'mp4'])
+
+    assert upload_info['path'] == os.path.realpath(upload_folder / f'{UPLOAD_ID}.MP4')
+    assert upload_info['file_size'] == 5
+
+
+def test_resolve_legacy_rejects_paths_outside_upload_folder(tmp_path):
+    upload_folder = tmp_path / 'uploads'
+    upload_folder.mkdir()
+    (tmp_path / 'secret.mp4').write_bytes(b'secret')
+    os.symlink(tmp_path / 'secret.mp4', upload_folder / f'{UPLOAD_ID}.mp4')
+    registry = UploadRegistry(str(tmp_path / 'uploads.db'))
+
+    assert registry.resolve_legacy('../secret', str(upload_folder), ['mp4']) is None
+    assert registry.resolve_legacy(UPLOAD_ID, str(upload_folder), ['mp4']) is None
+    assert registry.get(UPLOAD_ID) is None
@@ -0,0 +1,119 @@
+"""
+テニスサービス動作解析 - 動画処理サービスのテスト
+時間区間ごとの並列前処理が1プロセスの前処理と同じフレームを返すこと
+"""
+
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from services import video_processor
+from services.video_processor import VideoProcessor, _open_at
+
+FRAMES = 90
+
+
+@pytest.fixture(scope='module')
+def numbered_video(tmp_path_factory):
+    """フレーム番号を画素に書き込んだ 30fps の動画（シーク位置のずれがフレームの違いとして現れる）"""
+    path = str(tmp_path_factory.mktemp('video') / 'numbered.mp4')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 30.0, (160, 120))
+    for index in range(FRAMES):
+        frame = np.zeros((120, 160, 3), dtype=np.uint8)
+        cv2.putText(frame, str(index), (10, 80), cv2.FONT_HERSHEY_SIMPLEX, 2.0, (255, 255, 255), 3)
+        frame[:, :, 0] = index * 2
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def decode_all(path):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+@pytest.mark.parametrize('start', [0, 1, 2, 7, 45, 89])
+def test_open_at_positions_on_requested_frame(numbered_video, start):
+    expected = decode_all(numbered_video)[start]
+
+    cap, position = _open_at(numbered_video, start)
+    ret, frame = cap.read()
+    cap.release()
+
+    assert position == start
+    assert ret and np.array_equal(frame, expected)
+
+
+class InexactSeekCapture:
+    """CAP_PROP_POS_FRAMES へのシークが数フレーム先に着地し、位置は要求どおりに返す VideoCapture"""
+
+    def __init__(self, path, overshoot):
+        self._cap = real_video_capture(path)
+        self._overshoot = overshoot
+        self._requested = None
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self._requested = value
+            return self._cap.set(prop, value + self._overshoot)
+        return self._cap.set(prop, value)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES and self._requested is not None:
+            return float(self._requested)
+        return self._cap.get(prop)
+
+    def __getattr__(self, name):
+        return getattr(self._cap, name)
+
+
+real_video_capture = cv2.VideoCapture
+
+
+@pytest.mark.parametrize('overshoot', [-2, 3])
+def test_open_at_falls_back_when_seek_lands_elsewhere(numbered_video, monkeypatch, overshoot):
+    expected = decode_all(numbered_video)[45]
+    monkeypatch.setattr(video_processor.cv2, 'VideoCapture', lambda path: InexactSeekCapture(path, overshoot))
+
+    cap, position = _open_at(numbered_video, 45)
+    ret, frame = cap.read()
+    cap.release()
+
+    assert position == 45
+    assert ret and np.array_equal(frame, expected)
+
+
+def preprocess(video_path, segments, **kwargs):
+    processor = VideoProcessor()
+    processor.segments = segments
+    processor.min_segment_seconds = 0.0
+    try:
+        frames = processor.stream_frames(video_path, enhancement='clahe', **kwargs)
+        output = list(frames)
+        leftovers = os.listdir(processor.temp_dir)
+    finally:
+        processor.close()
+    return frames, output, leftovers
+
+
+@pytest.mark.parametrize('target_fps', [0.0, 7.0])
+def test_segments_match_single_process(numbered_video, target_fps):
+    _, expected, _ = preprocess(numbered_video, 1, target_fps=target_fps)
+
+    frames, output, leftovers = preprocess(numbered_video, 3, target_fps=target_fps)
+
+    assert frames.segments == 3
+    assert frames.read_frames == FRAMES
+    assert len(output) == len(expected)
+    assert all(np.array_equal(frame, reference) for frame, reference in zip(output, expected))
+    # 区間の一時ファイルは読み終えたら削除される
+    assert leftovers == []
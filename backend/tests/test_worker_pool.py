@@ -0,0 +1,73 @@
+"""
+テニスサービス動作解析 - ワーカープールのテスト
+ワーカープロセスの異常終了の検出・再起動とジョブの再投入
+"""
+
+import os
+import time
+
+import pytest
+
+from services.job_queue import JobQueue
+from services.worker_pool import WorkerPool
+
+
+def crashing_worker(worker_id: int, db_path: str, marker_path: str, crash_always: bool):
+    """ジョブを取得した直後に異常終了するワーカー（marker_path があれば2回目以降はジョブを完了する）"""
+    queue = JobQueue(db_path)
+    while True:
+        job = queue.claim(worker_id, os.getpid())
+        if job is None:
+            time.sleep(0.05)
+            continue
+        if crash_always or not os.path.exists(marker_path):
+            open(marker_path, 'w').close()
+            os._exit(1)
+        queue.complete(job['analysis_id'])
+
+
+class CrashingWorkerPool(WorkerPool):
+    """MediaPipe を読み込まずに crashing_worker を起動するワーカープール"""
+
+    def __init__(self, db_path: str, marker_path: str, crash_always: bool):
+        super().__init__(db_path, num_workers=1, monitor_interval=0.1)
+        self.marker_path = marker_path
+        self.crash_always = crash_always
+
+    def _spawn(self, worker_id: int):
+        ready_event = self._context.Event()
+        ready_event.set()
+        process = self._context.Process(target=crashing_worker,
+                                        args=(worker_id, self.db_path, self.marker_path, self.crash_always),
+                                        daemon=True)
+        process.start()
+        return process, ready_event
+
+
+def wait_for_state(queue: JobQueue, analysis_id: str, states, timeout: float = 60.0) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(analysis_id)
+        if job['state'] in states:
+            return job
+        time.sleep(0.1)
+    pytest.fail(f'ジョブが {states} になりませんでした: {queue.get(analysis_id)}')
+
+
+@pytest.mark.parametrize('crash_always, final_state', [(False, JobQueue.DONE), (True, JobQueue.FAILED)])
+def test_crashed_worker_is_restarted_and_job_recovered(tmp_path, crash_always, final_state):
+    db_path = str(tmp_path / 'jobs.db')
+    queue = JobQueue(db_path)
+    queue.enqueue('a', '/uploads/a.mp4', str(tmp_path / 'a'), {})
+
+    pool = CrashingWorkerPool(db_path, str(tmp_path / 'crashed'), crash_always)
+    pool.start()
+    try:
+        job = wait_for_state(queue, 'a', (JobQueue.DONE, JobQueue.FAILED))
+        assert job['state'] == final_state
+        assert job['attempts'] == JobQueue.MAX_ATTEMPTS
+        assert pool.restarts >= 1
+        assert queue.counts()[JobQueue.RUNNING] == 0
+    finally:
+        pool.stop(timeout=1.0)
+        queue.close()
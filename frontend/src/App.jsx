@@ -172,6 +172,28 @@ function App() {
     event.preventDefault();
   }, []);
 
+  const waitForAnalysis = async (analysisId) => {
+    // 解析ジョブの完了を待って結果を取得（サーバー側で状態が変わるまで待機するロングポーリング）
+    let version = -1;
+    while (true) {
+      const statusResponse = await axios.get(`${API_BASE_URL}/api/status/${analysisId}`, {
+        params: { wait: 30, version },
+      });
+      const status = statusResponse.data?.status;
+      version = statusResponse.data?.version ?? version;
+
+      if (status === 'done') {
+        const resultResponse = await axios.get(`${API_BASE_URL}/api/download/${analysisId}/analysis`);
+        return resultResponse.data;
+      }
+      if (status === 'failed') {
+        const failure = new Error(statusResponse.data?.error || '解析に失敗しました');
+        failure.response = { data: { error: failure.message } };
+        throw failure;
+      }
+    }
+  };
+
   const handleAnalyze = async () => {
     if (!selectedFile) return;
 
@@ -198,32 +220,17 @@ function App() {
         },
       });
 
-      // デバッグ: レスポンスデータの確認
-      console.log('=== フロントエンド レスポンス受信 ===');
-      console.log('response.status:', response.status);
-      console.log('response.headers:', response.headers);
-      console.log('response.data:', response.data);
-      console.log('response.data.success:', response.data?.success);
-      console.log('response.data.result:', response.data?.result);
-      
-      if (response.data?.result?.advice) {
-        console.log('advice keys:', Object.keys(response.data.result.advice));
-        console.log('advice.one_point_advice:', response.data.result.advice.one_point_advice);
-      }
-      console.log('=====================================');
-      
-      // レスポンスの構造を確認して適切にデータを設定
-      if (response.data && response.data.success && response.data.result) {
-        console.log('解析結果を設定中...');
-        setAnalysisResult(response.data.result);
-        console.log('解析結果設定完了');
-        setCurrentStep(3);
-        console.log('ステップ3に移行完了');
-      } else {
+      // 解析はサーバー側のキューで非同期に実行されるため、完了までステータスを確認
+      const analysisId = response.data?.analysis_id;
+      if (!response.data?.success || !analysisId) {
         console.error('予期しないレスポンス構造:', response.data);
         setError('解析結果の形式が正しくありません');
         return;
       }
+
+      const result = await waitForAnalysis(analysisId);
+      setAnalysisResult(result);
+      setCurrentStep(3);
     } catch (err) {
       console.error('解析エラー:', err);
       if (err.response?.data?.error) {